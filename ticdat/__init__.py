@@ -19,4 +19,6 @@ The ticDat library is distributed under the BSD2 open source license.
 
 from ticdatfactory import TicDatFactory, freeze_me
 from logfile import LogFactory
-__all__ = ["TicDatFactory", "freeze_me", "LogFactory"]
+from scenarios import run_scenarios
+from solvecache import SolveCache
+__all__ = ["TicDatFactory", "freeze_me", "LogFactory", "run_scenarios", "SolveCache"]
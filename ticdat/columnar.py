@@ -0,0 +1,329 @@
+"""
+Columnar storage for primary key ticDat tables.
+PEP8
+"""
+from array import array
+import collections as clt
+import operator
+import struct
+from itertools import izip, count
+from utils import freezable_factory, TicDatError, verify, dictish, containerish, lupish
+
+try:
+    import numpy
+    numpy_import_worked = True
+except:
+    numpy_import_worked = False
+
+# numbers of these types can be stored in an array of doubles. Note that they come back out as floats.
+_array_types = frozenset((int, long, float))
+# the largest magnitude for which every integer is exactly represented by a double
+_max_exact_int = 2**53
+
+def _packable(value) :
+    """
+    :return: can value be stored in an array of doubles without being changed?
+    """
+    return type(value) is float or (type(value) in _array_types and -_max_exact_int <= value <= _max_exact_int)
+
+_double = struct.Struct("d")
+
+class MappedDoubles(object) :
+    """
+    a read-only column of doubles that are read in place from a buffer (for example, from the mmap of a
+    file written by TicDatFactory.publish_tic_dat). As with an array of doubles, the entries come
+    back out as floats.
+    """
+    __slots__ = ("_buffer", "_offset", "_count")
+    def __init__(self, buffer_, offset, count):
+        self._buffer, self._offset, self._count = buffer_, offset, count
+    def __len__(self):
+        return self._count
+    def __getitem__(self, i):
+        if i < 0 :
+            i += self._count
+        if not 0 <= i < self._count :
+            raise IndexError("MappedDoubles index out of range")
+        return _double.unpack_from(self._buffer, self._offset + _double.size * i)[0]
+    def __iter__(self):
+        unpack, buffer_, offset = _double.unpack_from, self._buffer, self._offset
+        return (unpack(buffer_, offset + _double.size * i)[0] for i in xrange(self._count))
+    def tostring(self):
+        """
+        :return: the packed doubles, as per array.tostring
+        """
+        return self._buffer[self._offset : self._offset + _double.size * self._count]
+    def __reduce__(self):
+        # pickled as an array of doubles, since the buffer can't be pickled
+        return array, ("d", self.tostring())
+
+def failed_positions(column, data_type, valid_data):
+    """
+    finds the entries of a column that fail a data type. Columns of doubles are checked with a
+    vectorized numpy expression when numpy is available.
+    :param column: a column of a columnar table
+    :param data_type: the data type (as set by TicDatFactory.set_data_type) of the column
+    :param valid_data: a function that checks a single value against data_type
+    :return: the positions of the failing entries
+    """
+    if not (type(column) is array and numpy_import_worked) :
+        return [i for i,x in enumerate(column) if not valid_data(x)]
+    if not data_type.number_allowed :
+        return range(len(column))
+    x = numpy.frombuffer(column, dtype=float)
+    with numpy.errstate(invalid="ignore") : # NaN compares as False, just as it does for valid_data
+        failed = (x < data_type.min) | (x > data_type.max)
+        if not data_type.inclusive_min :
+            failed |= x == data_type.min
+        if not data_type.inclusive_max :
+            failed |= x == data_type.max
+        if data_type.must_be_int :
+            failed |= numpy.floor(x) != x
+    return numpy.flatnonzero(failed).tolist()
+
+def columnar_table_class(table, keylen, data_field_names, default_values={}):
+    """
+    creates a dict-like table class that stores each data field in its own column, and
+    indexes the columns by primary key. Each column starts as an array of doubles, and
+    is converted to a list the first time it is asked to store something other than a number
+    (or an integer too large to be stored exactly as a double).
+    :param table: the table name
+    :param keylen: the number of primary key fields
+    :param data_field_names: the data fields, in column order
+    :param default_values: the default values for the data fields
+    :return: a dict-like class whose values are row views into the columns
+    """
+    assert keylen > 0 and data_field_names
+    assert dictish(default_values) and set(default_values).issubset(data_field_names)
+    fieldtoindex = {f:i for i,f in enumerate(data_field_names)}
+    keys = tuple(data_field_names)
+    # since ticDat targeting numerical analysis, 0 is good default default
+    defaults = tuple(default_values.get(f, 0) for f in keys)
+
+    def datavalues(x):
+        if dictish(x) :
+            verify(set(x.keys()).issubset(fieldtoindex),
+                   "Applying inappropriate data field names to %s"%table)
+            rtn = list(defaults)
+            for f,_d in x.items():
+                rtn[fieldtoindex[f]] = _d
+            return rtn
+        if containerish(x) :
+            verify(len(x) == len(keys), "%s requires each row to have %s data values"%
+                   (table, len(keys)))
+            return x
+        verify(len(keys) ==1, "%s requires each row to have %s data values"%(table, len(keys)))
+        return (x,)
+
+    class TicDatColumnarRow(object) :
+        """
+        a dict-like view of a single row of a columnar table
+        """
+        __slots__ = ("_table", "_key")
+        def __init__(self, table_, key):
+            object.__setattr__(self, "_table", table_)
+            object.__setattr__(self, "_key", key)
+        def _posn(self):
+            try :
+                return self._table._index[self._key]
+            except KeyError :
+                raise TicDatError("The %s row for %s has been deleted"%(table, self._key))
+        def __getitem__(self, item):
+            try :
+                column = self._table._columns[fieldtoindex[item]]
+            except :
+                raise TicDatError("Key error : %s not data field name for table %s"% (item, table))
+            return column[self._posn()]
+        def __setitem__(self, key, value):
+            verify(key in fieldtoindex, "Key error : %s not data field name for table %s"%
+                   (key, table))
+            if self._table._dataFrozen :
+                raise TicDatError("Can't edit a frozen TicDatColumnarRow")
+            self._table._set_cell(fieldtoindex[key], self._posn(), value)
+        def __getattr__(self, item):
+            # non-slot attributes (i.e. foreign key links) are kept by the table
+            attributes = self._table._attributes.get(self._key, {})
+            if item in attributes :
+                try : # lazily computed links can fail to find a linked row
+                    return attributes[item]
+                except KeyError :
+                    pass
+            raise AttributeError("'%s' object has no attribute '%s'"%(self.__class__.__name__, item))
+        def __setattr__(self, key, value):
+            if self._table._attributesFrozen :
+                raise TicDatError("can't set attributes to a frozen " + self.__class__.__name__)
+            self._table._attributes.setdefault(self._key, {})[key] = value
+        def __delattr__(self, item):
+            if self._table._attributesFrozen :
+                raise TicDatError("can't del attributes to a frozen " + self.__class__.__name__)
+            if item not in self._table._attributes.get(self._key, {}) :
+                raise AttributeError(item)
+            del self._table._attributes[self._key][item]
+        def keys(self):
+            return keys
+        def values(self):
+            posn = self._posn()
+            return tuple(c[posn] for c in self._table._columns)
+        def items(self):
+            return zip(self.keys(), self.values())
+        def __contains__(self, item):
+            return item in fieldtoindex
+        def __iter__(self):
+            return iter(keys)
+        def __len__(self):
+            return len(keys)
+        def __repr__(self):
+            return "_td:" + {k:v for k,v in self.items()}.__repr__()
+    assert dictish(TicDatColumnarRow)
+
+    class TicDatColumnarDict(freezable_factory(clt.MutableMapping, "_attributesFrozen")) :
+        """
+        a dict-like table whose data is held in per-field columns. keys() lists the primary keys
+        in the same order as the column entries.
+        """
+        _columnar = True
+        _links_owner = None # the TicDat object maintaining the foreign key links of this table
+        def __init__(self, *_args, **_kwargs):
+            self._index = {} # primary key -> column position
+            self._keys = [] # column position -> primary key
+            self._columns = [array("d") for _ in keys]
+            self._attributes = {} # primary key -> {attribute name : attribute}
+            self._dataFrozen = False
+            self._attributesFrozen = False
+            self.update(*_args, **_kwargs)
+        @classmethod
+        def _from_trusted_rows(cls, rows):
+            # skips the verification done by __setitem__, save for the lengths of the keys and data rows.
+            # rows is an iterable of distinct (primary key, sequence of all the data values) pairs
+            rtn = cls()
+            for k,v in rows:
+                verify((type(v) in (tuple, list) or lupish(v)) and len(v) == len(keys),
+                       "%s requires each row to be a sequence of %s data values"%(table, len(keys)))
+                rtn._append_row(k, v)
+            verify(set(map(len, rtn._keys)).issubset({keylen}) if keylen > 1 else
+                   not any(map(containerish, rtn._keys)), "inconsistent key length for %s"%table)
+            return rtn
+        @classmethod
+        def _from_trusted_columns(cls, keys_, columns):
+            # keys_ and columns are as per _keys and _columns
+            rtn = cls()
+            rtn._keys = list(keys_)
+            rtn._index = dict(izip(rtn._keys, count()))
+            rtn._columns = [list(c) if type(c) is tuple else c for c in columns]
+            return rtn
+        def _compact(self, share_values):
+            # for frozen tables. array columns are already packed, the others become tuples
+            keys_ = tuple(zip(*[share_values(map(operator.itemgetter(i), self._keys)) for i in range(keylen)])
+                          if keylen > 1 else share_values(self._keys))
+            self.__dict__.update(_keys = keys_, _index = dict(izip(keys_, count())),
+                                 _columns = [tuple(share_values(c)) if type(c) is list else c
+                                             for c in self._columns])
+        def _set_cell(self, column_index, posn, value):
+            column = self._columns[column_index]
+            if type(column) is array and not _packable(value) :
+                column = self._columns[column_index] = list(column)
+            column[posn] = value
+        def _append_row(self, key, values):
+            self._index[key] = len(self._keys)
+            self._keys.append(key)
+            for i, (column, value) in enumerate(zip(self._columns, values)) :
+                if type(column) is array and not _packable(value) :
+                    column = self._columns[i] = list(column)
+                column.append(value)
+        def __setitem__(self, key, value):
+            if self._dataFrozen :
+                raise TicDatError("Can't edit a frozen " + self.__class__.__name__)
+            verify(containerish(key) ==  (keylen > 1) and (keylen == 1 or keylen == len(key)),
+                   "inconsistent key length for %s"%table)
+            values = datavalues(value)
+            owner = self._links_owner
+            if key in self._index :
+                if owner is not None :
+                    owner._unlink_row(table, key, TicDatColumnarRow(self, key))
+                posn = self._index[key]
+                for i, v in enumerate(values):
+                    self._set_cell(i, posn, v)
+            else :
+                self._append_row(key, values)
+            if owner is not None :
+                owner._link_row(table, key, TicDatColumnarRow(self, key))
+        def __getitem__(self, item):
+            if item not in self._index :
+                if self._dataFrozen :
+                    raise KeyError(item)
+                self[item] = {}
+            return TicDatColumnarRow(self, item)
+        def __delitem__(self, key):
+            if self._dataFrozen :
+                raise TicDatError("Can't edit a frozen " + self.__class__.__name__)
+            if self._links_owner is not None and key in self._index :
+                self._links_owner._unlink_row(table, key, TicDatColumnarRow(self, key))
+            posn = self._index.pop(key)
+            last = len(self._keys) - 1
+            if posn != last : # keep the columns dense by moving the last row into the hole
+                self._keys[posn] = self._keys[last]
+                self._index[self._keys[posn]] = posn
+                for column in self._columns:
+                    column[posn] = column[last]
+            self._keys.pop()
+            for column in self._columns:
+                column.pop()
+            self._attributes.pop(key, None)
+        def __iter__(self):
+            return iter(self._keys)
+        def __len__(self):
+            return len(self._keys)
+        def __contains__(self, item):
+            return item in self._index
+        def has_key(self, item):
+            return item in self._index
+        def get(self, key, default=None):
+            return TicDatColumnarRow(self, key) if key in self._index else default
+        def pop(self, key, *default):
+            if key not in self._index and default :
+                return default[0]
+            rtn = dict(TicDatColumnarRow(self, key).items()) if key in self._index else None
+            del self[key]
+            return rtn
+        def setdefault(self, key, default=None):
+            if key not in self._index :
+                self[key] = {} if default is None else default
+            return TicDatColumnarRow(self, key)
+        def keys(self):
+            return list(self._keys)
+        def values(self):
+            return [TicDatColumnarRow(self, k) for k in self._keys]
+        def items(self):
+            return [(k, TicDatColumnarRow(self, k)) for k in self._keys]
+        def column(self, field):
+            """
+            :param field: a data field
+            :return: the column of data for field, ordered consistently with keys().
+                     This is the underlying storage, not a copy, and should be treated as read-only.
+                     It is an array of doubles if every value written to it has been a number,
+                     and a list (a tuple, for a compacted frozen table) otherwise.
+                     The numeric columns of a TicDat object attached with
+                     TicDatFactory.attach_tic_dat are MappedDoubles.
+            """
+            verify(field in fieldtoindex, "%s is not a data field name for table %s"%(field, table))
+            return self._columns[fieldtoindex[field]]
+        def numpy_column(self, field):
+            """
+            :param field: a data field
+            :return: the column of data for field as a read-only numpy array, ordered consistently
+                     with keys(). Array backed columns are shared with the table, not copied.
+            """
+            verify(numpy_import_worked, "numpy is needed for numpy_column")
+            column = self.column(field)
+            if type(column) is MappedDoubles :
+                rtn = numpy.frombuffer(column._buffer, dtype=float, count=len(column), offset=column._offset)
+            elif type(column) is array :
+                rtn = numpy.frombuffer(column, dtype=float)
+            else :
+                rtn = numpy.array(column, dtype=object)
+            rtn.flags.writeable = False
+            return rtn
+        def __repr__(self):
+            return "td:" + {k:v for k,v in self.items()}.__repr__()
+    assert dictish(TicDatColumnarDict)
+    return TicDatColumnarDict
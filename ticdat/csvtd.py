@@ -4,9 +4,12 @@ PEP8
 """
 
 import os
+import operator
+import multiprocessing
 from utils import freezable_factory, TicDatError, verify, containerish, dictish
 import utils
 from collections import defaultdict
+from itertools import izip, repeat, islice
 
 try:
     import csv
@@ -20,6 +23,54 @@ def _try_float(x) :
     except :
         return x
 
+# the first characters of the strings that float might accept (digits, signs, the decimal point,
+# whitespace, and the i and n of inf, infinity and nan)
+_float_starts = frozenset("0123456789+-. \t\n\r\x0b\x0ciInN")
+def _maybe_float(x) :
+    # _try_float, but without trying (and failing) to convert the strings that can't be floats
+    if not x or x[0] not in _float_starts :
+        return x
+    return _try_float(x)
+
+def _as_is(x) :
+    return x
+
+# the number of values examined when inferring the converter of a column without a data type
+_sample_size = 100
+# the number of rows of a generator table that are converted together, a column at a time
+_chunk_size = 10000
+
+def _convert_column(values, converter) :
+    """
+    :param values: the list of the string values of a column
+    :param converter: the converter of the column, as chosen by CsvTicFactory._converter
+    :return: the list of the converted values
+    """
+    if converter is _as_is :
+        return values
+    if converter is _try_float or all(_maybe_float(x) is not x for x in islice(values, _sample_size)) :
+        # very likely a column of numbers, so convert the column in one go, falling back to a
+        # cell by cell conversion for the odd value that isn't a number
+        try :
+            return map(float, values)
+        except (ValueError, TypeError) :
+            return map(_maybe_float, values)
+    return map(converter, values)
+
+def _convert_columns(raw_rows, converters) :
+    """
+    :param raw_rows: a list of rows of string values
+    :param converters: the converters of the columns
+    :return: the list of the converted columns
+    """
+    return [_convert_column(list(values), c)
+            for values, c in zip(zip(*raw_rows) or [()] * len(converters), converters)]
+
+def _read_table(task) :
+    # reads a table in a worker process. see CsvTicFactory._create_tic_dat
+    tic_dat_factory, dir_path, table, dialect, headers_present = task
+    return table, tic_dat_factory.csv._create_table(dir_path, table, dialect, headers_present)
+
 class CsvTicFactory(freezable_factory(object, "_isFrozen")) :
     """
     Primary class for reading/writing csv files with ticDat objects.
@@ -36,7 +87,7 @@ class CsvTicFactory(freezable_factory(object, "_isFrozen")) :
         self.tic_dat_factory = tic_dat_factory
         self._isFrozen = True
     def create_tic_dat(self, dir_path, dialect='excel', headers_present = True,
-                       freeze_it = False):
+                       freeze_it = False, workers = None):
         """
         Create a TicDat object from the csv files in a directory
         :param dir_path: the directory containing the .csv files.
@@ -44,22 +95,46 @@ class CsvTicFactory(freezable_factory(object, "_isFrozen")) :
         :param headers_present: Boolean. Does the first row of data contain the
                                 column headers?
         :param freeze_it: boolean. should the returned object be frozen?
+        :param workers: the number of worker processes that read the files concurrently,
+                        one table at a time and largest file first. By default (or with
+                        workers=1) the files are read one after another in this process.
+                        Generator tables are always read (lazily) by this process.
         :return: a TicDat object populated by the matching files.
         caveats: Missing files resolve to an empty table, but missing fields on
                  matching files throw an Exception.
                  Data field values (but not primary key values) will be coerced
                  into floats if possible.
         """
-        rtn =  self.tic_dat_factory.TicDat(**self._create_tic_dat(dir_path, dialect,
-                                                                  headers_present))
+        rtn =  self.tic_dat_factory.TicDat.from_rows(**self._create_tic_dat(dir_path, dialect,
+                                                                            headers_present, workers))
         if freeze_it:
             return self.tic_dat_factory.freeze_me(rtn)
         return rtn
-    def _create_tic_dat(self, dir_path, dialect, headers_present):
+    def _create_tic_dat(self, dir_path, dialect, headers_present, workers = None):
         verify(dialect in csv.list_dialects(), "Invalid dialect %s"%dialect)
         verify(os.path.isdir(dir_path), "Invalid directory path %s"%dir_path)
+        verify(workers is None or (isinstance(workers, int) and workers > 0),
+               "workers should be a positive integer")
+        tdf = self.tic_dat_factory
+        pooled = sorted((t for t in tdf.all_tables if t not in tdf.generator_tables and
+                         os.path.isfile(os.path.join(dir_path, t + ".csv"))),
+                        key = lambda t : -os.path.getsize(os.path.join(dir_path, t + ".csv")))
+        if (workers or 1) == 1 or len(pooled) < 2 :
+            pooled = []
         rtn =  {t : self._create_table(dir_path, t, dialect, headers_present)
-                for t in self.tic_dat_factory.all_tables}
+                for t in tdf.all_tables if t not in pooled}
+        if pooled :
+            pool = multiprocessing.Pool(min(workers, len(pooled)))
+            try :
+                # the tables are unpickled in this process as they arrive, so collecting garbage
+                # while they do would repeatedly scan all the rows received so far
+                with utils.gc_paused() :
+                    rtn.update(pool.imap_unordered(_read_table, [(tdf, dir_path, t, dialect, headers_present)
+                                                                 for t in pooled]))
+                pool.close()
+            finally :
+                pool.terminate()
+                pool.join()
         return {k:v for k,v in rtn.items() if v}
     def get_duplicates(self, dir_path, dialect='excel', headers_present = True):
         """
@@ -84,16 +159,9 @@ class CsvTicFactory(freezable_factory(object, "_isFrozen")) :
         for t in rtn:
             if not headers_present:
                 self._verify_fields_by_cnt(dir_path, t, dialect)
-            fieldnames=tdf.primary_key_fields.get(t, ()) + tdf.data_fields.get(t, ())
-            dict_rdr_args = dict({"fieldnames":fieldnames} if not headers_present else{},
-                             **{"dialect": dialect})
             with open(os.path.join(dir_path, t + ".csv")) as csvfile:
-                for r in csv.DictReader(csvfile, **dict_rdr_args) :
-                    verify(set(r.keys()).issuperset(fieldnames),
-                           "Failed to find the required field names for %s"%t)
-                    p_key = _try_float(r[tdf.primary_key_fields[t][0]]) \
-                            if len(tdf.primary_key_fields[t])==1 else \
-                            tuple(_try_float(r[_]) for _ in tdf.primary_key_fields[t])
+                for r in self._rows(csvfile, t, dialect, headers_present, tdf.primary_key_fields[t]) :
+                    p_key = _maybe_float(r[0]) if len(r) == 1 else tuple(map(_maybe_float, r))
                     rtn[t][p_key] += 1
         for t in rtn.keys():
             rtn[t] = {k:v for k,v in rtn[t].items() if v > 1}
@@ -112,38 +180,76 @@ class CsvTicFactory(freezable_factory(object, "_isFrozen")) :
                 verify(len(row) == len(fieldnames),
                        "Need %s columns for table %s"%(len(fieldnames), table))
                 return
+    def _converter(self, table, field):
+        """
+        :return: the function that converts the string values of a field. A data field whose data type
+                 doesn't allow numbers is read as is, a data field whose data type allows numbers but not
+                 strings is read as floats (with the odd value that isn't a number left as is), and the
+                 other fields are read as floats where possible.
+        """
+        data_type = self.tic_dat_factory.data_types.get(table, {}).get(field)
+        if data_type and not data_type.number_allowed :
+            return _as_is
+        if data_type and not data_type.strings_allowed :
+            return _try_float
+        return _maybe_float
+    def _rows(self, csvfile, table, dialect, headers_present, fields = None):
+        """
+        reads the rows of a csv file with csv.reader. The header, if present, is checked once, and then the
+        values of each row are picked out by position. Extra columns are skipped, and missing trailing
+        values are read as None (as per csv.DictReader).
+        :param csvfile: the open csv file of table
+        :param fields: the fields to read. Defaults to all the fields of table (primary key fields first)
+        :return: an iterator of the rows, as tuples of the (string) values of fields
+        """
+        tdf = self.tic_dat_factory
+        fieldnames = tdf.primary_key_fields.get(table, ()) + tdf.data_fields.get(table, ())
+        fields = fieldnames if fields is None else fields
+        rdr = csv.reader(csvfile, dialect=dialect)
+        if headers_present :
+            header = next((row for row in rdr if row), None)
+            if header is None :
+                return iter(())
+            posns = {f : i for i,f in enumerate(header)}
+            verify(set(posns).issuperset(fieldnames), "Failed to find the required field names for %s"%table)
+            indices = [posns[f] for f in fields]
+        else :
+            indices = [fieldnames.index(f) for f in fields]
+        width = max(indices) + 1
+        project = operator.itemgetter(*indices) if len(indices) > 1 else \
+                  (lambda row, _i = indices[0] : (row[_i],))
+        pad = lambda row : tuple(row[i] if i < len(row) else None for i in indices)
+        return (project(row) if len(row) >= width else pad(row) for row in rdr if row)
     def _create_table(self, dir_path, table, dialect, headers_present):
         file_path = os.path.join(dir_path, table + ".csv")
         if not os.path.isfile(file_path) :
             return
         tdf = self.tic_dat_factory
         fieldnames=tdf.primary_key_fields.get(table, ()) + tdf.data_fields.get(table, ())
-        dict_rdr_args = dict({"fieldnames":fieldnames} if not headers_present else{},
-                             **{"dialect": dialect})
+        converters = [self._converter(table, f) for f in fieldnames]
         if table in tdf.generator_tables:
+            data_converters = converters[len(tdf.primary_key_fields.get(table, ())):]
             def rtn() :
                 if not headers_present:
                     self._verify_fields_by_cnt(dir_path, table, dialect)
                 with open(file_path) as csvfile:
-                    for r in csv.DictReader(csvfile, **dict_rdr_args) :
-                        verify(set(r.keys()).issuperset(fieldnames),
-                               "Failed to find the required field names for %s"%table)
-                        yield tuple(_try_float(r[_]) for _ in tdf.data_fields[table])
+                    rows = self._rows(csvfile, table, dialect, headers_present, tdf.data_fields[table])
+                    for chunk in iter(lambda : list(islice(rows, _chunk_size)), []) :
+                        for r in izip(*_convert_columns(chunk, data_converters)) :
+                            yield r
         else:
             if not headers_present:
                 self._verify_fields_by_cnt(dir_path, table, dialect)
-            rtn = {} if tdf.primary_key_fields.get(table) else []
             with open(file_path) as csvfile:
-                for r in csv.DictReader(csvfile, **dict_rdr_args) :
-                    verify(set(r.keys()).issuperset(fieldnames),
-                           "Failed to find the required field names for %s"%table)
-                    if tdf.primary_key_fields.get(table) :
-                        p_key = _try_float(r[tdf.primary_key_fields[table][0]]) \
-                            if len(tdf.primary_key_fields[table])==1 else \
-                            tuple(_try_float(r[_]) for _ in tdf.primary_key_fields[table])
-                        rtn[p_key] = tuple(_try_float(r[_]) for _ in tdf.data_fields.get(table,()))
-                    else:
-                        rtn.append(tuple(_try_float(r[_]) for _ in tdf.data_fields[table]))
+                raw_rows = list(self._rows(csvfile, table, dialect, headers_present))
+            # the values are converted a column at a time, so that each column is read by its own converter
+            columns = _convert_columns(raw_rows, converters)
+            pk_count = len(tdf.primary_key_fields.get(table, ()))
+            data_rows = izip(*columns[pk_count:]) if columns[pk_count:] else repeat(())
+            if pk_count :
+                rtn = dict(izip(columns[0] if pk_count == 1 else izip(*columns[:pk_count]), data_rows))
+            else:
+                rtn = list(data_rows)
         return rtn
 
     def write_directory(self, tic_dat, dir_path, allow_overwrite = False, dialect='excel',
@@ -57,7 +57,7 @@ class MdbTicFactory(freezable_factory(object, "_isFrozen")) :
         caveats : Numbers with absolute values larger than 1e+100 will
                   be read as float("inf") or float("-inf")
         """
-        rtn =  self.tic_dat_factory.TicDat(**self._create_tic_dat(mdb_file_path))
+        rtn =  self.tic_dat_factory.TicDat.from_rows(**self._create_tic_dat(mdb_file_path))
         if freeze_it:
             return self.tic_dat_factory.freeze_me(rtn)
         return rtn
@@ -0,0 +1,100 @@
+"""
+Run a solve function over many input scenarios on a pool of worker processes.
+PEP8
+"""
+import os
+import time
+import traceback
+import multiprocessing
+from collections import namedtuple
+from utils import verify, stringish
+from ticdatfactory import _published_magic
+
+# the outcome of a single scenario.
+# index : the position of the scenario in the scenarios iterable
+# source : the file path the scenario was read from (None for TicDat objects)
+# solution : what solve returned (typically a solution TicDat object, or None for an infeasible scenario)
+# read_seconds : the wall clock time spent reading the source (0 for TicDat objects)
+# solve_seconds : the wall clock time spent in solve
+# error : None if solve succeeded, otherwise the formatted traceback of the exception it raised
+ScenarioResult = namedtuple("ScenarioResult", ("index", "source", "solution", "read_seconds",
+                                               "solve_seconds", "error"))
+
+def _read_source(tic_dat_factory, source):
+    """
+    reads a scenario from a file path, with the reader implied by the path
+    :return: a frozen TicDat object
+    """
+    ext = os.path.splitext(source)[1].lower()
+    readers = ((os.path.isdir(source), "csv", "create_tic_dat"),
+               (ext in (".xls", ".xlsx"), "xls", "create_tic_dat"),
+               (ext in (".mdb", ".accdb"), "mdb", "create_tic_dat"),
+               (ext == ".sql", "sql", "create_tic_dat_from_sql"),
+               (ext in (".db", ".sqlite", ".sqlite3"), "sql", "create_tic_dat"))
+    for applies, attr, function in readers :
+        if applies :
+            verify(hasattr(tic_dat_factory, attr), "The %s reader is not available for %s"%(attr, source))
+            return getattr(getattr(tic_dat_factory, attr), function)(source, freeze_it=True)
+    with open(source, "rb") as f :
+        verify(f.read(len(_published_magic)) == _published_magic,
+               "Unable to infer the reader for %s"%source)
+    return tic_dat_factory.attach_tic_dat(source)
+
+def _run_scenario(task):
+    tic_dat_factory, solve, args, kwargs, index, scenario = task
+    source = scenario if stringish(scenario) else None
+    seconds = [] # the read time, then the solve time
+    start = time.time()
+    try :
+        dat = scenario if source is None else _read_source(tic_dat_factory, source)
+        seconds.append(0 if source is None else time.time() - start)
+        start = time.time()
+        solution = solve(dat, *args, **kwargs)
+        seconds.append(time.time() - start)
+    except Exception :
+        seconds.append(time.time() - start)
+        return ScenarioResult(index, source, None, seconds[0], sum(seconds[1:]), traceback.format_exc())
+    return ScenarioResult(index, source, solution, seconds[0], seconds[1], None)
+
+def run_scenarios(tic_dat_factory, solve, scenarios, processes = None, args = (), kwargs = {},
+                  ordered = False):
+    """
+    Runs a solve function over many input scenarios, in parallel.
+    The scenarios are handed to the worker processes as they are needed, and the results are
+    yielded as they come back. TicDat objects travel to the workers (and the solutions travel back)
+    as column data (see TicDatFactory.__reduce__). File path scenarios are read by the workers
+    themselves. A file written by TicDatFactory.publish_tic_dat is attached to, so that all the
+    workers share its numeric columns.
+    :param tic_dat_factory: the TicDatFactory of the input data
+    :param solve: the solve function, called as solve(dat, *args, **kwargs) for each input TicDat object.
+                  Since it is sent to the worker processes, it needs to be a module level function.
+    :param scenarios: an iterable of TicDat objects and file paths. The reader for each path is implied
+                      by its extension (a directory is read as csv files, .xls and .xlsx files as Excel,
+                      .mdb and .accdb files as Access, .sql files as SQLite sql text, and .db, .sqlite
+                      and .sqlite3 files as SQLite databases), other paths are attached to as published
+                      files. The scenarios read from files are frozen.
+    :param processes: the number of worker processes. Defaults to the number of cpus. With processes=1,
+                      the scenarios are solved one at a time in this process.
+    :param args: additional positional arguments for solve
+    :param kwargs: additional keyword arguments for solve
+    :param ordered: boolean. If truthy, the results are yielded in scenario order. Otherwise, they are
+                    yielded as soon as they are ready.
+    :return: a generator of ScenarioResult, one per scenario
+    """
+    verify(callable(solve), "solve needs to be callable")
+    verify(processes is None or (isinstance(processes, int) and processes > 0),
+           "processes should be a positive integer")
+    tasks = ((tic_dat_factory, solve, args, kwargs, i, s) for i, s in enumerate(scenarios))
+    if processes == 1 :
+        return (_run_scenario(task) for task in tasks)
+    return _pooled_results(tasks, processes, ordered)
+
+def _pooled_results(tasks, processes, ordered):
+    pool = multiprocessing.Pool(processes)
+    try :
+        for result in (pool.imap if ordered else pool.imap_unordered)(_run_scenario, tasks, chunksize=1) :
+            yield result
+        pool.close()
+    finally :
+        pool.terminate()
+        pool.join()
@@ -0,0 +1,125 @@
+"""
+A disk backed cache of solve results, kept in a SQLite file. Requires the sqlite3 module
+PEP8
+"""
+import os
+import cPickle as pickle
+from contextlib import closing
+from utils import freezable_factory, verify, stringish
+
+try:
+    import sqlite3 as sql
+    import_worked=True
+except:
+    import_worked=False
+
+_create_table = ("CREATE TABLE IF NOT EXISTS solutions (fingerprint TEXT NOT NULL, version TEXT NOT NULL, "
+                 "solution BLOB NOT NULL, bytes INTEGER NOT NULL, last_used INTEGER NOT NULL, "
+                 "PRIMARY KEY (fingerprint, version))")
+
+class SolveCache(freezable_factory(object, "_isFrozen")) :
+    """
+    Memoizes a solve function on disk. The solution TicDat objects are stored in a SQLite file, keyed by
+    the fingerprint of the input TicDat object (see TicDatFactory.fingerprint) and a version tag for the
+    solve code. When the stored solutions outgrow the size budget, the least recently used ones are evicted.
+    The cache file can be shared by many processes, and outlives them.
+    """
+    def __init__(self, tic_dat_factory, solution_factory, solve, db_file_path, version,
+                 max_bytes = 2**30):
+        """
+        :param tic_dat_factory: the TicDatFactory of the input data
+        :param solution_factory: the TicDatFactory of the solutions
+        :param solve: the solve function, called as solve(dat) for an input TicDat object. Should return a
+                      solution TicDat object, or None (say, for infeasible data). None is cached as well.
+        :param db_file_path: the SQLite file holding the cache. Created if need be.
+        :param version: a string that identifies the solve code. Change it whenever a change to the code
+                        might change the solutions, so that the solutions of the old code are not returned.
+        :param max_bytes: the size budget of the stored solutions
+        :return:
+        """
+        verify(import_worked, "sqlite3 needs to be installed to use SolveCache")
+        verify(callable(solve), "solve needs to be callable")
+        verify(stringish(version), "version needs to be a string")
+        verify(isinstance(max_bytes, (int, long)) and max_bytes > 0, "max_bytes should be a positive integer")
+        verify(not os.path.isdir(db_file_path), "A directory is not a valid SQLite file path")
+        self.tic_dat_factory = tic_dat_factory
+        self.solution_factory = solution_factory
+        self.solve_function = solve
+        self.db_file_path = db_file_path
+        self.version = version
+        self.max_bytes = max_bytes
+        with closing(self._connect()) as con :
+            # auto_vacuum has to be set before the first table is created. It lets the file shrink on eviction
+            con.execute("PRAGMA auto_vacuum = FULL")
+            with con :
+                con.execute(_create_table)
+        self._isFrozen = True
+    def _connect(self):
+        return sql.connect(self.db_file_path, timeout = 60)
+    def solve(self, dat, freeze_it = False):
+        """
+        Returns the solution for dat, calling the solve function only if the solution isn't already cached.
+        :param dat: a TicDat object of the input factory
+        :param freeze_it: boolean. should the returned solution be frozen?
+        :return: the solution TicDat object (or None, if that's what the solve function returned)
+        """
+        fingerprint = self.tic_dat_factory.fingerprint(dat)
+        with closing(self._connect()) as con :
+            with con :
+                found = con.execute("SELECT solution FROM solutions WHERE fingerprint = ? AND version = ?",
+                                    (fingerprint, self.version)).fetchone()
+                if found :
+                    con.execute("UPDATE solutions SET last_used = (SELECT MAX(last_used) + 1 FROM solutions) "
+                                "WHERE fingerprint = ? AND version = ?", (fingerprint, self.version))
+        stored = self._loads(found[0]) if found else None
+        if stored is None :
+            solution = self.solve_function(dat)
+            msg = []
+            verify(solution is None or self.solution_factory.good_tic_dat_object(solution, msg.append),
+                   "solve returned a bad solution object : %s"%"\n".join(msg))
+            self._store(fingerprint, solution)
+        else :
+            solution = stored[0]
+        if freeze_it and solution is not None :
+            self.solution_factory.freeze_me(solution)
+        return solution
+    def _dumps(self, solution):
+        tdf = self.solution_factory
+        tables = None if solution is None else {t : tdf._table_columns(solution, t) for t in tdf.all_tables}
+        return pickle.dumps((tdf.schema(), tables), pickle.HIGHEST_PROTOCOL)
+    def _loads(self, blob):
+        """
+        :return: None if the blob doesn't match the solution factory (in which case it is treated as a cache
+                 miss), otherwise a one tuple of the stored solution
+        """
+        schema, tables = pickle.loads(str(blob))
+        if schema != self.solution_factory.schema() :
+            return None
+        return (None if tables is None else self.solution_factory.TicDat._from_columns(tables),)
+    def _store(self, fingerprint, solution):
+        blob = self._dumps(solution)
+        if len(blob) > self.max_bytes :
+            return
+        with closing(self._connect()) as con :
+            with con :
+                con.execute("INSERT OR REPLACE INTO solutions VALUES (?, ?, ?, ?, "
+                            "(SELECT COALESCE(MAX(last_used), 0) + 1 FROM solutions))",
+                            (fingerprint, self.version, sql.Binary(blob), len(blob)))
+                self._evict(con)
+    def _evict(self, con):
+        # keep the most recently used solutions that fit in the budget
+        total, evicted = 0, []
+        for fingerprint, version, bytes_ in con.execute(
+                "SELECT fingerprint, version, bytes FROM solutions ORDER BY last_used DESC") :
+            total += bytes_
+            if total > self.max_bytes :
+                evicted.append((fingerprint, version))
+        con.executemany("DELETE FROM solutions WHERE fingerprint = ? AND version = ?", evicted)
+    def clear(self):
+        """
+        Removes all the cached solutions, of every version.
+        :return:
+        """
+        with closing(self._connect()) as con :
+            with con :
+                con.execute("DELETE FROM solutions")
@@ -57,8 +57,8 @@ class SQLiteTicFactory(freezable_factory(object, "_isFrozen")) :
     def _Rtn(self, freeze_it):
         if freeze_it:
             return lambda *args, **kwargs : self.tic_dat_factory.freeze_me(
-                    self.tic_dat_factory.TicDat(*args, **kwargs))
-        return self.tic_dat_factory.TicDat
+                    self.tic_dat_factory.TicDat.from_rows(*args, **kwargs))
+        return self.tic_dat_factory.TicDat.from_rows
     def create_tic_dat(self, db_file_path, freeze_it = False):
         """
         Create a TicDat object from a SQLite database file
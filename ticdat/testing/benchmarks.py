@@ -0,0 +1,416 @@
+"""
+Rough benchmarks for the ticdat library. These are not unit tests, and are not run by the test suites.
+Run as a module, optionally naming the benchmarks of interest
+    python -m ticdat.testing.benchmarks [benchmarkName ...]
+"""
+import os
+import sys
+import time
+import gc
+import multiprocessing
+from ticdat.ticdatfactory import TicDatFactory
+
+def _currentMemory() :
+    # resident set size in bytes, read from /proc where available (i.e. Linux)
+    if os.path.exists("/proc/self/statm") :
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def _memoryChildProcess(f, queue) :
+    gc.collect()
+    before = _currentMemory()
+    rtn = f()
+    gc.collect()
+    queue.put(_currentMemory() - before)
+    del rtn
+
+def memoryDelta(f) :
+    """
+    measures the resident memory (in bytes) retained by the object returned by f()
+    f is run in a fresh child process, so that prior allocations don't pollute the measurement
+    """
+    queue = multiprocessing.Queue()
+    p = multiprocessing.Process(target=_memoryChildProcess, args=(f, queue))
+    p.start()
+    rtn = queue.get()
+    p.join()
+    return rtn
+
+def timeIt(f, repeat = 1) :
+    """
+    :return: the best wall clock time, in seconds, over repeat calls of f()
+    """
+    rtn = float("inf")
+    for _ in range(repeat):
+        start = time.time()
+        f()
+        rtn = min(rtn, time.time() - start)
+    return rtn
+
+def distanceFactory(columnar = False, foreignKeys = False, links = None) :
+    """
+    :param links: None for no foreign key links, otherwise "eager" or "lazy"
+    """
+    rtn = TicDatFactory(sites = [["name"], ["demand", "center_status"]],
+                        distance = [["source", "destination"], ["distance"]])
+    if foreignKeys or links :
+        rtn.add_foreign_key("distance", "sites", ["source", "name"])
+        rtn.add_foreign_key("distance", "sites", ["destination", "name"])
+    if links :
+        rtn.enable_foreign_key_links(lazy = links == "lazy")
+    if columnar :
+        rtn.set_columnar_tables(["distance"])
+    return rtn
+
+def distanceData(numSites) :
+    names = ["s%s"%i for i in range(numSites)]
+    sites = {n : (i%7, "canBeCenter" if i%3 else "dontCare") for i,n in enumerate(names)}
+    distance = {(n1, n2) : (float(i+j),) for i,n1 in enumerate(names) for j,n2 in enumerate(names)}
+    return {"sites" : sites, "distance":distance}
+
+def benchmarkRowMemory(numSites = 1000) :
+    rows = numSites ** 2 + numSites
+    for name, f in (("TicDat", lambda : distanceFactory().TicDat(**distanceData(numSites))),
+                    ("TicDat with columnar distance",
+                     lambda : distanceFactory(True).TicDat(**distanceData(numSites))),
+                    ("raw dict of tuples", lambda : distanceData(numSites))) :
+        mem = memoryDelta(f)
+        print "%s with %s rows : %.1f MB, %.1f bytes per row"%(name, rows, mem/1e6, float(mem)/rows)
+
+def benchmarkTicDatConstruction(numTicDats = 2000) :
+    from ticdat.testing.ticdattestutils import dietSchema, dietData, netflowSchema, netflowData
+    from ticdat.testing.ticdattestutils import addDietForeignKeys, addNetflowForeignKeys
+    for schema, data, addFks in ((dietSchema, dietData, addDietForeignKeys),
+                                 (netflowSchema, netflowData, addNetflowForeignKeys)) :
+        for links in (False, True) :
+            tdf = TicDatFactory(**schema())
+            if links :
+                addFks(tdf)
+                tdf.enable_foreign_key_links()
+            tables = {t:getattr(data(), t) for t in tdf.all_tables}
+            def makeThem() :
+                for _ in range(numTicDats) :
+                    tdf.TicDat(**tables)
+            print "%s %s TicDat objects%s : %.3f seconds"%(numTicDats, schema.__name__[:-len("Schema")],
+                    " with foreign key links" if links else "", timeIt(makeThem, 3))
+
+def benchmarkTrustedConstruction(numSites = 1000) :
+    data = distanceData(numSites)
+    rows = sum(map(len, data.values()))
+    for columnar in (False, True) :
+        tdf = distanceFactory(columnar)
+        for name, f in (("TicDat", lambda : tdf.TicDat(**data)),
+                        ("TicDat.from_rows", lambda : tdf.TicDat.from_rows(**data))) :
+            seconds = timeIt(f, 3)
+            print "%s %s with %s rows : %.2f seconds, %.0f rows per second"%(
+                "columnar" if columnar else "dict of rows", name, rows, seconds, rows/seconds)
+
+def benchmarkForeignKeyFailures(numSites = 1000) :
+    for columnar in (False, True) :
+        tdf = distanceFactory(columnar=columnar, foreignKeys=True)
+        dat = tdf.TicDat.from_rows(**distanceData(numSites))
+        del dat.sites["s0"]
+        for singleScan in (False, True) :
+            seconds = timeIt(lambda : tdf.find_foreign_key_failures(dat, single_scan=singleScan), 3)
+            print "find_foreign_key_failures%s with %s %s distance rows : %.2f seconds, %.0f rows per second"%(
+                " (single scan)" if singleScan else "", len(dat.distance),
+                "columnar" if columnar else "dict of", seconds, len(dat.distance)/seconds)
+
+def benchmarkForeignKeyLinks(numSites = 700) :
+    data = distanceData(numSites)
+    rows = sum(map(len, data.values()))
+    def oneLink(links) :
+        dat = distanceFactory(links=links).TicDat.from_rows(**data)
+        len(dat.sites["s1"].distance_source)
+        return dat
+    benchmarks = (("no links", lambda : distanceFactory().TicDat.from_rows(**data)),
+                  ("eager links", lambda : distanceFactory(links="eager").TicDat.from_rows(**data)),
+                  ("lazy links", lambda : distanceFactory(links="lazy").TicDat.from_rows(**data)),
+                  ("lazy links, one link used", lambda : oneLink("lazy")))
+    # memory first, so the children don't reuse memory that the timing runs freed in this process
+    mems = [memoryDelta(f) for _, f in benchmarks]
+    for (name, f), mem in zip(benchmarks, mems) :
+        print "%s rows with %s : %.2f seconds, %.1f MB"%(rows, name, timeIt(f, 3), mem/1e6)
+
+def benchmarkLinkedEdits(numSites = 500, numEdits = 10000) :
+    data = distanceData(numSites)
+    for links in ("eager", "lazy") :
+        tdf = distanceFactory(links=links)
+        dat = tdf.TicDat.from_rows(**data)
+        len(dat.sites["s1"].distance_source)
+        def editIt() :
+            for i in range(numEdits) :
+                dat.distance["s%s"%i, "new"] = i
+                del dat.distance["s%s"%i, "new"]
+        print "%s %s link edits : %.2f seconds, rebuilding the TicDat : %.2f seconds"%(
+            2 * numEdits, links, timeIt(editIt), timeIt(lambda : tdf.TicDat.from_rows(**data)))
+
+def benchmarkForeignKeyCascade(depth = 8, rowsPerTable = 50000) :
+    # a chain of tables, each row referencing the same row of the previous table
+    tdf = TicDatFactory(**{"level%s"%i : [["name"], ["parent"]] for i in range(depth)})
+    for i in range(1, depth) :
+        tdf.add_foreign_key("level%s"%i, "level%s"%(i-1), ["parent", "name"])
+    data = {"level%s"%i : {"r%s"%j : "r%s"%j for j in range(rowsPerTable)} for i in range(depth)}
+    def removeThem() :
+        dat = tdf.TicDat.from_rows(**data)
+        for j in range(0, rowsPerTable, 10) :
+            del dat.level0["r%s"%j]
+        start = time.time()
+        tdf.remove_foreign_keys_failures(dat)
+        return time.time() - start
+    print "remove_foreign_keys_failures cascading %s levels deep through %s rows : %.2f seconds"%(
+        depth, depth * rowsPerTable, min(removeThem() for _ in range(3)))
+
+def benchmarkDataTypeFailures(numRows = 1000000) :
+    import ticdat.columnar as columnar
+    data = {"distance" : {(i, i%997) : (float(i%1013), i%11) for i in range(numRows)}}
+    for columnar_ in (False, True) :
+        tdf = TicDatFactory(distance = [["source", "destination"], ["distance", "hops"]])
+        tdf.set_data_type("distance", "distance", max = 1000, inclusive_max = True)
+        tdf.set_data_type("distance", "hops", min = 1, must_be_int = True, strings_allowed = ("many",))
+        if columnar_ :
+            tdf.set_columnar_tables(["distance"])
+        dat = tdf.TicDat(**data)
+        for vectorized in ((False, True) if columnar_ else (False,)) :
+            oldFlag, columnar.numpy_import_worked = columnar.numpy_import_worked, \
+                                                    columnar.numpy_import_worked and vectorized
+            try :
+                seconds = timeIt(lambda : tdf.find_data_type_failures(dat), 3)
+            finally :
+                columnar.numpy_import_worked = oldFlag
+            print "find_data_type_failures with %s %s rows%s : %.2f seconds, %.0f values per second"%(
+                numRows, "columnar" if columnar_ else "dict of", " (numpy)" if vectorized else "",
+                seconds, 2 * numRows / seconds)
+
+def benchmarkGoodTicDatObject(numSites = 1000) :
+    class Plain(object) :
+        pass
+    plain = Plain()
+    for t, rows in distanceData(numSites).items() :
+        setattr(plain, t, rows)
+    tdf = distanceFactory()
+    print "good_tic_dat_object with %s plain rows : %.2f seconds"%(len(plain.distance),
+        timeIt(lambda : tdf.good_tic_dat_object(plain), 3))
+    dat = tdf.freeze_me(tdf.TicDat.from_rows(**distanceData(numSites)))
+    print "good_tic_dat_object with a frozen TicDat of %s rows, 100 times : %.4f seconds"%(len(dat.distance),
+        timeIt(lambda : [tdf.good_tic_dat_object(dat) for _ in range(100)]))
+
+def benchmarkGeneratorTableCopy(numRows = 300000) :
+    import shutil
+    import tempfile
+    tdf = TicDatFactory(arcs = [[], ["source", "destination", "capacity"]])
+    tdf.set_generator_tables(["arcs"])
+    sourceDir, targetDir = tempfile.mkdtemp(), tempfile.mkdtemp()
+    try :
+        with open(os.path.join(sourceDir, "arcs.csv"), "w") as f:
+            f.write("source,destination,capacity\n")
+            for i in range(numRows) :
+                f.write("s%s,d%s,%s\n"%(i, i%100, i%7))
+        def copyIt() :
+            dat = tdf.csv.create_tic_dat(sourceDir, freeze_it=True)
+            tdf.csv.write_directory(dat, targetDir, allow_overwrite=True)
+        print "copying a generator table of %s csv rows : %.2f seconds"%(numRows, timeIt(copyIt, 3))
+    finally :
+        shutil.rmtree(sourceDir)
+        shutil.rmtree(targetDir)
+
+def benchmarkSameData(numRows = 200000) :
+    tdf = TicDatFactory(flows = [[], ["source", "destination", "quantity"]])
+    rows = [("s%s"%(i%1000), "d%s"%(i%997), float(i)) for i in range(numRows)]
+    dat1, dat2 = tdf.TicDat(flows = rows), tdf.TicDat(flows = rows[::-1])
+    print "same_data for %s keyless rows : %.2f seconds"%(numRows, timeIt(lambda : tdf._same_data(dat1, dat2)))
+
+def benchmarkCopyOnWrite(numSites = 1000, numEdits = 10) :
+    tdf = distanceFactory()
+    makeBase = lambda : tdf.freeze_me(tdf.TicDat.from_rows(**distanceData(numSites)))
+    def copyAndEdit(base, copyOnWrite) :
+        rtn = tdf.copy_tic_dat(base, copy_on_write=copyOnWrite)
+        for i in range(numEdits) :
+            rtn.distance["s%s"%i, "s0"]["distance"] = -1
+        return rtn
+    baseMem = memoryDelta(makeBase)
+    mems = {copyOnWrite : memoryDelta(lambda : (lambda base : (base, copyAndEdit(base, copyOnWrite)))(makeBase()))
+                          - baseMem for copyOnWrite in (False, True)}
+    base = makeBase()
+    for copyOnWrite in (False, True) :
+        print "%s copy of %s rows with %s edits : %.4f seconds, %.1f MB"%(
+            "copy on write" if copyOnWrite else "deep", len(base.distance) + len(base.sites), numEdits,
+            timeIt(lambda : copyAndEdit(base, copyOnWrite)), mems[copyOnWrite]/1e6)
+
+def benchmarkFreeze(numSites = 2236) :
+    tdf = distanceFactory()
+    dat = tdf.TicDat.from_rows(**distanceData(numSites))
+    print "freeze_me of %s rows : %.4f seconds"%(len(dat.distance) + len(dat.sites),
+                                                 timeIt(lambda : tdf.freeze_me(dat)))
+
+def benchmarkCompactFreeze(numSites = 500, numDats = 8) :
+    # as from a file reader, every key field and data value is its own object
+    tdf = distanceFactory()
+    def makeDat(compact) :
+        distance = [(("s%s"%i, "s%s"%j), (float(i+j),)) for i in range(numSites) for j in range(numSites)]
+        return tdf.freeze_me(tdf.TicDat.from_rows(distance = distance), compact = compact)
+    # several resident objects, as for a solve service. the memory freed by compacting one object
+    # is reused by the next one
+    mems = {compact : memoryDelta(lambda : [makeDat(compact) for _ in range(numDats)])
+            for compact in (False, True)}
+    print "%s frozen TicDats of %s rows : %.1f MB, compacted : %.1f MB, %.0f%% saved"%(
+        numDats, numSites**2, mems[False]/1e6, mems[True]/1e6,
+        100. * (mems[False] - mems[True]) / mems[False])
+    dat = makeDat(False)
+    print "compacting it : %.2f seconds"%timeIt(lambda : tdf._compact(dat))
+
+def benchmarkPickle(numSites = 1000) :
+    import cPickle as pickle
+    tdf = distanceFactory()
+    data = distanceData(numSites)
+    dat = tdf.TicDat.from_rows(**data)
+    roundTrip = lambda x : pickle.loads(pickle.dumps(x, pickle.HIGHEST_PROTOCOL))
+    for name, f in (("raw dict of tuples", lambda : roundTrip(data)),
+                    ("as_dict", lambda : tdf.TicDat(**roundTrip(tdf.as_dict(dat)))),
+                    ("TicDat", lambda : roundTrip(dat))) :
+        print "pickle round trip of %s rows, %s : %.2f seconds"%(len(dat.distance) + len(dat.sites),
+                                                                name, timeIt(f))
+
+def benchmarkAttach(numSites = 1000) :
+    import cPickle as pickle
+    import tempfile
+    tdf = distanceFactory()
+    dat = tdf.freeze_me(tdf.TicDat.from_rows(**distanceData(numSites)))
+    filePath = os.path.join(tempfile.mkdtemp(), "distance.td")
+    print "publish_tic_dat of %s rows : %.2f seconds"%(len(dat.distance) + len(dat.sites),
+                                                        timeIt(lambda : tdf.publish_tic_dat(dat, filePath)))
+    pickled = pickle.dumps(dat, pickle.HIGHEST_PROTOCOL)
+    # what each worker process holds. The mapped columns of an attached object are shared by the workers
+    for name, f in (("unpickled copy", lambda : pickle.loads(pickled)),
+                    ("attach_tic_dat", lambda : tdf.attach_tic_dat(filePath))) :
+        print "%s : %.2f seconds, %.1f MB per worker"%(name, timeIt(f), memoryDelta(f)/1e6)
+    os.remove(filePath)
+
+_assignmentFactory = TicDatFactory(assignments = [["site"], ["assigned_to"]])
+def _assignToNearest(dat, passes = 1) :
+    # a cpu bound solve function for benchmarkRunScenarios. passes sets the amount of work per scenario
+    centers = [n for n,r in dat.sites.items() if r["center_status"] == "canBeCenter"]
+    for _ in range(passes) :
+        rtn = {n : min(centers, key = lambda c : dat.distance[n, c]["distance"]) for n in dat.sites}
+    return _assignmentFactory.TicDat(assignments = rtn)
+
+def benchmarkRunScenarios(numSites = 300, numScenarios = 16, passes = 20) :
+    from ticdat.scenarios import run_scenarios
+    tdf = distanceFactory()
+    dat = tdf.freeze_me(tdf.TicDat.from_rows(**distanceData(numSites)))
+    serial = None
+    for processes in sorted({1, 2, 4, multiprocessing.cpu_count()}) :
+        seconds = timeIt(lambda : list(run_scenarios(tdf, _assignToNearest, [dat] * numScenarios,
+                                                     processes = processes, kwargs = {"passes" : passes})))
+        serial = serial or seconds
+        print "%s scenarios of %s rows, %s processes : %.2f seconds, %.1fx speedup (%s cpus)"%(
+            numScenarios, len(dat.distance) + len(dat.sites), processes, seconds, serial / seconds,
+            multiprocessing.cpu_count())
+
+def benchmarkFingerprint(numSites = 1000) :
+    tdf = distanceFactory()
+    dat = tdf.TicDat.from_rows(**distanceData(numSites))
+    print "fingerprint of %s rows : %.2f seconds"%(len(dat.distance) + len(dat.sites),
+                                                    timeIt(lambda : tdf.fingerprint(dat)))
+    tdf.freeze_me(dat)
+    tdf.fingerprint(dat)
+    print "fingerprint of the frozen object, 100 times : %.4f seconds"%timeIt(
+        lambda : [tdf.fingerprint(dat) for _ in range(100)])
+
+def benchmarkSolveCache(numSites = 300, passes = 5) :
+    import tempfile, shutil
+    from ticdat.solvecache import SolveCache
+    tdf = distanceFactory()
+    scratch = tempfile.mkdtemp()
+    try :
+        cache = SolveCache(tdf, _assignmentFactory, lambda dat : _assignToNearest(dat, passes),
+                           os.path.join(scratch, "cache.db"), "benchmark")
+        makeDat = lambda : tdf.TicDat.from_rows(**distanceData(numSites))
+        dat = makeDat()
+        rows = len(dat.distance) + len(dat.sites)
+        print "solve of %s rows, not cached : %.2f seconds"%(rows, timeIt(lambda : cache.solve(dat)))
+        dat = makeDat()
+        print "solve of %s rows, cached, new input object : %.3f seconds"%(rows, timeIt(lambda : cache.solve(dat)))
+        tdf.freeze_me(dat)
+        tdf.fingerprint(dat)
+        print "solve of %s rows, cached, fingerprinted frozen input object : %.4f seconds"%(
+            rows, timeIt(lambda : cache.solve(dat)))
+    finally :
+        shutil.rmtree(scratch)
+
+def benchmarkDiff(numSites = 1000, numEdits = 10000) :
+    tdf = distanceFactory()
+    old, same, new = [tdf.TicDat.from_rows(**distanceData(numSites)) for _ in range(3)]
+    for i, k in enumerate(new.distance.keys()[:numEdits]) :
+        if i % 2 :
+            del(new.distance[k])
+        else :
+            new.distance[k]["distance"] += 1
+    rows = len(old.distance) + len(old.sites)
+    print "same_data of %s rows, no edits : %.2f seconds"%(rows, timeIt(lambda : tdf.same_data(old, same)))
+    print "diff of %s rows, no edits : %.2f seconds"%(rows, timeIt(lambda : tdf.diff(old, same)))
+    print "diff of %s rows, %s edits : %.2f seconds"%(rows, numEdits, timeIt(lambda : tdf.diff(old, new)))
+
+def benchmarkParallelCsv(numTables = 8, numRows = 200000) :
+    import tempfile, shutil
+    tdf = TicDatFactory(**{"table%s"%i : [["name"], ["x", "y"]] for i in range(numTables)})
+    dat = tdf.TicDat(**{t : {"row%s"%j : (j, j * 0.5) for j in range(numRows)} for t in tdf.all_tables})
+    scratch = tempfile.mkdtemp()
+    try :
+        dirPath = os.path.join(scratch, "csv")
+        tdf.csv.write_directory(dat, dirPath)
+        del(dat)
+        serial = None
+        for workers in sorted({1, 2, 4, multiprocessing.cpu_count()}) :
+            seconds = timeIt(lambda : tdf.csv.create_tic_dat(dirPath, workers = workers))
+            serial = serial or seconds
+            print "%s csv files of %s rows, %s workers : %.2f seconds, %.1fx speedup (%s cpus)"%(
+                numTables, numRows, workers, seconds, serial / seconds, multiprocessing.cpu_count())
+    finally :
+        shutil.rmtree(scratch)
+
+def benchmarkCsvConverters(numRows = 500000) :
+    import tempfile, shutil
+    tdf = TicDatFactory(orders = [["order"], ["customer", "product", "quantity", "price"]])
+    dat = tdf.TicDat(orders = {"order%s"%i : ("customer%s"%(i % 1000), "product%s"%(i % 97), i % 13, i * 0.01)
+                               for i in range(numRows)})
+    scratch = tempfile.mkdtemp()
+    try :
+        dirPath = os.path.join(scratch, "csv")
+        tdf.csv.write_directory(dat, dirPath)
+        del(dat)
+        print "%s rows of 3 string and 2 number columns : %.2f seconds"%(
+            numRows, timeIt(lambda : tdf.csv.create_tic_dat(dirPath)))
+    finally :
+        shutil.rmtree(scratch)
+
+def benchmarkCsvRowsPerSecond(numRows = 10000000, numOrders = 1000000) :
+    import tempfile, shutil, csv
+    fields = ["order", "customer", "product", "quantity", "price"]
+    scratch = tempfile.mkdtemp()
+    try :
+        with open(os.path.join(scratch, "orders.csv"), "w") as f :
+            writer = csv.writer(f)
+            writer.writerow(fields + ["comment"])
+            writer.writerows(("order%s"%(i % numOrders), "customer%s"%(i % 1000), "product%s"%(i % 97),
+                              i % 13, i * 0.01, "unused") for i in xrange(numRows))
+        tdf = TicDatFactory(orders = [[], fields])
+        tdf.set_generator_tables(["orders"])
+        seconds = timeIt(lambda : sum(1 for _ in tdf.csv.create_tic_dat(scratch).orders()))
+        print "%s rows read from a generator table : %.1f seconds, %.0f rows/sec"%(
+            numRows, seconds, numRows / seconds)
+        tdf = TicDatFactory(orders = [fields[:1], fields[1:]])
+        seconds = timeIt(lambda : tdf.csv.get_duplicates(scratch))
+        print "%s rows checked for duplicates : %.1f seconds, %.0f rows/sec"%(numRows, seconds, numRows / seconds)
+    finally :
+        shutil.rmtree(scratch)
+
+def _allBenchmarks() :
+    return {k:v for k,v in globals().items() if k.startswith("benchmark") and callable(v)}
+
+if __name__ == "__main__":
+    for name in (sys.argv[1:] or sorted(_allBenchmarks())) :
+        print "!!! %s !!!"%name
+        _allBenchmarks()[name]()
@@ -38,6 +38,16 @@ class TestCsv(unittest.TestCase):
         self.assertTrue(firesException(change))
         self.assertTrue(tdf._same_data(ticDat, csvTicDat))
 
+        self.assertTrue(self.firesException(lambda : tdf.csv.create_tic_dat(dirPath, workers=2)))
+        self.assertTrue(self.firesException(lambda : tdf.csv.create_tic_dat(dirPath, dialect="excel-tab",
+                                                                            workers=0)))
+        csvTicDat = tdf.csv.create_tic_dat(dirPath, freeze_it=True, dialect="excel-tab", workers=2)
+        self.assertTrue(tdf._same_data(ticDat, csvTicDat) and csvTicDat._isFrozen)
+        os.remove(os.path.join(dirPath, "foods.csv"))
+        csvTicDat = tdf.csv.create_tic_dat(dirPath, dialect="excel-tab", workers=8)
+        self.assertTrue(not csvTicDat.foods and len(csvTicDat.categories) == len(ticDat.categories))
+        self.assertTrue(tdf._same_data(csvTicDat, tdf.csv.create_tic_dat(dirPath, dialect="excel-tab")))
+
     def testNetflow(self):
         tdf = TicDatFactory(**netflowSchema())
         ticDat = tdf.TicDat(**{t:getattr(netflowData(),t) for t in tdf.primary_key_fields})
@@ -66,6 +76,66 @@ class TestCsv(unittest.TestCase):
         csvTicDat = tdf.csv.create_tic_dat(dirPath, freeze_it=True)
         self.assertFalse(tdf._same_data(ticDat, csvTicDat))
 
+    def testDataTypes(self):
+        tdf = TicDatFactory(parts = [["name"], ["kind", "weight", "code"]])
+        tdf.set_data_type("parts", "kind", number_allowed = False, strings_allowed = "*")
+        tdf.set_data_type("parts", "weight")
+        ticDat = tdf.TicDat(parts = {"p1" : ("12", 3.5, "x1"), "p2" : ("bolt", "heavy", 7),
+                                     3 : ("nut", float("inf"), -2.5), "p4" : ("", 0, "")})
+        dirPath = os.path.join(_scratchDir, "dataTypes")
+        tdf.csv.write_directory(ticDat, dirPath)
+        csvTicDat = tdf.csv.create_tic_dat(dirPath)
+        # the strings only field is read as is, the other fields are read as floats where possible
+        self.assertTrue(tdf._same_data(ticDat, csvTicDat))
+        self.assertTrue(csvTicDat.parts["p1"]["kind"] == "12" and csvTicDat.parts[3]["code"] == -2.5)
+        self.assertTrue(csvTicDat.parts["p4"]["code"] == "" and csvTicDat.parts[3.0]["weight"] == float("inf"))
+        self.assertTrue(tdf.find_data_type_failures(csvTicDat).keys() == [("parts", "weight")])
+        gtdf = TicDatFactory(parts = [[], ["name", "kind", "weight", "code"]])
+        gtdf.set_data_type("parts", "kind", number_allowed = False, strings_allowed = "*")
+        gtdf.set_generator_tables(["parts"])
+        self.assertTrue(sorted(tuple(r.values()) for r in gtdf.csv.create_tic_dat(dirPath).parts()) ==
+                        sorted((k,) + tuple(r.values()) for k,r in csvTicDat.parts.items()))
+
+    def testExtraColumns(self):
+        tdf = TicDatFactory(parts = [["name"], ["kind", "weight"]], notes = [[], ["note", "part"]])
+        dirPath = makeCleanDir(os.path.join(_scratchDir, "extraColumns"))
+        with open(os.path.join(dirPath, "parts.csv"), "w") as f :
+            f.write("\nweight,extra,name,kind\n1,x,p1,bolt\n\n2.5,y,p2,nut,more,values\n3,z,p3\n4,w,p1,screw\n")
+        with open(os.path.join(dirPath, "notes.csv"), "w") as f :
+            f.write("part,note\n")
+        ticDat = tdf.csv.create_tic_dat(dirPath)
+        self.assertTrue(ticDat.parts["p1"]["kind"] == "screw" and ticDat.parts["p2"]["weight"] == 2.5)
+        self.assertTrue(ticDat.parts["p3"]["kind"] is None and len(ticDat.parts) == 3 and not ticDat.notes)
+        self.assertTrue(tdf.csv.get_duplicates(dirPath) == {"parts" : {"p1" : 2}})
+        with open(os.path.join(dirPath, "notes.csv"), "w") as f :
+            f.write("part\n")
+        self.assertTrue("notes" in self.firesException(lambda : tdf.csv.create_tic_dat(dirPath)))
+
+    def testExtraColumnsWorkers(self):
+        # reordered and extra columns, read by worker processes with the per-column converters
+        tdf = TicDatFactory(parts = [["name"], ["kind", "weight", "label"]], bins = [["bin", "slot"], ["qty"]],
+                            notes = [[], ["note", "part"]])
+        tdf.set_data_type("parts", "kind", number_allowed = False, strings_allowed = "*")
+        tdf.set_data_type("parts", "weight")
+        tdf.set_generator_tables(["notes"])
+        dirPath = makeCleanDir(os.path.join(_scratchDir, "extraColumnsWorkers"))
+        with open(os.path.join(dirPath, "parts.csv"), "w") as f :
+            f.write("label,extra,weight,kind,name\n12,x,1,007,001\nbig,y,light,nut,p2,more\n3.5,z\n")
+        with open(os.path.join(dirPath, "bins.csv"), "w") as f :
+            f.write("qty,slot,junk,bin\n" + "".join("%s,%s,j,b%s\n"%(i, i % 3, i) for i in range(20)))
+        with open(os.path.join(dirPath, "notes.csv"), "w") as f :
+            f.write("part,extra,note\n001,x,1.5\np2,y,loose\n")
+        dats = [tdf.csv.create_tic_dat(dirPath, workers=w) for w in (None, 2)]
+        self.assertTrue(tdf._same_data(*dats))
+        for ticDat in dats :
+            # kind is read as is, and the other fields as floats where possible
+            self.assertTrue(dict(ticDat.parts[1].items()) == {"kind" : "007", "weight" : 1.0, "label" : 12.0})
+            self.assertTrue(dict(ticDat.parts["p2"].items()) == {"kind" : "nut", "weight" : "light",
+                                                                 "label" : "big"})
+            self.assertTrue(dict(ticDat.parts[None].items()) == {"kind" : None, "weight" : None, "label" : 3.5})
+            self.assertTrue(len(ticDat.bins) == 20 and ticDat.bins["b7", 1]["qty"] == 7)
+            self.assertTrue([(r["note"], r["part"]) for r in ticDat.notes()] == [(1.5, 1.0), ("loose", "p2")])
+
     def testSilly(self):
         def doTest(headersPresent) :
             tdf = TicDatFactory(**sillyMeSchema())
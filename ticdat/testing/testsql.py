@@ -174,6 +174,75 @@ class TestSql(unittest.TestCase):
         self.assertTrue(tdf._same_data(ticDat, ticDatNone))
         self.assertTrue(ticDatNone.a["theboger"]["aData2"] == None)
 
+    def testSolveCache(self):
+        from ticdat.solvecache import SolveCache
+        tdf = TicDatFactory(**dietSchema())
+        soln_tdf = TicDatFactory(buyFood = [["food"], ["qty"]])
+        solves = []
+        def solve(dat) :
+            solves.append(dat)
+            if not dat.foods :
+                return None
+            return soln_tdf.TicDat(buyFood = {f : r["cost"] for f,r in dat.foods.items()})
+        filePath = makeCleanPath(os.path.join(_scratchDir, "cache.db"))
+        makeDat = lambda : tdf.TicDat(**{t:getattr(dietData(),t) for t in tdf.primary_key_fields})
+        cache = SolveCache(tdf, soln_tdf, solve, filePath, "v1")
+        soln = cache.solve(makeDat())
+        self.assertTrue(len(solves) == 1 and not getattr(soln, "_isFrozen", False))
+        # the same data, even in another object or another SolveCache, is a hit
+        cached = SolveCache(tdf, soln_tdf, solve, filePath, "v1").solve(makeDat(), freeze_it=True)
+        self.assertTrue(len(solves) == 1 and soln_tdf._same_data(soln, cached) and cached._isFrozen)
+        self.assertTrue(soln_tdf.good_tic_dat_object(cached))
+        # a new version, or new data, is a miss
+        self.assertTrue(soln_tdf._same_data(SolveCache(tdf, soln_tdf, solve, filePath, "v2").solve(makeDat()),
+                                            soln) and len(solves) == 2)
+        dat = makeDat()
+        dat.foods["milk"]["cost"] += 1
+        self.assertTrue(cache.solve(dat).buyFood["milk"]["qty"] == dat.foods["milk"]["cost"] and len(solves) == 3)
+        cache.solve(dat)
+        self.assertTrue(len(solves) == 3)
+        # None is cached too
+        self.assertTrue(cache.solve(tdf.TicDat()) is None and cache.solve(tdf.TicDat()) is None and len(solves) == 4)
+        # a changed solution schema is treated as a miss
+        other_tdf = TicDatFactory(buyFood = [["food"], ["qty", "note"]])
+        self.assertTrue(SolveCache(tdf, other_tdf, lambda dat : other_tdf.TicDat(), filePath, "v1").solve(dat)
+                        is not None and len(solves) == 4)
+        self.assertTrue(SolveCache(tdf, other_tdf, solve, filePath, "v1").solve(dat) is not None)
+        self.assertTrue(len(solves) == 4)
+        self.assertTrue(self.firesException(lambda : SolveCache(tdf, soln_tdf, solve, filePath, "v3").solve(
+            soln_tdf.TicDat())))
+        self.assertTrue(self.firesException(lambda : SolveCache(tdf, soln_tdf, lambda dat : dat, filePath, "v3")
+                                            .solve(makeDat())))
+        self.assertTrue(self.firesException(lambda : SolveCache(tdf, soln_tdf, solve, _scratchDir, "v1")))
+        self.assertTrue(self.firesException(lambda : SolveCache(tdf, soln_tdf, solve, filePath, 1)))
+
+        # the least recently used solutions are evicted to stay within the budget
+        cache.clear()
+        cache.solve(makeDat())
+        size = cache._connect().execute("SELECT bytes FROM solutions").fetchone()[0]
+        cache = SolveCache(tdf, soln_tdf, solve, filePath, "v1", max_bytes = 2 * size + 10)
+        dats = [makeDat() for _ in range(3)]
+        for i, dat in enumerate(dats) :
+            dat.foods["milk"]["cost"] = 10 + i
+        solves[:] = []
+        cache.solve(dats[0])
+        cache.solve(makeDat())
+        cache.solve(dats[1])
+        self.assertTrue(len(solves) == 2)
+        cache.solve(dats[0])
+        self.assertTrue(len(solves) == 3)
+        cache.solve(makeDat())
+        self.assertTrue(len(solves) == 4)
+        cache.solve(makeDat())
+        cache.solve(dats[0])
+        self.assertTrue(len(solves) == 4)
+        self.assertTrue(cache._connect().execute("SELECT COUNT(*) FROM solutions").fetchone()[0] == 2)
+        # a solution that doesn't fit in the budget isn't stored
+        cache = SolveCache(tdf, soln_tdf, solve, filePath, "v1", max_bytes = 10)
+        cache.solve(dats[2])
+        cache.solve(dats[2])
+        self.assertTrue(len(solves) == 6)
+
 
 
 _scratchDir = TestSql.__name__ + "_scratch"
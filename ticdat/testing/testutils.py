@@ -6,6 +6,42 @@ from ticdat.testing.ticdattestutils import dietData, dietSchema, netflowData, ne
 from ticdat.testing.ticdattestutils import sillyMeData, sillyMeSchema, runSuite, failToDebugger, flaggedAsRunAlone
 from ticdat.testing.ticdattestutils import assertTicDatTablesSame, DEBUG, addNetflowForeignKeys, addDietForeignKeys
 import itertools
+import math
+import cPickle as pickle
+
+def _allLinks(dat, tdf):
+    rtn = {}
+    for fkl in tdf._plan().foreign_key_links:
+        for k, row in getattr(dat, fkl.foreign_key.foreign_table).items():
+            link = getattr(row, fkl.link_name, None)
+            if fkl.foreign_key.cardinality == "one-to-one" :
+                rtn[fkl.link_name, k] = link if link is None else tuple(link.values())
+            else :
+                rtn[fkl.link_name, k] = {_k : tuple(r.values()) for _k,r in link.items()}
+    return rtn
+def _linkDicts(dat, tdf):
+    return [getattr(row, fkl.link_name) for fkl in tdf._plan().foreign_key_links
+            if fkl.foreign_key.cardinality == "many-to-one"
+            for row in getattr(dat, fkl.foreign_key.foreign_table).values()]
+
+def _appendageSchema():
+    return {"parentTable" : [["pk"],["pd1", "pd2"]],
+            "appendageChild" : [["ak"], ["ad1"]],
+            "badChild" : [["bk1", "bk2"], ["bd"]]}
+def _addAppendageForeignKeys(tdf):
+    tdf.add_foreign_key("appendageChild", "parentTable", ["ak", "pk"])
+    tdf.add_foreign_key("badChild", "parentTable", ["bk2", "pk"])
+def _appendageData():
+    return {"parentTable" : {1 : [1, 2], 2 : [3, 4], 3 : [5, 6]},
+            "appendageChild" : {1 : 10, 3 : 30, 4 : 40},
+            "badChild" : {("a", 1) : 1, ("b", 1) : 2, ("c", 3) : 3}}
+
+_costFactory = TicDatFactory(costs = [["food"], ["cost"]])
+def _scaledFoodCosts(dat, scale = 1):
+    # a module level solve function, so that run_scenarios can send it to the worker processes
+    if not dat.foods :
+        raise ValueError("no foods")
+    return _costFactory.TicDat(costs = {f : r["cost"] * scale for f,r in dat.foods.items()})
 
 #uncomment decorator to drop into debugger for assertTrue, assertFalse failures
 #@failToDebugger
@@ -467,10 +503,957 @@ class TestUtils(unittest.TestCase):
             d = TicDatFactory(**schema).schema()
             assert d == {k : map(list, v) for k,v in schema.items()}
 
+    def testTen(self):
+        tdf = TicDatFactory(**dietSchema())
+        addDietForeignKeys(tdf)
+        tdf.enable_foreign_key_links()
+        dat = tdf.TicDat(**{t:getattr(dietData(),t) for t in tdf.primary_key_fields})
+        dat2 = tdf.copy_tic_dat(dat, freeze_it=True)
+        self.assertTrue(all(type(getattr(dat, t)) is type(getattr(dat2, t)) for t in tdf.all_tables))
+        self.assertTrue(type(dat.foods["chicken"]) is type(dat2.foods["milk"]))
+        self.assertTrue(type(dat.foods["chicken"].nutritionQuantities) is
+                        type(dat2.foods["milk"].nutritionQuantities))
+        self.assertTrue(dat2.foods["milk"].nutritionQuantities["fat"] is
+                        dat2.nutritionQuantities["milk", "fat"])
+        def editLink() :
+            dat2.foods["milk"].nutritionQuantities["boger"] = dat2.nutritionQuantities["milk", "fat"]
+        self.assertTrue(self.firesException(editLink))
+        self.assertTrue(tdf._same_data(dat, dat2))
+
+    def testEleven(self):
+        tdf = TicDatFactory(**dietSchema())
+        rowTdf = TicDatFactory(**dietSchema())
+        for t in (tdf, rowTdf):
+            addDietForeignKeys(t)
+            t.enable_foreign_key_links()
+        tdf.set_columnar_tables(["nutritionQuantities", "categories"])
+        self.assertTrue(self.firesException(lambda : tdf.set_columnar_tables(["boger"])))
+        dat = tdf.TicDat(**{t:getattr(dietData(),t) for t in tdf.primary_key_fields})
+        rowDat = rowTdf.TicDat(**{t:getattr(dietData(),t) for t in tdf.primary_key_fields})
+        self.assertTrue(tdf._same_data(dat, rowDat) and tdf.good_tic_dat_object(dat))
+        self.assertTrue(dat.nutritionQuantities["chicken", "protein"]["qty"] == 32)
+        self.assertTrue(dat.foods["chicken"].nutritionQuantities["protein"]["qty"] == 32)
+        self.assertTrue(dat.categories["protein"].nutritionQuantities["chicken"]["qty"] == 32)
+        self.assertTrue(self.firesException(lambda : dat.nutritionQuantities["chicken", "protein"]["boger"]))
+
+        qty = dat.nutritionQuantities.column("qty")
+        self.assertTrue(len(qty) == len(dat.nutritionQuantities) and sum(qty) ==
+                        sum(r["qty"] for r in rowDat.nutritionQuantities.values()))
+        self.assertTrue(all(qty[i] == dat.nutritionQuantities[k]["qty"]
+                            for i,k in enumerate(dat.nutritionQuantities.keys())))
+
+        for d in (dat, rowDat):
+            d.nutritionQuantities["chicken", "protein"]["qty"] = "lots"
+            d.nutritionQuantities["pizza", "fiber"]["qty"] = 2
+            d.categories["fiber"] = [0, 10]
+            del(d.nutritionQuantities["hamburger", "calories"])
+            del(d.categories["sodium"])
+        self.assertTrue(tdf._same_data(dat, rowDat))
+        self.assertTrue(len(dat.nutritionQuantities) == len(rowDat.nutritionQuantities))
+        self.assertTrue(self.firesException(lambda : dat.nutritionQuantities.column("boger")))
+        self.assertTrue("lots" in dat.nutritionQuantities.column("qty"))
+        self.assertTrue(all(dat.nutritionQuantities.column("qty")[i] == dat.nutritionQuantities[k]["qty"]
+                            for i,k in enumerate(dat.nutritionQuantities.keys())))
+
+        frozen = tdf.copy_tic_dat(dat, freeze_it=True)
+        self.assertTrue(tdf._same_data(frozen, rowDat))
+        def editRow() :
+            frozen.nutritionQuantities["pizza", "fiber"]["qty"] = 3
+        def addRow() :
+            frozen.categories["boger"] = [1, 2]
+        self.assertTrue(self.firesException(editRow) and self.firesException(addRow))
+        thawed = tdf.copy_tic_dat(frozen)
+        self.assertTrue(thawed.categories["boger"]["maxNutrition"] == 0)
+        self.assertTrue(("boger" not in frozen.categories) and ("boger" in thawed.categories))
+        # integers too large to be stored exactly as doubles switch the column to a list
+        from array import array
+        thawed.categories["big"] = [2**53, -2**53]
+        self.assertTrue(type(thawed.categories.column("maxNutrition")) is array)
+        for big in (2**53 + 1, -2**60 - 1) :
+            thawed.categories["big"]["minNutrition"] = big
+            self.assertTrue(thawed.categories["big"]["minNutrition"] == big)
+        self.assertTrue(type(thawed.categories.column("minNutrition")) is list)
+        thawed.categories["bigger"] = [1, 2**60 + 1]
+        self.assertTrue(thawed.categories["bigger"]["maxNutrition"] == 2**60 + 1)
+
+    def testTwelve(self):
+        def rowsOnly(dat, tdf) :
+            return {t : {k : tuple(r[f] for f in tdf.data_fields[t]) for k,r in getattr(dat, t).items()}
+                    if tdf.primary_key_fields.get(t) else
+                    [tuple(r[f] for f in tdf.data_fields[t]) for r in getattr(dat, t)]
+                    for t in tdf.all_tables}
+        for schema, data, addFks in ((dietSchema, dietData, addDietForeignKeys),
+                                     (netflowSchema, netflowData, addNetflowForeignKeys),
+                                     (sillyMeSchema, lambda : None, lambda tdf : None)):
+            for columnar in (True, False):
+                tdf = TicDatFactory(**schema())
+                addFks(tdf)
+                tdf.enable_foreign_key_links()
+                if columnar:
+                    tdf.set_columnar_tables([t for t in tdf.all_tables
+                                             if tdf.primary_key_fields[t] and tdf.data_fields[t]])
+                dat = tdf.TicDat(**(sillyMeData() if data() is None else
+                                    {t : getattr(data(), t) for t in tdf.all_tables}))
+                rows = rowsOnly(dat, tdf)
+                fromRows = tdf.TicDat.from_rows(**rows)
+                self.assertTrue(tdf._same_data(dat, fromRows) and tdf.good_tic_dat_object(fromRows))
+                self.assertTrue(all(type(getattr(dat, t)) is type(getattr(fromRows, t))
+                                    for t in tdf.all_tables))
+                fromPairs = tdf.TicDat.from_rows(**{t : v.items() if utils.dictish(v) else v
+                                                    for t,v in rows.items()})
+                self.assertTrue(tdf._same_data(dat, fromPairs))
+                self.assertTrue(tdf._same_data(tdf.TicDat(), tdf.TicDat.from_rows()))
+        tdf = TicDatFactory(**dietSchema())
+        addDietForeignKeys(tdf)
+        tdf.enable_foreign_key_links()
+        dat = tdf.TicDat.from_rows(**rowsOnly(tdf.TicDat(**{t : getattr(dietData(), t)
+                                                           for t in tdf.all_tables}), tdf))
+        self.assertTrue(dat.foods["chicken"].nutritionQuantities["protein"] is
+                        dat.nutritionQuantities["chicken", "protein"])
+
+        tdf = TicDatFactory(**sillyMeSchema())
+        tdf.set_generator_tables(["c"])
+        dat = tdf.TicDat.from_rows(c = lambda : iter(sillyMeData()["c"]))
+        self.assertTrue(tdf._same_data(dat, tdf.TicDat(c = sillyMeData()["c"])))
+        self.assertTrue(self.firesException(lambda : tdf.TicDat.from_rows(d = [])))
+        # from_rows checks the lengths of the data rows and the primary keys
+        for columnar in (True, False) :
+            tdf = TicDatFactory(**sillyMeSchema())
+            if columnar :
+                tdf.set_columnar_tables(["a"])
+            self.assertTrue(self.firesException(lambda : tdf.TicDat.from_rows(a = {1 : (1, 2)})))
+            self.assertTrue(self.firesException(lambda : tdf.TicDat.from_rows(a = {(1, 2) : (1, 2, 3)})))
+            self.assertTrue(self.firesException(lambda : tdf.TicDat.from_rows(b = {(1, 2) : (1,)})))
+            self.assertTrue(self.firesException(lambda : tdf.TicDat.from_rows(b = [((1, 2, 3), ())])))
+            self.assertTrue(self.firesException(lambda : tdf.TicDat.from_rows(c = [(1, 2, 3)])))
+            # the data rows have to be sequences, else a dict row would store its field names as data
+            for row in ({"aData3" : 1, "aData1" : 2, "aData2" : 3}, {1, 2, 3}) :
+                self.assertTrue(self.firesException(lambda : tdf.TicDat.from_rows(a = {1 : row})))
+            self.assertTrue(self.firesException(lambda : tdf.TicDat.from_rows(c = [{"cData%s"%i : i for i in range(1, 5)}])))
+        tdf = TicDatFactory(a = [["k"], ["x", "y"]])
+        self.assertTrue(self.firesException(lambda : tdf.TicDat.from_rows(a = {1 : {"y" : 5, "x" : 6}})))
+        self.assertTrue(tdf.TicDat.from_rows(a = {1 : [6, 5]}).a[1]["x"] == 6)
+        tdf = TicDatFactory(**sillyMeSchema())
+        tdf.set_generator_tables(["c"])
+        self.assertTrue(self.firesException(lambda : list(tdf.TicDat.from_rows(c = [(1, 2, 3)]).c())))
+
+    def testThirteen(self):
+        tdf = TicDatFactory(**netflowSchema())
+        addNetflowForeignKeys(tdf)
+        tdf.set_default_value("arcs", "capacity", 12)
+        tdf.set_data_type("cost", "cost", max=100)
+        self.assertFalse(tdf.foreign_keys is tdf.foreign_keys)
+        dat = tdf.copy_tic_dat(netflowData())
+        dat.cost["Pencils", "Detroit", "Boger"] = 200
+        dat.arcs["Detroit", "Boger"] = 10
+        fkFailures = tdf.find_foreign_key_failures(dat)
+        self.assertTrue(fkFailures and tdf._has_been_used)
+        # the schema can't change anymore, so the compiled plan is cached
+        for attr in ("foreign_keys", "default_values", "generator_tables", "data_types"):
+            self.assertTrue(getattr(tdf, attr) is getattr(tdf, attr))
+        self.assertTrue(tdf._foreign_keys_by_native() is tdf._foreign_keys_by_native())
+        self.assertTrue(tdf.default_values["arcs"]["capacity"] == 12)
+        self.assertTrue(tdf.TicDat().arcs["new", "arc"]["capacity"] == 12)
+        self.assertTrue(fkFailures == tdf.find_foreign_key_failures(dat))
+        self.assertTrue({(k.native_table, k.foreign_table) : v.native_pks for k,v in fkFailures.items()} ==
+                        {("cost", "nodes") : (("Pencils", "Detroit", "Boger"),),
+                         ("arcs", "nodes") : (("Detroit", "Boger"),)})
+        self.assertTrue(tdf.find_data_type_failures(dat).keys() == [("cost", "cost")])
+        newTdf = TicDatFactory(**netflowSchema())
+        addNetflowForeignKeys(newTdf)
+        self.assertTrue(newTdf.find_foreign_key_failures(dat) == fkFailures)
+
+    def testFourteen(self):
+        for schema, data, addFks in ((dietSchema, dietData, addDietForeignKeys),
+                                     (netflowSchema, netflowData, addNetflowForeignKeys),
+                                     (_appendageSchema, _appendageData, _addAppendageForeignKeys)):
+            for columnar in (False, True):
+                tdfs = {}
+                for lazy in (False, True):
+                    tdf = tdfs[lazy] = TicDatFactory(**schema())
+                    addFks(tdf)
+                    tdf.enable_foreign_key_links(lazy=lazy)
+                    if columnar:
+                        tdf.set_columnar_tables([t for t in tdf.all_tables
+                                                 if tdf.primary_key_fields[t] and tdf.data_fields[t]])
+                dats = {lazy : tdf.TicDat(**(data() if utils.dictish(data()) else
+                                             {t : getattr(data(), t) for t in tdf.all_tables}))
+                        for lazy,tdf in tdfs.items()}
+                self.assertTrue(tdfs[True]._same_data(dats[True], dats[False]))
+                self.assertFalse(dats[True]._link_indicies)
+                self.assertTrue(_allLinks(dats[True], tdfs[True]) == _allLinks(dats[False], tdfs[False]))
+                self.assertTrue(dats[True]._link_indicies)
+                frozen = tdfs[True].copy_tic_dat(dats[True], freeze_it=True)
+                self.assertTrue(_allLinks(frozen, tdfs[True]) == _allLinks(dats[False], tdfs[False]))
+                self.assertTrue(all(l._dataFrozen for l in _linkDicts(frozen, tdfs[True])))
+
+        tdf = TicDatFactory(**dietSchema())
+        addDietForeignKeys(tdf)
+        tdf.enable_foreign_key_links(lazy=True)
+        dat = tdf.TicDat(**{t : getattr(dietData(), t) for t in tdf.all_tables})
+        self.assertTrue(dat.foods["chicken"].nutritionQuantities["protein"] is
+                        dat.categories["protein"].nutritionQuantities["chicken"] is
+                        dat.nutritionQuantities["chicken", "protein"])
+        self.assertTrue(dat.foods["chicken"].nutritionQuantities is dat.foods["chicken"].nutritionQuantities)
+        self.assertFalse(hasattr(dat.foods["chicken"], "boger"))
+        frozen = tdf.freeze_me(dat)
+        def editLink() :
+            frozen.foods["milk"].nutritionQuantities["boger"] = frozen.nutritionQuantities["milk", "fat"]
+        self.assertTrue(self.firesException(editLink))
+
+    def testFifteen(self):
+        def dietEdits(dat):
+            dat.nutritionQuantities["tofu", "protein"] = 10
+            dat.foods["tofu"] = 2
+            yield
+            del dat.nutritionQuantities["chicken", "protein"]
+            dat.nutritionQuantities["milk", "fat"] = 100
+            dat.nutritionQuantities.pop("hamburger", "calories")
+            yield
+            del dat.categories["sodium"]
+            dat.foods.update({"beans" : 1})
+            dat.nutritionQuantities.update({("beans", "fat") : 3})
+            dat.nutritionQuantities["beans", "protein"]["qty"] = 4
+        def netflowEdits(dat):
+            dat.arcs["Detroit", "Boger"] = 5
+            dat.nodes["Boger"] = {}
+            yield
+            del dat.nodes["Detroit"]
+            dat.cost["Pencils", "Boger", "New York"] = 3
+            yield
+            del dat.arcs["Denver", "Boston"]
+            dat.nodes["Detroit"] = ()
+        def appendageEdits(dat):
+            dat.appendageChild[2] = 20
+            del dat.appendageChild[1]
+            yield
+            dat.parentTable[4] = [7, 8]
+            dat.appendageChild[3] = 33
+            yield
+            dat.badChild["d", 4] = 1
+            del dat.parentTable[1]
+        for schema, data, addFks, edits in (
+                (dietSchema, dietData, addDietForeignKeys, dietEdits),
+                (netflowSchema, netflowData, addNetflowForeignKeys, netflowEdits),
+                (_appendageSchema, _appendageData, _addAppendageForeignKeys, appendageEdits)):
+            for columnar, lazy in itertools.product((False, True), (False, True)):
+                tdf = TicDatFactory(**schema())
+                addFks(tdf)
+                tdf.enable_foreign_key_links(lazy=lazy)
+                if columnar:
+                    tdf.set_columnar_tables([t for t in tdf.all_tables
+                                             if tdf.primary_key_fields[t] and tdf.data_fields[t]])
+                dat = tdf.TicDat(**(data() if utils.dictish(data()) else
+                                    {t : getattr(data(), t) for t in tdf.all_tables}))
+                for _ in edits(dat):
+                    # the links are checked (and thus built, if lazy) part way through the edits
+                    self.assertTrue(_allLinks(dat, tdf) == _allLinks(tdf.copy_tic_dat(dat), tdf))
+                self.assertTrue(_allLinks(dat, tdf) == _allLinks(tdf.copy_tic_dat(dat), tdf))
+
+        tdf = TicDatFactory(**dietSchema())
+        addDietForeignKeys(tdf)
+        tdf.enable_foreign_key_links()
+        dat = tdf.TicDat(**{t : getattr(dietData(), t) for t in tdf.all_tables})
+        dat.nutritionQuantities["chicken", "protein"] = 1000
+        self.assertTrue(dat.foods["chicken"].nutritionQuantities["protein"] is
+                        dat.categories["protein"].nutritionQuantities["chicken"] is
+                        dat.nutritionQuantities["chicken", "protein"])
+        self.assertTrue(dat.foods["chicken"].nutritionQuantities["protein"]["qty"] == 1000)
+
+    def testSixteen(self):
+        schema = dict(sillyMeSchema(), e = [["x", "y"], []])
+        def makeFactory(columnar = False, generator = False):
+            tdf = TicDatFactory(**schema)
+            tdf.add_foreign_key("b", "a", ["bField1", "aField"])
+            tdf.add_foreign_key("b", "e", [["bField2", "x"], ["bData", "y"]])
+            tdf.add_foreign_key("c", "a", ["cData4", "aField"])
+            tdf.add_foreign_key("c", "b", [["cData1", "bField1"], ["cData2", "bField2"], ["cData3", "bField3"]])
+            if columnar:
+                tdf.set_columnar_tables(["a", "b"])
+            if generator:
+                tdf.set_generator_tables(["c"])
+            return tdf
+        data = dict(sillyMeData(), e = [(2, 1), ("b", 12), ("b", 1)])
+        data["c"] += ((1, 2, 3, "b"), (1, 2, 4, 0.23))
+        def expected(tdf):
+            rtn = {}
+            for fk in tdf.foreign_keys:
+                native = data[fk.native_table]
+                for pk, row in (native.items() if utils.dictish(native) else enumerate(native)):
+                    cells = dict(zip(tdf.primary_key_fields[fk.native_table],
+                                     pk if utils.containerish(pk) else (pk,)),
+                                 **dict(zip(tdf.data_fields[fk.native_table],
+                                            row if utils.containerish(row) else (row,))))
+                    mapping = fk.foreigntonativemapping()
+                    fpk = tuple(cells[mapping[f]] for f in tdf.primary_key_fields[fk.foreign_table])
+                    if (fpk[0] if len(fpk) == 1 else fpk) not in set(data[fk.foreign_table]):
+                        nv = tuple(cells[nf] for nf in fk.nativefields())
+                        rtn.setdefault(fk, (set(), set()))[0].add(nv[0] if len(nv) == 1 else nv)
+                        rtn[fk][1].add(pk)
+            return rtn
+        setified = lambda fails : {k : (set(v.native_values), set(v.native_pks)) for k,v in fails.items()}
+        for columnar, generator in itertools.product((False, True), (False, True)):
+            tdf = makeFactory(columnar, generator)
+            dat = tdf.TicDat(**data)
+            checkThese = [dat, tdf.freeze_me(tdf.copy_tic_dat(dat))]
+            if not generator:
+                checkThese.append(type("PlainData", (object,), data)())
+            for singleScan in (False, True):
+                for d in checkThese:
+                    fails = tdf.find_foreign_key_failures(d, single_scan=singleScan)
+                    self.assertTrue(len(fails) == 4 and setified(fails) == expected(tdf))
+        self.assertTrue(makeFactory()._trusted_tic_dat(makeFactory(generator=True).TicDat()) is False)
+        tdf = makeFactory()
+        dat = tdf.TicDat(**data)
+        self.assertTrue(tdf._trusted_tic_dat(dat))
+        dat.a = dict(data["a"])
+        self.assertFalse(tdf._trusted_tic_dat(dat))
+        self.assertTrue(setified(tdf.find_foreign_key_failures(dat)) == expected(tdf))
+
 #
 # from ticdat import TicDatFactory
 # import itertools
 #
+
+    def testSeventeen(self):
+        def naiveRemoval(tdf, dat) : # the old, one full scan per cascade level, approach
+            failures = tdf.find_foreign_key_failures(dat)
+            while failures :
+                for fk, (_, pks) in failures.items() :
+                    for pk in sorted(pks, reverse=True) : # back to front, for the positions of list tables
+                        if pk in getattr(dat, fk.native_table) or utils.lupish(getattr(dat, fk.native_table)):
+                            del(getattr(dat, fk.native_table)[pk])
+                failures = tdf.find_foreign_key_failures(dat)
+        tdf = TicDatFactory(**netflowSchema())
+        addNetflowForeignKeys(tdf)
+        tdf.add_foreign_key("cost", "arcs", (("source", "source"), ("destination", "destination")))
+        dat, naiveDat = [tdf.TicDat(**{t:getattr(netflowData(),t) for t in tdf.all_tables}) for _ in range(2)]
+        self.assertFalse(tdf.find_foreign_key_failures(dat))
+        for d in (dat, naiveDat) :
+            del(d.nodes["Detroit"])
+            del(d.arcs["Denver", "Boston"])
+        counts = []
+        self.assertTrue(tdf.remove_foreign_keys_failures(dat, removal_counts_handler=counts.append) is dat)
+        naiveRemoval(tdf, naiveDat)
+        self.assertTrue(tdf._same_data(dat, naiveDat) and not tdf.find_foreign_key_failures(dat))
+        origDat = tdf.TicDat(**{t:getattr(netflowData(),t) for t in tdf.all_tables})
+        self.assertTrue(counts == [{t : len(getattr(origDat, t)) - len(getattr(dat, t)) -
+                                        (t in ("nodes", "arcs")) for t in tdf.all_tables}])
+        self.assertTrue(counts[0]["cost"] and counts[0]["arcs"] and counts[0]["inflow"])
+
+        # a self referencing table, and a pair of tables referencing each other, cascade through worklists
+        tdf = TicDatFactory(employees = [["name"], ["boss"]], desks = [["name"], ["owner"]],
+                            owners = [["name"], ["desk"]], visits = [[], ["employee"]])
+        tdf.add_foreign_key("employees", "employees", ["boss", "name"])
+        tdf.add_foreign_key("desks", "owners", ["owner", "name"])
+        tdf.add_foreign_key("owners", "desks", ["desk", "name"])
+        tdf.add_foreign_key("owners", "employees", ["name", "name"])
+        tdf.add_foreign_key("visits", "employees", ["employee", "name"])
+        components = [tables for tables, _ in tdf._plan().foreign_key_components]
+        self.assertTrue(components.index({"employees"}) < components.index({"desks", "owners"}))
+        self.assertTrue(components.index({"employees"}) < components.index({"visits"}))
+        def makeDat() :
+            rtn = tdf.TicDat(employees = {"e%s"%i : "e%s"%max(i-1, 0) for i in range(10)},
+                             owners = {"e%s"%i : "d%s"%i for i in range(10)},
+                             desks = {"d%s"%i : "e%s"%i for i in range(10)},
+                             visits = ["e%s"%(i%10) for i in range(30)])
+            self.assertFalse(tdf.find_foreign_key_failures(rtn))
+            return rtn
+        dat, naiveDat = makeDat(), makeDat()
+        for d in (dat, naiveDat) :
+            d.employees["e6"] = "gone"
+            del(d.desks["d2"])
+        tdf.remove_foreign_keys_failures(dat, removal_counts_handler=counts.append)
+        self.assertTrue(counts[-1] == {"employees" : 4, "owners" : 5, "desks" : 4, "visits": 12})
+        self.assertTrue(sorted(dat.employees) == ["e%s"%i for i in range(6)])
+        self.assertTrue(sorted(dat.owners) == sorted(r["owner"] for r in dat.desks.values())
+                        == ["e%s"%i for i in (0,1,3,4,5)])
+        self.assertTrue(sorted(r["employee"] for r in dat.visits) ==
+                        sorted(["e%s"%(i%10) for i in range(30) if i%10 < 6]))
+        naiveRemoval(tdf, naiveDat)
+        self.assertTrue(set(naiveDat.employees) == set(dat.employees) and
+                        set(naiveDat.owners) == set(dat.owners) and set(naiveDat.desks) == set(dat.desks))
+
+        # without propagation, only the rows failing at the outset are removed
+        dat = makeDat()
+        dat.employees["e6"] = "gone"
+        tdf.remove_foreign_keys_failures(dat, propagate=False, removal_counts_handler=counts.append)
+        self.assertTrue(counts[-1] == {"employees" : 1, "owners" : 0, "desks" : 0, "visits": 0})
+        # desks -> employees is a derived foreign key
+        self.assertTrue({fk.native_table for fk in tdf.find_foreign_key_failures(dat)} ==
+                        {"employees", "owners", "desks", "visits"})
+
+    def testEighteen(self):
+        import ticdat.columnar as columnar
+        values = [0, 1, 2.5, 3, 12, 12.0, -1, 100, float("inf"), float("nan"), None, True, "", "a", "b", u"a", "c",
+                  (), long(5)]
+        tdf = TicDatFactory(**{"t%s"%i : [["name"], ["data"]] for i in range(8)})
+        for i, kwargs in enumerate([{}, {"min" : 1, "max" : 12, "inclusive_max" : True},
+                                    {"min" : 1, "inclusive_min" : False, "must_be_int" : True},
+                                    {"number_allowed" : False, "strings_allowed" : ["a", "b"]},
+                                    {"strings_allowed" : "*", "nullable" : True},
+                                    {"min" : -1, "max" : 3, "strings_allowed" : ("c",), "nullable" : True},
+                                    {"min" : 2.5, "max" : 2.5, "inclusive_max" : True, "strings_allowed" : ["a"]},
+                                    {"number_allowed" : False, "nullable" : True}]) :
+            tdf.set_data_type("t%s"%i, "data", **kwargs)
+        for t, dt in [(t, tdf.data_types[t]["data"]) for t in tdf.all_tables] :
+            self.assertTrue([dt.validator()(v) for v in values] == [dt.valid_data(v) for v in values])
+            numbers = columnar.array("d", [v for v in values if type(v) in (int, long, float)])
+            self.assertTrue(columnar.failed_positions(numbers, dt, dt.validator()) ==
+                            [i for i,v in enumerate(numbers) if not dt.valid_data(v)])
+
+        tdfs = [TicDatFactory(**tdf.schema()) for _ in range(2)]
+        tdfs[1].set_columnar_tables(tdf.all_tables)
+        for _tdf in tdfs :
+            for t, dt in [(t, tdf.data_types[t]["data"]) for t in tdf.all_tables] :
+                _tdf.set_data_type(t, "data", **{k : getattr(dt, k) for k in dt._fields
+                                                 if k != "must_be_int" or dt.number_allowed})
+        numbers = [v for v in values if type(v) in (int, long, float) and v == v]
+        # columns of doubles, checked by numpy, and lists, checked value by value
+        for vals in (numbers, [v for v in values if type(v) is not tuple and v == v]) :
+            dats = [_tdf.TicDat(**{t : {i:v for i,v in enumerate(vals)} for t in tdf.all_tables})
+                    for _tdf in tdfs]
+            self.assertTrue(type(dats[1].t0.column("data")) is (list if len(vals) > len(numbers) else
+                                                                 columnar.array))
+            failures = [_tdf.find_data_type_failures(dat) for _tdf, dat in zip(tdfs, dats)]
+            for numpyWorked in (True, False) :
+                oldFlag, columnar.numpy_import_worked = columnar.numpy_import_worked, \
+                                                        columnar.numpy_import_worked and numpyWorked
+                try :
+                    columnarFailures = tdfs[1].find_data_type_failures(dats[1])
+                finally :
+                    columnar.numpy_import_worked = oldFlag
+                self.assertTrue(set(columnarFailures) == set(failures[0]))
+                for k, (badValues, pks) in failures[0].items() :
+                    self.assertTrue(set(pks) == set(columnarFailures[k].pks))
+                    # the columns of doubles return numbers as floats
+                    reprs = lambda vs : {repr(float(v) if type(v) in (int, long) else v) for v in vs}
+                    self.assertTrue(reprs(badValues) == reprs(columnarFailures[k].bad_values))
+            self.assertTrue({f.table for f in failures[0]} == set(tdf.all_tables))
+            for _tdf, dat in zip(tdfs, dats) :
+                _tdf.replace_data_type_failures(dat, {(t, "data") : None if t in ("t4", "t5", "t7") else
+                                                                    "a" if t in ("t3", "t6") else 2
+                                                      for t in tdf.all_tables})
+                self.assertFalse(_tdf.find_data_type_failures(dat))
+            self.assertTrue(tdfs[0]._same_data(*dats))
+
+    def testNineteen(self):
+        tdf = TicDatFactory(**dietSchema())
+        rows = lambda *_ : iter(_)
+        self.assertTrue(tdf._good_data_rows(rows({"qty" : 1}, [2], 3), "nutritionQuantities"))
+        for badRows, table, badMessage in [
+                ((3, {"qty" : 1, "boger" : 2}), "nutritionQuantities", "Inconsistent data field name keys."),
+                (([2], [1, 2]), "nutritionQuantities", "Inconsistent data row lengths."),
+                (({"minNutrition" : 1}, 3), "categories",
+                 "Non-container data rows supported only for single-data-field tables")]:
+            msg = []
+            self.assertFalse(tdf._good_data_rows(rows(*badRows), table, msg.append))
+            self.assertTrue(msg == [badMessage])
+        # the check stops at the first bad row
+        consumed = []
+        def badThenGood() :
+            for x in ([1, 2, 3], [1, 2], [1, 2]) :
+                consumed.append(x)
+                yield x
+        self.assertFalse(tdf._good_data_rows(badThenGood(), "categories") or len(consumed) != 1)
+
+        class Frozen(object) :
+            _isFrozen = True
+        obj = Frozen()
+        for t in tdf.all_tables :
+            setattr(obj, t, dict(getattr(dietData(), t)))
+        # only frozen TicDat objects are stamped, since the tables of other objects can still change
+        self.assertTrue(tdf.good_tic_dat_object(obj) and obj not in tdf._known_good_tic_dats)
+        self.assertFalse(tdf._trusted_tic_dat(obj))
+        obj.foods["junk"] = {"boger" : 1}
+        self.assertFalse(tdf.good_tic_dat_object(obj))
+        obj = Frozen()
+        for t in tdf.all_tables :
+            setattr(obj, t, dict(getattr(dietData(), t)))
+        obj.foods["junk"] = {"boger" : 1}
+        self.assertFalse(tdf.good_tic_dat_object(obj) or obj in tdf._known_good_tic_dats)
+
+        dat = tdf.freeze_me(tdf.TicDat(**{t:getattr(dietData(),t) for t in tdf.all_tables}))
+        self.assertTrue(dat in tdf._known_good_tic_dats and tdf.good_tic_dat_object(dat))
+        self.assertFalse(tdf.TicDat() in tdf._known_good_tic_dats)
+
+        # the rows of generator tables can change, and so are checked as they are generated
+        tdf = TicDatFactory(**sillyMeSchema())
+        tdf.set_generator_tables(["c"])
+        cRows = [[1, 2, 3, 4]]
+        dat = tdf.freeze_me(tdf.TicDat(a = {1 : [2, 3, 4]}, b = {(1, 2, 3) : 4}, c = lambda : iter(cRows)))
+        self.assertTrue(dat in tdf._known_good_tic_dats)
+        self.assertTrue(tdf.good_tic_dat_object(dat))
+        cRows[0] = [1, 2] # the TicDat generator makes rows with the row factory, which objects
+        self.assertTrue(tdf.good_tic_dat_object(dat) and self.firesException(lambda : list(dat.c())))
+
+    def testTwenty(self):
+        tdf = TicDatFactory(**sillyMeSchema())
+        tdf.set_generator_tables(["c"])
+        reads = []
+        def cRows() :
+            reads.append(1)
+            for i in range(10) :
+                yield [i, i+1, i+2, i+3]
+        dat = tdf.TicDat(a = {1 : [2, 3, 4]}, b = {(1, 2, 3) : 4}, c = cRows)
+        trustedDat = tdf.TicDat.from_rows(a = {1 : [2, 3, 4]}, b = {(1, 2, 3) : [4]}, c = cRows)
+        for d in (dat, trustedDat) :
+            self.assertTrue(tdf.good_tic_dat_object(d) and tdf.good_tic_dat_table(d.c, "c"))
+            tdf.freeze_me(tdf.copy_tic_dat(d))
+            self.assertTrue(tdf.good_tic_dat_object(tdf.freeze_me(d)))
+        self.assertFalse(reads) # validating the generator tables of TicDat objects doesn't read them
+        self.assertTrue([r["cData4"] for r in dat.c()] == range(3, 13) and len(reads) == 1)
+
+        # bad rows are found by the real pass over the generator
+        dat = tdf.TicDat(c = lambda : iter([[1, 2, 3, 4], [1, 2]]))
+        self.assertTrue(tdf.good_tic_dat_object(dat) and self.firesException(lambda : list(dat.c())))
+        # other generator functions have to be read to be validated, as the TicDatFactory doesn't know them
+        self.assertTrue(tdf.good_tic_dat_table(cRows, "c") and len(reads) == 2)
+        self.assertFalse(tdf.good_tic_dat_table(lambda : iter([[1, 2, 3, 4], [1, 2]]), "c"))
+        otherTdf = TicDatFactory(**sillyMeSchema())
+        otherTdf.set_generator_tables(["c"])
+        self.assertTrue(self.firesException(lambda : otherTdf.good_tic_dat_table(dat.c, "c")))
+
+    def testTwentyOne(self):
+        tdf = TicDatFactory(**sillyMeSchema())
+        dat = tdf.TicDat(**sillyMeData())
+        self.assertTrue(tdf.same_data(dat, tdf.TicDat(**sillyMeData())))
+        cRows = [r.values() for r in dat.c]
+        for cRows2, same in [(cRows[::-1], True), ([dict(zip(tdf.data_fields["c"], r)) for r in cRows], True),
+                             (cRows + cRows[:1], False), (cRows[:1] + cRows[:1] + cRows[2:], False),
+                             (cRows[:-1], False)] :
+            self.assertTrue(tdf.same_data(dat, tdf.TicDat(a = dat.a, b = dat.b, c = cRows2)) == same)
+        # the rows of tables without primary keys are multisets
+        dat1, dat2 = [tdf.TicDat(c = rows) for rows in ([[1, 2, 3, 4]] * 2 + [[5, 6, 7, 8]],
+                                                       [[1, 2, 3, 4]] + [[5, 6, 7, 8]] * 2)]
+        self.assertFalse(tdf.same_data(dat1, dat2) or tdf.same_data(dat2, dat1))
+        # fields missing from dict rows match neither defaults nor other values
+        class Plain(object) :
+            pass
+        plain1, plain2 = Plain(), Plain()
+        for plain, aRow in ((plain1, {"aData1" : 1}), (plain2, {"aData1" : 1})) :
+            plain.a, plain.b, plain.c = {1 : aRow}, {}, []
+        self.assertTrue(tdf.same_data(plain1, plain2))
+        self.assertFalse(tdf.same_data(plain1, tdf.TicDat(**plain1.__dict__)))
+        plain2.a[1]["aData2"] = None
+        self.assertFalse(tdf.same_data(plain1, plain2))
+        # unhashable data values fall back to comparing rows pairwise
+        unhashables = [[[1], 2, 3, 4], [{5 : 6}, 7, 8, 9]]
+        self.assertTrue(tdf.same_data(tdf.TicDat(c = unhashables), tdf.TicDat(c = unhashables[::-1])))
+        self.assertFalse(tdf.same_data(tdf.TicDat(c = unhashables), tdf.TicDat(c = unhashables[:1])))
+        self.assertTrue(self.firesException(lambda : tdf.same_data(dat, plain1.__dict__)))
+
+        # generator tables, and columnar tables
+        tdf = TicDatFactory(**sillyMeSchema())
+        tdf.set_generator_tables(["c"])
+        tdf.set_columnar_tables(["a"])
+        makeIt = lambda cRows : tdf.TicDat(a = sillyMeData()["a"], b = sillyMeData()["b"], c = lambda : iter(cRows))
+        self.assertTrue(tdf.same_data(makeIt(cRows), makeIt(cRows[::-1])))
+        self.assertFalse(tdf.same_data(makeIt(cRows), makeIt(cRows[1:])))
+        self.assertTrue(tdf.same_data(makeIt(cRows), tdf.copy_tic_dat(makeIt(cRows))))
+
+    def testTwentyTwo(self):
+        tdf = TicDatFactory(**dietSchema())
+        addDietForeignKeys(tdf)
+        makeDat = lambda : tdf.TicDat(**{t:getattr(dietData(),t) for t in tdf.all_tables})
+        base = tdf.freeze_me(makeDat())
+        self.assertTrue(self.firesException(lambda : tdf.copy_tic_dat(makeDat(), copy_on_write=True)))
+        def edit(dat) :
+            dat.foods["milk"]["cost"] = 100
+            dat.foods["milk"]["cost"] += 1
+            dat.foods["pizza"] = {"cost" : 12}
+            dat.foods["caviar"] = 1000
+            del(dat.foods["hot dog"])
+            dat.nutritionQuantities["caviar", "fat"] = 3
+            dat.nutritionQuantities["milk", "fat"]["qty"] = 0
+            return dat
+        cow, eager = tdf.copy_tic_dat(base, copy_on_write=True), edit(tdf.copy_tic_dat(base))
+        self.assertTrue(tdf._same_data(cow, base) and tdf._trusted_tic_dat(cow))
+        milk = cow.foods["milk"]
+        edit(cow)
+        self.assertTrue(milk["cost"] == 101 and cow.foods["milk"]["cost"] == 101)
+        self.assertTrue(tdf._same_data(cow, eager) and tdf._same_data(base, makeDat()))
+        self.assertTrue(base.foods["milk"]["cost"] == makeDat().foods["milk"]["cost"] != 101)
+        # only the edited rows are held by the copy
+        self.assertTrue(sorted(cow.foods._own) == ["caviar", "milk", "pizza"])
+        self.assertTrue(len(cow.nutritionQuantities._own) == 2 and not cow.categories._own)
+        self.assertTrue(len(cow.foods) == len(eager.foods) and set(cow.foods) == set(eager.foods))
+        self.assertTrue("hot dog" not in cow.foods and "hot dog" in base.foods)
+        hotDog = tdf.copy_tic_dat(base, copy_on_write=True).foods["hot dog"]
+        del(hotDog._table["hot dog"])
+        self.assertTrue(self.firesException(lambda : hotDog["cost"]))
+        self.assertRaises(KeyError, lambda : cow.foods.__delitem__("hot dog"))
+        # views of the same shared row are equal, and popping a shared row hands back a live copy of it
+        popper = tdf.copy_tic_dat(base, copy_on_write=True)
+        self.assertTrue(popper.foods["chicken"] == popper.foods["chicken"] == base.foods["chicken"])
+        self.assertFalse(popper.foods["chicken"] != popper.foods["chicken"])
+        self.assertTrue(popper.foods["chicken"] != popper.foods["hot dog"])
+        chicken = popper.foods.pop("chicken")
+        self.assertTrue(chicken["cost"] == base.foods["chicken"]["cost"] and "chicken" not in popper.foods)
+        self.assertTrue(popper.foods.pop("chicken", None) is None and "chicken" in base.foods)
+        self.assertRaises(KeyError, lambda : popper.foods.pop("chicken"))
+        popped = {}
+        while popper.foods :
+            k, row = popper.foods.popitem()
+            popped[k] = dict(row.items())
+        self.assertTrue(popped == {k : dict(v.items()) for k,v in base.foods.items() if k != "chicken"})
+        self.assertRaises(KeyError, popper.foods.popitem)
+        self.assertTrue(len(base.foods) == len(popped) + 1)
+        self.assertTrue(self.firesException(lambda : tdf.freeze_me(popper).nutritionQuantities.popitem()))
+
+        fkFailures = tdf.find_foreign_key_failures(cow)
+        self.assertTrue(fkFailures == tdf.find_foreign_key_failures(eager) and fkFailures)
+        tdf.remove_foreign_keys_failures(cow)
+        tdf.remove_foreign_keys_failures(eager)
+        self.assertTrue(tdf._same_data(cow, eager))
+
+        # copies of copies, and frozen copies
+        tdf.freeze_me(cow)
+        self.assertTrue(self.firesException(lambda : cow.foods.__setitem__("milk", 3)))
+        self.assertTrue(self.firesException(lambda : cow.foods["chicken"].__setitem__("cost", 3)))
+        cowCow = tdf.copy_tic_dat(cow, copy_on_write=True)
+        cowCow.foods["chicken"]["cost"] = 7
+        cowCow.foods["milk"]["cost"] = 1
+        self.assertTrue(cowCow.foods["chicken"]["cost"] == 7 != cow.foods["chicken"]["cost"])
+        self.assertTrue(cow.foods["milk"]["cost"] == 101 and len(cowCow.foods) == len(cow.foods))
+        eager.foods["chicken"]["cost"], eager.foods["milk"]["cost"] = 7, 1
+        self.assertTrue(tdf._same_data(cowCow, eager) and tdf._same_data(tdf.copy_tic_dat(cowCow), eager))
+
+        # columnar and keyless tables are copied outright
+        tdf = TicDatFactory(**sillyMeSchema())
+        tdf.set_columnar_tables(["a"])
+        base = tdf.freeze_me(tdf.TicDat(**sillyMeData()))
+        cow = tdf.copy_tic_dat(base, copy_on_write=True, freeze_it=True)
+        self.assertTrue(tdf._same_data(cow, base) and cow.b._copy_on_write and cow.a._columnar)
+        cow = tdf.copy_tic_dat(base, copy_on_write=True)
+        cow.a[1]["aData1"] = cow.b[1, 2, 3]["bData"] = 99
+        cow.c.append([1, 2, 3, 4])
+        self.assertTrue(tdf._same_data(base, tdf.TicDat(**sillyMeData())) and not tdf._same_data(base, cow))
+
+        tdf = TicDatFactory(**dietSchema())
+        addDietForeignKeys(tdf)
+        tdf.enable_foreign_key_links()
+        base = tdf.freeze_me(tdf.TicDat(**{t:getattr(dietData(),t) for t in tdf.all_tables}))
+        self.assertTrue(self.firesException(lambda : tdf.copy_tic_dat(base, copy_on_write=True)))
+
+    def testTwentyThree(self):
+        tdf = TicDatFactory(**sillyMeSchema())
+        dat = tdf.TicDat(**sillyMeData())
+        dat.a["new"] = (4, 5, 6)
+        dat.c.append((5, 6, 7, 8))
+        dat.c.insert(0, (9, 10, 11, 12))
+        trusted = tdf.TicDat.from_rows(a = {2 : (3, 4, 5)}, b = [((1, 1, 1), (2,))], c = [[1, 2, 3, 4]])
+        loose = tdf._row_factories["a"]((7, 8, 9))
+        rows = lambda dat : list(dat.a.values()) + list(dat.b.values()) + list(dat.c)
+        self.assertTrue(all(not r._dataFrozen and not r._attributesFrozen for r in rows(dat) + rows(trusted)))
+        # the rows of a table share its FreezeState, so freezing doesn't visit them
+        self.assertTrue(len({id(r._freeze_state) for r in dat.a.values()}) == 1)
+        for d in (dat, trusted) :
+            tdf.freeze_me(d)
+            self.assertTrue(all(r._dataFrozen and r._attributesFrozen for r in rows(d)))
+            self.assertTrue(self.firesException(lambda : d.a.values()[0].__setitem__("aData1", 0)))
+            self.assertTrue(self.firesException(lambda : setattr(d.c[0], "junk", 0)))
+            self.assertTrue(self.firesException(lambda : d.a.__setitem__("another", (1, 2, 3))))
+        # a row that belongs to no table freezes on its own
+        self.assertFalse(loose._dataFrozen)
+        loose["aData1"] = 0
+        loose._dataFrozen = True
+        self.assertTrue(self.firesException(lambda : loose.__setitem__("aData1", 1)))
+        self.assertFalse(loose._attributesFrozen)
+        loose.junk = 1
+
+        # rows without data fields, and the link tables holding the rows of other tables
+        tdf = TicDatFactory(parents = [["name"], []], children = [["name"], ["parent"]])
+        tdf.add_foreign_key("children", "parents", ["parent", "name"])
+        tdf.enable_foreign_key_links()
+        dat = tdf.TicDat(parents = ["mom", "dad"], children = {"bob" : "mom", "sue" : "mom"})
+        dat.parents["aunt"] = {}
+        self.assertTrue(not any(r._dataFrozen for r in dat.parents.values()))
+        tdf.freeze_me(dat)
+        self.assertTrue(all(r._dataFrozen and r._attributesFrozen for r in dat.parents.values()))
+        self.assertTrue(self.firesException(lambda : setattr(dat.parents["dad"], "junk", 1)))
+        self.assertTrue(set(dat.parents["mom"].children) == {"bob", "sue"})
+        self.assertTrue(all(r._dataFrozen for r in dat.parents["mom"].children.values()))
+        self.assertTrue(self.firesException(lambda : dat.parents["mom"].children.__setitem__("joe", "mom")))
+
+    def testTwentyFour(self):
+        fresh = lambda x : "".join(list(x)) # an equal str that isn't the same object
+        tdf = TicDatFactory(**dietSchema())
+        addDietForeignKeys(tdf)
+        tdf.enable_foreign_key_links()
+        makeDat = lambda : tdf.TicDat(**{t:getattr(dietData(),t) for t in tdf.all_tables})
+        dat = makeDat()
+        for (f, c), r in dat.nutritionQuantities.items() :
+            del(dat.nutritionQuantities[f, c])
+            dat.nutritionQuantities[fresh(f), fresh(c)] = r["qty"] + 0.5
+        dat.foods[fresh("milk")] = float(7)
+        compact = tdf.freeze_me(tdf.copy_tic_dat(dat), compact=True)
+        self.assertTrue(tdf._same_data(dat, compact) and compact._isFrozen)
+        self.assertTrue(self.firesException(lambda : compact.foods["milk"].__setitem__("cost", 1)))
+        self.assertTrue(self.firesException(lambda : compact.foods.__setitem__("new", 1)))
+        keyValues = [v for k in compact.nutritionQuantities for v in k]
+        self.assertTrue(len({id(v) for v in keyValues}) == len(set(keyValues)))
+        self.assertTrue(all(f is intern(f) for f in compact.foods))
+        quantities = [r["qty"] for r in compact.nutritionQuantities.values()]
+        self.assertTrue(len({id(v) for v in quantities}) == len(set(quantities)) < len(quantities))
+        self.assertTrue(set(compact.foods["milk"].nutritionQuantities) == set(dat.foods["milk"].nutritionQuantities))
+        self.assertTrue(compact.categories["fat"].nutritionQuantities["milk"] is
+                        compact.nutritionQuantities["milk", "fat"])
+
+        tdf = TicDatFactory(**sillyMeSchema())
+        tdf.set_columnar_tables(["b"])
+        dat = tdf.TicDat(**sillyMeData())
+        dat.b[fresh("x"), fresh("y"), fresh("z")] = fresh("b")
+        dat.c.append([fresh("b")] * 4)
+        compact = tdf.freeze_me(tdf.TicDat(**sillyMeData()), compact=True)
+        tdf.freeze_me(dat, compact=True)
+        self.assertTrue(type(dat.b.column("bData")) is tuple and dat.b["x", "y", "z"]["bData"] is "b")
+        self.assertTrue(all(v is "b" for v in dat.c[-1].values()) and dat.a["b"]["aData1"] is "b")
+        self.assertTrue(tdf._same_data(compact, tdf.TicDat(**sillyMeData())))
+        self.assertTrue(self.firesException(lambda : dat.b.__setitem__((1, 2, 3), 4)))
+        # -0.0 == 0.0, but compacting keeps the sign of each zero
+        for columnar in (True, False) :
+            tdf = TicDatFactory(a = [["k"], ["x", "y"]], b = [[], ["x", "y"]])
+            if columnar :
+                tdf.set_columnar_tables(["a"])
+            dat = tdf.freeze_me(tdf.TicDat(a = {1 : (-0.0, 0.0), 2 : (0.0, -0.0), 3 : (0.0, "z")},
+                                           b = [(-0.0, 0.0), (0.0, "z")]), compact=True)
+            signs = lambda rows : [math.copysign(1, v) for r in rows for v in r.values() if v == 0]
+            self.assertTrue(signs(dat.a[k] for k in (1, 2, 3)) == [-1, 1, 1, -1, 1])
+            self.assertTrue(signs(dat.b) == [-1, 1, 1])
+
+    def testTwentyFive(self):
+        import ticdat.ticdatfactory as ticdatfactory
+        tdf = TicDatFactory(**dietSchema())
+        addDietForeignKeys(tdf)
+        tdf.enable_foreign_key_links()
+        tdf.set_default_value("foods", "cost", 3)
+        tdf.set_data_type("nutritionQuantities", "qty", min=0, max=1000)
+        makeDat = lambda : tdf.TicDat(**{t:getattr(dietData(),t) for t in tdf.all_tables})
+        dat, frozenDat = makeDat(), tdf.freeze_me(makeDat())
+        for protocol in (0, 2) :
+            dat2, frozenDat2 = pickle.loads(pickle.dumps([dat, frozenDat], protocol))
+            self.assertTrue(tdf._same_data(dat, dat2) and tdf._same_data(frozenDat, frozenDat2))
+            self.assertTrue(tdf.good_tic_dat_object(dat2) and not getattr(dat2, "_isFrozen", False))
+            self.assertTrue(frozenDat2._isFrozen and frozenDat2 in tdf._known_good_tic_dats)
+            self.assertTrue(_allLinks(dat2, tdf) == _allLinks(dat, tdf))
+            dat2.foods["pizza"] = {}
+            self.assertTrue(dat2.foods["pizza"]["cost"] == 3)
+        # the factory is unpickled as itself while it is alive in this process, and is remade otherwise
+        self.assertTrue(pickle.loads(pickle.dumps(tdf)) is tdf)
+        pickled = pickle.dumps([tdf, frozenDat], 2)
+        ticdatfactory._used_factories.clear() # as for a fresh process
+        tdf2, frozenDat2 = pickle.loads(pickled)
+        self.assertTrue(tdf2 is not tdf and tdf2._same_data(frozenDat2, frozenDat))
+        self.assertTrue(tdf2.schema() == tdf.schema() and set(tdf2.foreign_keys) == set(tdf.foreign_keys))
+        self.assertTrue(tdf2.default_values == tdf.default_values and tdf2.data_types == tdf.data_types)
+        self.assertTrue(_allLinks(frozenDat2, tdf2) == _allLinks(frozenDat, tdf))
+        self.assertTrue(frozenDat2 in tdf2._known_good_tic_dats and pickle.loads(pickle.dumps(tdf2)) is tdf2)
+        self.assertTrue(type(pickle.loads(pickle.dumps(frozenDat, 2)).foods) is type(frozenDat.foods))
+
+        tdf = TicDatFactory(**sillyMeSchema())
+        tdf.set_columnar_tables(["a"])
+        tdf.set_generator_tables(["c"])
+        unused = pickle.loads(pickle.dumps(tdf))
+        self.assertTrue(unused is not tdf and unused.columnar_tables == tdf.columnar_tables)
+        dat = tdf.TicDat(**sillyMeData())
+        dat.a["new"] = ("x", 1, 2)
+        dat2 = pickle.loads(pickle.dumps(dat, 2))
+        self.assertTrue(tdf._same_data(dat, dat2) and dat2.a._columnar and callable(dat2.c))
+        self.assertTrue(list(tuple(r.values()) for r in dat2.c()) == list(sillyMeData()["c"]))
+
+    def testTwentySix(self):
+        import tempfile, shutil, os
+        from ticdat.columnar import MappedDoubles
+        scratch = tempfile.mkdtemp()
+        try :
+            filePath = os.path.join(scratch, "diet.td")
+            tdf = TicDatFactory(**dietSchema())
+            addDietForeignKeys(tdf)
+            tdf.enable_foreign_key_links()
+            unfrozen = tdf.TicDat(**{t:getattr(dietData(),t) for t in tdf.all_tables})
+            self.assertTrue(self.firesException(lambda : tdf.publish_tic_dat(unfrozen, filePath)))
+            self.assertFalse(os.path.exists(filePath))
+            dat = tdf.freeze_me(tdf.TicDat(**{t:getattr(dietData(),t) for t in tdf.all_tables}))
+            tdf.publish_tic_dat(dat, filePath)
+            with open(filePath, "rb") as f :
+                published = f.read()
+            # an unfrozen copy is rejected, and leaves the published file as it was
+            self.assertTrue(self.firesException(lambda : tdf.publish_tic_dat(tdf.copy_tic_dat(dat), filePath)))
+            with open(filePath, "rb") as f :
+                self.assertTrue(f.read() == published)
+            attached = tdf.attach_tic_dat(filePath)
+            self.assertTrue(tdf._same_data(dat, attached) and attached._isFrozen)
+            self.assertTrue(tdf.good_tic_dat_object(attached) and attached.foods._columnar)
+            self.assertTrue(type(attached.nutritionQuantities.column("qty")) is MappedDoubles)
+            self.assertTrue(attached.foods["milk"]["cost"] == dat.foods["milk"]["cost"])
+            self.assertTrue(_allLinks(attached, tdf) == _allLinks(dat, tdf))
+            self.assertTrue(self.firesException(lambda : attached.foods["milk"].__setitem__("cost", 1)))
+            self.assertTrue(self.firesException(lambda : attached.foods.__setitem__("new", 1)))
+            qty = attached.nutritionQuantities.numpy_column("qty")
+            self.assertFalse(qty.flags.writeable)
+            self.assertTrue(list(qty) == [r["qty"] for r in attached.nutritionQuantities.values()])
+            # attached objects can be copied and pickled like any other
+            self.assertTrue(tdf._same_data(tdf.copy_tic_dat(attached), dat))
+            self.assertTrue(tdf._same_data(pickle.loads(pickle.dumps(attached, 2)), dat))
+            self.assertTrue(self.firesException(lambda : TicDatFactory(**netflowSchema()).attach_tic_dat(filePath)))
+            with open(filePath, "wb") as f :
+                f.write("not ticdat")
+            self.assertTrue(self.firesException(lambda : tdf.attach_tic_dat(filePath)))
+            # empty and truncated files are reported as such
+            for length in (0, 5, 12, 40, len(published) - 8) :
+                with open(filePath, "wb") as f :
+                    f.write(published[:length])
+                self.assertTrue(self.firesException(lambda : tdf.attach_tic_dat(filePath)))
+            self.assertTrue(self.firesException(lambda : tdf.attach_tic_dat(os.path.join(scratch, "missing"))))
+
+            # keyless, data-less, generator and string data tables are read into memory
+            tdf = TicDatFactory(d = [["dk"], []], **sillyMeSchema())
+            tdf.set_generator_tables(["c"])
+            dat = tdf.freeze_me(tdf.TicDat(d = ["x", "y"], **sillyMeData()))
+            tdf.publish_tic_dat(dat, filePath)
+            attached = tdf.attach_tic_dat(filePath)
+            self.assertTrue(tdf._same_data(dat, attached) and set(attached.d) == {"x", "y"})
+            self.assertTrue(type(attached.b.column("bData")) is MappedDoubles)
+            self.assertTrue(type(attached.a.column("aData3")) is list and attached.a["b"]["aData3"] == 12)
+            # integers too large to be stored exactly as doubles are published as is
+            tdf = TicDatFactory(a = [["k"], ["x", "y"]])
+            dat = tdf.freeze_me(tdf.TicDat.from_rows(a = {1 : (2**60 + 1, 2**53), 2 : (3, -2**53)}))
+            self.assertTrue(type(dat.a[1]["x"]) in (int, long))
+            tdf.publish_tic_dat(dat, filePath)
+            attached = tdf.attach_tic_dat(filePath)
+            self.assertTrue(type(attached.a.column("x")) is list and attached.a[1]["x"] == 2**60 + 1)
+            self.assertTrue(type(attached.a.column("y")) is MappedDoubles and tdf._same_data(dat, attached))
+        finally :
+            shutil.rmtree(scratch)
+
+    def testTwentySeven(self):
+        import tempfile, shutil, os
+        from ticdat import run_scenarios
+        scratch = tempfile.mkdtemp()
+        try :
+            tdf = TicDatFactory(**dietSchema())
+            dat = tdf.freeze_me(tdf.TicDat(**{t:getattr(dietData(),t) for t in tdf.all_tables}))
+            edited = tdf.copy_tic_dat(dat)
+            edited.foods["milk"]["cost"] = 100
+            tdf.csv.write_directory(edited, os.path.join(scratch, "csv"))
+            tdf.publish_tic_dat(dat, os.path.join(scratch, "diet.td"))
+            scenarios = [dat, edited, os.path.join(scratch, "csv"), os.path.join(scratch, "diet.td"),
+                         tdf.TicDat(), os.path.join(scratch, "missing.db")]
+            for processes in (1, 2) :
+                results = sorted(run_scenarios(tdf, _scaledFoodCosts, iter(scenarios), processes=processes,
+                                               kwargs = {"scale" : 2}), key = lambda r : r.index)
+                self.assertTrue([r.index for r in results] == range(len(scenarios)))
+                self.assertTrue([r.source for r in results] == [None, None] + scenarios[2:4] + [None, scenarios[5]])
+                for r, _dat in zip(results[:4], [dat, edited, edited, dat]) :
+                    self.assertTrue(r.error is None and r.solve_seconds >= 0 and r.read_seconds >= 0)
+                    self.assertTrue(_costFactory.good_tic_dat_object(r.solution))
+                    self.assertTrue({f : r["cost"] for f,r in r.solution.costs.items()} ==
+                                    {f : 2 * r["cost"] for f,r in _dat.foods.items()})
+                # a coarse clock can time a quick read as 0, so only check that it was timed
+                self.assertTrue(results[2].read_seconds is not None and results[0].read_seconds == 0)
+                self.assertTrue(results[4].solution is None and "no foods" in results[4].error)
+                self.assertTrue(results[5].solution is None and results[5].error)
+            ordered = run_scenarios(tdf, _scaledFoodCosts, scenarios[:4] * 3, processes=2, ordered=True)
+            self.assertTrue([r.index for r in ordered] == range(12))
+            self.assertTrue(self.firesException(lambda : run_scenarios(tdf, _scaledFoodCosts, [], processes=0)))
+        finally :
+            shutil.rmtree(scratch)
+
+    def testTwentyEight(self):
+        tdf = TicDatFactory(**dietSchema())
+        makeDat = lambda : tdf.TicDat(**{t:getattr(dietData(),t) for t in tdf.all_tables})
+        dat = makeDat()
+        fingerprint = tdf.fingerprint(dat)
+        self.assertTrue(fingerprint == tdf.fingerprint(makeDat()) == tdf.fingerprint(tdf.copy_tic_dat(dat)))
+        # row order and number type don't matter, but the data does
+        reordered = tdf.TicDat(**{t : dict(reversed(list(getattr(dietData(), t).items()))) for t in tdf.all_tables})
+        self.assertTrue(tdf.fingerprint(reordered) == fingerprint)
+        dat.foods["milk"]["cost"] = 2
+        self.assertTrue(tdf.fingerprint(dat) != fingerprint)
+        dat.foods["milk"]["cost"] = 2.0
+        fingerprint = tdf.fingerprint(dat)
+        del(dat.foods["milk"])
+        self.assertTrue(tdf.fingerprint(dat) != fingerprint)
+        dat.foods[u"milk"] = 2
+        self.assertTrue(tdf.fingerprint(dat) == fingerprint)
+        # the fingerprint of a frozen object is memoized, and survives pickling
+        tdf.freeze_me(dat)
+        self.assertTrue(tdf.fingerprint(dat) == fingerprint and dat in tdf._fingerprints)
+        tdf._fingerprints[dat] = "memoized"
+        self.assertTrue(tdf.fingerprint(dat) == "memoized")
+        self.assertTrue(tdf.fingerprint(pickle.loads(pickle.dumps(dat, 2))) == fingerprint)
+        self.assertTrue(TicDatFactory(**dietSchema()).fingerprint(dat) == fingerprint)
+        self.assertTrue(self.firesException(lambda : TicDatFactory(**netflowSchema()).fingerprint(dat)))
+
+        # tables without primary keys are multisets, and columnar tables fingerprint as dict tables
+        tdf, ctdf = TicDatFactory(**sillyMeSchema()), TicDatFactory(**sillyMeSchema())
+        ctdf.set_columnar_tables(["a", "b"])
+        dat = tdf.TicDat(**sillyMeData())
+        fingerprint = tdf.fingerprint(dat)
+        self.assertTrue(ctdf.fingerprint(ctdf.TicDat(**sillyMeData())) == fingerprint)
+        dat.c.append(dat.c[0])
+        self.assertTrue(tdf.fingerprint(dat) != fingerprint)
+        data = sillyMeData()
+        data["c"] = (data["c"][0],) + data["c"]
+        self.assertTrue(tdf.fingerprint(tdf.TicDat(**data)) == tdf.fingerprint(dat))
+        data["c"] = data["c"][::-1]
+        self.assertTrue(tdf.fingerprint(tdf.TicDat(**data)) == tdf.fingerprint(dat))
+        # the schema is part of the fingerprint
+        dtdf = TicDatFactory(**dict(sillyMeSchema(), d = [["dk"], []]))
+        self.assertTrue(dtdf.fingerprint(dtdf.TicDat(**sillyMeData())) != fingerprint)
+        # the rows of generator tables can change, so their fingerprints aren't memoized
+        tdf = TicDatFactory(**sillyMeSchema())
+        tdf.set_generator_tables(["c"])
+        cRows = list(sillyMeData()["c"])
+        dat = tdf.freeze_me(tdf.TicDat(a = sillyMeData()["a"], c = lambda : iter(cRows)))
+        fingerprint = tdf.fingerprint(dat)
+        cRows.pop()
+        self.assertTrue(tdf.fingerprint(dat) != fingerprint and dat not in tdf._fingerprints)
+        # nor are the fingerprints of objects other than frozen TicDats
+        class Frozen(object) :
+            _isFrozen = True
+        obj = Frozen()
+        for t in ctdf.all_tables :
+            setattr(obj, t, sillyMeData()[t])
+        self.assertTrue(ctdf.fingerprint(obj) == ctdf.fingerprint(ctdf.TicDat(**sillyMeData())))
+        self.assertTrue(obj not in ctdf._fingerprints)
+    def testTwentyNine(self):
+        tdf = TicDatFactory(**dietSchema())
+        makeDat = lambda : tdf.TicDat(**{t:getattr(dietData(),t) for t in tdf.all_tables})
+        old, new = makeDat(), makeDat()
+        diff = tdf.diff(old, new)
+        self.assertTrue(set(diff) == set(tdf.all_tables))
+        self.assertTrue(not any(d.added or d.removed or d.changed for d in diff.values()))
+        new.foods["milk"]["cost"] += 1
+        new.nutritionQuantities["milk", "fat"]["qty"] = 3.0
+        new.nutritionQuantities["milk", "protein"] = 8 # the same data
+        del(new.foods["pizza"])
+        new.foods["caviar"] = 100
+        new.categories["fat"] = [1, 2]
+        diff = tdf.diff(old, new)
+        self.assertTrue(diff["foods"] == ({"caviar"}, {"pizza"}, {"milk" : ("cost",)}))
+        self.assertTrue(diff["nutritionQuantities"] == (set(), set(), {("milk", "fat") : ("qty",)}))
+        self.assertTrue(diff["categories"] == (set(), set(), {"fat" : ("minNutrition", "maxNutrition")}))
+        self.assertTrue(tdf.diff(new, old)["foods"] == ({"pizza"}, {"caviar"}, {"milk" : ("cost",)}))
+        self.assertTrue(tdf.diff(old, tdf.copy_tic_dat(tdf.freeze_me(new), copy_on_write=True)) == diff)
+        self.assertTrue(self.firesException(lambda : tdf.diff(old, TicDatFactory(**netflowSchema()).TicDat())))
+
+        # tables without primary keys are diffed as multisets, and tables without data fields have no changes
+        tdf = TicDatFactory(**dict(sillyMeSchema(), d = [["dk"], []]))
+        old = tdf.TicDat(**sillyMeData())
+        new = tdf.TicDat(**dict(sillyMeData(), d = ["x"]))
+        new.c.append(new.c[0])
+        new.c.append((4, 5, 6, 7))
+        del(new.c[1])
+        diff = tdf.diff(old, new)
+        self.assertTrue(sorted(diff["c"].added) == sorted([tuple(new.c[0].values()), (4, 5, 6, 7)]))
+        self.assertTrue(diff["c"].removed == [tuple(old.c[1].values())] and diff["c"].changed == {})
+        self.assertTrue(diff["d"] == ({"x"}, set(), {}))
+        new.c.append([[1], 2, 3, 4]) # unhashable
+        self.assertTrue(tdf.diff(old, new)["c"].added[-1] == ([1], 2, 3, 4))
+        self.assertTrue(tdf.diff(new, old)["c"].removed[-1] == ([1], 2, 3, 4))
+
 # tdf = TicDatFactory(plants = [["name"], ["stuff", "otherstuff"]],
 #                             lines = [["name"], ["plant", "weird stuff"]],
 #                             products = [["name"],["gover"]],
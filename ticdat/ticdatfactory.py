@@ -2,7 +2,18 @@
 Create TicDatFactory. Main entry point for ticdat library.
 PEP8
 """
+import os
 import collections as clt
+import operator
+import weakref
+import uuid
+import mmap
+import struct
+import cPickle as pickle
+import hashlib
+import math
+from array import array
+from itertools import izip, imap, repeat, compress
 import utils as utils
 from utils import verify, freezable_factory, FrozenDict, FreezeableDict
 from utils import dictish, containerish, deep_freeze, lupish
@@ -12,6 +23,7 @@ import xls
 import csvtd as csv
 import sqlitetd as sql
 import mdb
+import columnar
 
 def _acceptable_default(v) :
     return utils.numericish(v) or utils.stringish(v) or (v is None)
@@ -25,6 +37,73 @@ def _keylen(k) :
         rtn = 0
     return rtn
 
+def _good_key_lengths(keys, keylen) :
+    """
+    :return: do all the keys have length keylen? (non-container keys having length 1)
+    """
+    types = set(map(type, keys))
+    if all(containerish(t) for t in types) : # the usual case, checked with C level loops
+        return set(map(len, keys)).issubset({keylen})
+    if not any(containerish(t) for t in types) :
+        return keylen == 1 or not types
+    return all(_keylen(k) == keylen for k in keys)
+
+def _value_sharer() :
+    """
+    :return: a function that maps a sequence of values to a list of equal values, so that equal values
+             are stored once. Each str is interned, and each number or unicode is swapped for the first
+             equal value of the same type that was seen. Floats are matched by sign as well, since
+             -0.0 == 0.0.
+    """
+    memos = {t:{} for t in (unicode, float, int, long)}
+    def share(x) :
+        if type(x) is str :
+            return intern(x)
+        if type(x) is float :
+            return memos[float].setdefault((x, math.copysign(1.0, x)), x)
+        memo = memos.get(type(x))
+        return x if memo is None else memo.setdefault(x, x)
+    def share_values(values) :
+        types = set(map(type, values))
+        if len(types) == 1 : # the usual case, done with C level loops
+            t = next(iter(types))
+            if t is str :
+                return map(intern, values)
+            if t is float :
+                return map(memos[t].setdefault,
+                           izip(values, map(math.copysign, repeat(1.0, len(values)), values)), values)
+            if t in memos :
+                return map(memos[t].setdefault, values, values)
+        return map(share, values)
+    return share_values
+
+_fingerprint_number_types = frozenset((int, long, float, bool))
+def _fingerprint_value(x) :
+    if type(x) in _fingerprint_number_types :
+        try :
+            if float(x) == x :
+                return float(x) + 0.0 # i.e. 1 and 1.0 (and -0.0 and 0.0) fingerprint the same
+        except OverflowError :
+            pass
+    return x.encode("utf-8") if type(x) is unicode else x
+
+def _fingerprint_column(values) :
+    """
+    :return: the values, with those that compare equal (such as 1 and 1.0, or "a" and u"a") made to
+             have the same repr. Numeric and string columns are converted with C level loops.
+    """
+    types = set(map(type, values))
+    if types.issubset(_fingerprint_number_types) :
+        try :
+            floats = map(float, values)
+            if all(map(operator.eq, floats, values)) :
+                return map(operator.add, floats, repeat(0.0, len(floats)))
+        except OverflowError :
+            pass
+    elif types.issubset({str}) :
+        return values
+    return map(_fingerprint_value, values)
+
 class _ForeignKey(namedtuple("ForeignKey", ("native_table", "foreign_table", "mapping", "cardinality"))) :
     def nativefields(self):
         return (self.mapping.native_field,) if type(self.mapping) is _ForeignKeyMapping \
@@ -39,6 +118,13 @@ class _ForeignKey(namedtuple("ForeignKey", ("native_table", "foreign_table", "ma
 
 _ForeignKeyMapping = namedtuple("FKMapping", ("native_field", "foreign_field"))
 
+def _integral(x) :
+    # infinities are integral and NaN is not, as per math.floor
+    try :
+        return int(x) == x
+    except (ValueError, OverflowError) :
+        return x == x
+
 class _TypeDictionary(namedtuple("TypeDictionary", ("number_allowed", "strings_allowed", "nullable",
                                         "min", "max", "inclusive_min", "inclusive_max","must_be_int"))):
     def valid_data(self, data):
@@ -51,7 +137,7 @@ class _TypeDictionary(namedtuple("TypeDictionary", ("number_allowed", "strings_a
                 return False
             if (not self.inclusive_max) and (data  == self.max):
                 return False
-            if (self.must_be_int) and (int(data) != data):
+            if (self.must_be_int) and not _integral(data):
                 return False
             return True
         if utils.stringish(data):
@@ -62,7 +148,468 @@ class _TypeDictionary(namedtuple("TypeDictionary", ("number_allowed", "strings_a
         if data is None:
             return bool(self.nullable)
         return False
+    def validator(self):
+        """
+        :return: a function equivalent to valid_data, compiled for this data type. The common number and
+                 string types are recognized by type rather than by duck typing, and the allowed strings
+                 are checked with a set.
+        """
+        number_allowed, nullable, must_be_int = self.number_allowed, bool(self.nullable), self.must_be_int
+        min_, max_, inclusive_min, inclusive_max = self.min, self.max, self.inclusive_min, self.inclusive_max
+        any_string = self.strings_allowed == "*"
+        strings_allowed = frozenset() if any_string else frozenset(self.strings_allowed)
+        def valid_number(data):
+            return number_allowed and not (data < min_ or data > max_ or
+                                           (not inclusive_min and data == min_) or
+                                           (not inclusive_max and data == max_) or
+                                           (must_be_int and not _integral(data)))
+        def rtn(data):
+            data_type = type(data)
+            if data_type in _number_types :
+                return valid_number(data)
+            if data_type in _string_types :
+                return any_string or data in strings_allowed
+            if data is None:
+                return nullable
+            if utils.numericish(data):
+                return valid_number(data)
+            if utils.stringish(data):
+                return any_string or data in strings_allowed
+            return False
+        return rtn
+
+# the exact types that are checked first by the compiled data type validators
+_number_types = frozenset((int, long, float))
+_string_types = frozenset((str, unicode))
+
+
+def _ticdat_table_class(tablename, keylen, rowfactory) :
+    # the rows made by the row factory share the FreezeState of their table. Link tables, which hold
+    # the rows of other tables, have no such row factory.
+    adopt = getattr(rowfactory, "_set_freeze_state", None)
+    if keylen > 0 :
+        class TicDatDict (FreezeableDict) :
+            _links_owner = None # the TicDat object maintaining the foreign key links of this table
+            def __init__(self, *args, **kwargs):
+                self._rows_freeze_state = utils.FreezeState()
+                super(TicDatDict, self).__init__(*args, **kwargs)
+                if adopt is not None :
+                    for row in dict.itervalues(self) :
+                        adopt(row, self._rows_freeze_state)
+            def _freeze(self):
+                # freezes the table and all its rows, without visiting the rows
+                self._dataFrozen = True
+                self._attributesFrozen = True
+                self._rows_freeze_state.data = self._rows_freeze_state.attributes = True
+            def _compact(self, share_values):
+                # for frozen tables. the dict is rebuilt with shared key values, so that it also sheds
+                # the slack left by deletions. link tables hold rows that are compacted by their own table
+                keys, rows = dict.keys(self), dict.values(self)
+                keys = zip(*[share_values(map(operator.itemgetter(i), keys)) for i in range(keylen)]) \
+                       if keylen > 1 else share_values(keys)
+                dict.clear(self)
+                dict.update(self, izip(keys, rows))
+                if adopt is not None :
+                    rowfactory._share_data(rows, share_values)
+            def __setitem__(self, key, value):
+                verify(containerish(key) ==  (keylen > 1) and
+                       (keylen == 1 or keylen == len(key)),
+                       "inconsistent key length for %s"%tablename)
+                row, owner = rowfactory(value), self._links_owner
+                if adopt is not None :
+                    adopt(row, self._rows_freeze_state)
+                if owner is not None and key in self and not getattr(self, "_dataFrozen", False):
+                    owner._unlink_row(tablename, key, dict.__getitem__(self, key))
+                super(TicDatDict, self).__setitem__(key, row)
+                if owner is not None :
+                    owner._link_row(tablename, key, row)
+            def __delitem__(self, key):
+                owner = self._links_owner
+                row = dict.get(self, key) if owner is not None else None
+                super(TicDatDict, self).__delitem__(key)
+                if owner is not None :
+                    owner._unlink_row(tablename, key, row)
+            def pop(self, key, *default):
+                if self._links_owner is None or key not in self :
+                    return super(TicDatDict, self).pop(key, *default)
+                rtn = dict.__getitem__(self, key)
+                del self[key]
+                return rtn
+            def update(self, *args, **kwargs):
+                # item by item, so that the rows are made by the row factory (and linked)
+                if getattr(self, "_dataFrozen", False) :
+                    return super(TicDatDict, self).update(*args, **kwargs) # raises
+                for k,v in dict(*args, **kwargs).items():
+                    self[k] = v
+            def setdefault(self, key, default=None):
+                if key not in self :
+                    self[key] = {} if default is None else default
+                return self[key]
+            def __getitem__(self, item):
+                if (item not in self) and (not getattr(self, "_dataFrozen", False)):
+                    self[item] = rowfactory({})
+                return super(TicDatDict, self).__getitem__(item)
+            @classmethod
+            def _from_trusted_rows(cls, rows):
+                rtn = cls()
+                from_values, state = rowfactory._from_values, rtn._rows_freeze_state
+                dict.update(rtn, ((k, from_values(v, state)) for k,v in rows))
+                verify(_good_key_lengths(dict.keys(rtn), keylen), "inconsistent key length for %s"%tablename)
+                return rtn
+            @classmethod
+            def _from_trusted_columns(cls, keys, columns):
+                # keys is a sequence of distinct primary keys, and columns holds a sequence of data values
+                # for each data field, ordered consistently with keys
+                rtn = cls()
+                rows = rowfactory._from_columns(columns, len(keys), rtn._rows_freeze_state)
+                dict.update(rtn, izip(keys, rows))
+                return rtn
+        assert dictish(TicDatDict)
+        return TicDatDict
+    class TicDatDataList(clt.MutableSequence):
+        def __init__(self, *_args):
+            self._list = list()
+            self._rows_freeze_state = utils.FreezeState()
+            self.extend(list(_args))
+        def _freeze(self):
+            # freezes all the rows, without visiting them
+            self._rows_freeze_state.data = self._rows_freeze_state.attributes = True
+        def __len__(self): return len(self._list)
+        def __getitem__(self, i): return self._list[i]
+        def __delitem__(self, i): del self._list[i]
+        def __setitem__(self, i, v):
+            self._list[i] = rowfactory(v, self._rows_freeze_state)
+        def insert(self, i, v):
+            self._list.insert(i, rowfactory(v, self._rows_freeze_state))
+        def __repr__(self):
+            return "td:" + self._list.__repr__()
+        @classmethod
+        def _from_trusted_rows(cls, rows):
+            rtn = cls()
+            from_values, state = rowfactory._from_values, rtn._rows_freeze_state
+            rtn._list.extend(from_values(v, state) for v in rows)
+            return rtn
+        @classmethod
+        def _from_trusted_columns(cls, keys, columns):
+            # keys is None, and columns holds a sequence of data values for each data field
+            rtn = cls()
+            rtn._list.extend(rowfactory._from_columns(columns, len(columns[0]), rtn._rows_freeze_state))
+            return rtn
+    assert containerish(TicDatDataList) and not dictish(TicDatDataList)
+    return TicDatDataList
+
+def _copy_on_write_table_class(tablename, keylen, rowfactory) :
+    """
+    creates a dict-like table class for copies of frozen primary key tables. The copy shares the rows
+    of the frozen table, and only holds the rows that are added or edited after the copy.
+    :param tablename: the table name
+    :param keylen: the number of primary key fields
+    :param rowfactory: the row factory of the table
+    :return: a dict-like class, whose constructor takes the frozen table that is to be shared
+    """
+    assert keylen > 0
+    class TicDatSharedRow(object) :
+        """
+        a dict-like view of a row that is still shared with the frozen table. Editing the view
+        copies the row into the table that made the view.
+        """
+        __slots__ = ("_table", "_key")
+        def __init__(self, table_, key):
+            object.__setattr__(self, "_table", table_)
+            object.__setattr__(self, "_key", key)
+        def _row(self):
+            # the shared row, or the copy of it made by an edit through another view
+            table, key = self._table, self._key
+            if key in table._own :
+                return table._own[key]
+            if key in table._deleted :
+                raise utils.TicDatError("The %s row for %s has been deleted"%(tablename, key))
+            return table._base[key]
+        def __getitem__(self, item):
+            return self._row()[item]
+        def __setitem__(self, key, value):
+            if self._table._dataFrozen :
+                raise utils.TicDatError("Can't edit a frozen " + self._table.__class__.__name__)
+            self._table._own_row(self._key)[key] = value
+        def __setattr__(self, key, value):
+            raise utils.TicDatError("can't set attributes to a shared row of a copy on write table")
+        def keys(self):
+            return self._row().keys()
+        def values(self):
+            return self._row().values()
+        def items(self):
+            return self._row().items()
+        def __contains__(self, item):
+            return item in self._row()
+        def __iter__(self):
+            return iter(self._row())
+        def __len__(self):
+            return len(self._row())
+        def __eq__(self, other):
+            # views of the same row are equal, as are a view and the row itself
+            return self._row() == (other._row() if isinstance(other, TicDatSharedRow) else other)
+        def __ne__(self, other):
+            return not self == other
+        def __hash__(self):
+            return hash(self._row())
+        def __repr__(self):
+            return self._row().__repr__()
+    assert dictish(TicDatSharedRow)
+
+    class TicDatCopyOnWriteDict(freezable_factory(clt.MutableMapping, "_attributesFrozen")) :
+        """
+        a dict-like table that shares the rows of a frozen table until they are edited. Rows that are
+        still shared are handed out as views (i.e. dat.table[pk] is not dat.table[pk] for these rows).
+        """
+        _copy_on_write = True
+        def __init__(self, base):
+            assert getattr(base, "_dataFrozen", False)
+            self._base = base # the frozen table whose rows are shared
+            self._own = {} # primary key -> row, for the rows added or edited since the copy
+            self._deleted = set() # the primary keys of base that have been deleted or replaced
+            self._rows_freeze_state = utils.FreezeState() # shared by the rows in _own
+            self._dataFrozen = False
+            self._attributesFrozen = False
+        def _freeze(self):
+            self._dataFrozen = True
+            self._attributesFrozen = True
+            self._rows_freeze_state.data = self._rows_freeze_state.attributes = True
+        def _own_row(self, key):
+            # the row for key, copying it out of base if need be
+            if key not in self._own :
+                self._own[key] = rowfactory(dict(self._base[key].items()), self._rows_freeze_state)
+                self._deleted.add(key)
+            return self._own[key]
+        def _rows(self):
+            # the (primary key, row) pairs, with the rows still shared with base being the frozen rows
+            base_rows = self._base._rows() if hasattr(self._base, "_rows") else self._base.iteritems()
+            deleted = self._deleted
+            for k, row in base_rows :
+                if k not in deleted :
+                    yield k, row
+            for k_row in self._own.iteritems() :
+                yield k_row
+        def __setitem__(self, key, value):
+            if self._dataFrozen :
+                raise utils.TicDatError("Can't edit a frozen " + self.__class__.__name__)
+            verify(containerish(key) ==  (keylen > 1) and (keylen == 1 or keylen == len(key)),
+                   "inconsistent key length for %s"%tablename)
+            self._own[key] = rowfactory(value, self._rows_freeze_state)
+            if key in self._base :
+                self._deleted.add(key)
+        def __getitem__(self, item):
+            if item in self._own :
+                return self._own[item]
+            if item in self._base and item not in self._deleted :
+                return TicDatSharedRow(self, item)
+            if self._dataFrozen :
+                raise KeyError(item)
+            self[item] = {}
+            return self._own[item]
+        def __delitem__(self, key):
+            if self._dataFrozen :
+                raise utils.TicDatError("Can't edit a frozen " + self.__class__.__name__)
+            if key not in self :
+                raise KeyError(key)
+            self._own.pop(key, None)
+            if key in self._base :
+                self._deleted.add(key)
+        def pop(self, key, *default):
+            # a shared row is copied before it is removed, since a view of a deleted row is dead
+            if key not in self and default :
+                return default[0]
+            if self._dataFrozen :
+                raise utils.TicDatError("Can't edit a frozen " + self.__class__.__name__)
+            if key not in self :
+                raise KeyError(key)
+            rtn = self._own_row(key)
+            del self[key]
+            return rtn
+        def popitem(self):
+            for key in self :
+                return key, self.pop(key)
+            raise KeyError("popitem(): %s is empty"%tablename)
+        def __contains__(self, item):
+            return item in self._own or (item in self._base and item not in self._deleted)
+        def has_key(self, item):
+            return item in self
+        def __iter__(self):
+            return (k for k,_ in self._rows())
+        def __len__(self):
+            return len(self._base) - len(self._deleted) + len(self._own)
+        def __repr__(self):
+            return "td:" + {k:v for k,v in self.items()}.__repr__()
+    assert dictish(TicDatCopyOnWriteDict)
+    return TicDatCopyOnWriteDict
+
+class _LazyLinks(dict) :
+    """
+    the foreign key links of a single foreign table row. The links are looked up by the TicDat object
+    on each access (from grouping indicies that are built on first access), so that they stay current
+    as native rows are added and deleted.
+    """
+    __slots__ = ("_tic_dat", "_fk_links", "_key")
+    def __init__(self, tic_dat, fk_links, key):
+        super(_LazyLinks, self).__init__()
+        self._tic_dat = tic_dat
+        self._fk_links = fk_links # link name -> _ForeignKeyLink
+        self._key = key
+    def __contains__(self, item):
+        return dict.__contains__(self, item) or item in self._fk_links
+    def __missing__(self, item):
+        # raises KeyError for unknown link names, and for one-to-one links with no matching row
+        return self._tic_dat._lazy_link(self._fk_links[item], self._key)
+
+def _projection(sources, single_pk, data_getter):
+    """
+    compiles a function that pulls field values out of a (primary key, data row) pair
+    :param sources: a tuple of ("pk", primary key position) or ("data", data field position) pairs
+    :param single_pk: boolean. is the primary key a single value rather than a tuple?
+    :param data_getter: a function mapping data field positions to functions that read the
+                        corresponding value from a data row (and that accept several positions at once)
+    :return: (on, f) where on is "pk", "row" or "both" and f is a function of the primary key, the data
+             row or (primary key, data row) respectively. f returns a single value for a single source,
+             and a tuple otherwise.
+    """
+    froms = {src for src,_ in sources}
+    posns = tuple(i for _,i in sources)
+    if froms == {"pk"} :
+        if single_pk :
+            assert posns == (0,)
+            return "pk", lambda pk : pk
+        return "pk", operator.itemgetter(*posns)
+    if froms == {"data"} :
+        return "row", data_getter(*posns)
+    getters = [(src == "pk", (lambda pk : pk) if single_pk and src == "pk" else
+                             operator.itemgetter(i) if src == "pk" else data_getter(i))
+               for src, i in sources]
+    return "both", lambda pk, row : tuple(g(pk) if from_pk else g(row) for from_pk, g in getters)
+
+def _topological_components(children):
+    """
+    finds the strongly connected components of a directed graph (Tarjan's algorithm)
+    :param children: a dictionary mapping every node to the nodes it has edges to
+    :return: a list of the components (as frozensets of nodes), ordered so that every edge
+             between two components runs from an earlier component to a later one
+    """
+    rtn, stack, on_stack, index, lowlink = [], [], set(), {}, {}
+    def visit(node) :
+        index[node] = lowlink[node] = len(index)
+        stack.append(node)
+        on_stack.add(node)
+        for child in children[node] :
+            if child not in index :
+                visit(child)
+                lowlink[node] = min(lowlink[node], lowlink[child])
+            elif child in on_stack :
+                lowlink[node] = min(lowlink[node], index[child])
+        if lowlink[node] == index[node] :
+            component = []
+            while not component or component[-1] != node :
+                component.append(stack.pop())
+                on_stack.remove(component[-1])
+            rtn.append(frozenset(component))
+    for node in sorted(children) :
+        if node not in index :
+            visit(node)
+    return rtn[::-1] # Tarjan finds the components children first
+
+# represents a field missing from a dict-like data row, when comparing rows
+_missing_field = object()
+
+_ForeignKeyLink = namedtuple("ForeignKeyLink", ("foreign_key", "link_key", "link_name",
+                                                "lookup_posns", "link_key_posns"))
+
+# the differences between the two versions of a table. see TicDatFactory.diff
+_TableDiff = namedtuple("TableDiff", ("added", "removed", "changed"))
+
+class _SchemaPlan(object) :
+    """
+    the parts of a TicDatFactory schema that are consulted over and over again when working with
+    TicDat objects, computed up front. A TicDatFactory caches its plan once it has been used (i.e.
+    once the schema can no longer change).
+    """
+    def __init__(self, tdf):
+        pks, dfs = tdf.primary_key_fields, tdf.data_fields
+        self.generator_tables = deep_freeze(tdf._generator_tables)
+        self.columnar_tables = deep_freeze(tdf._columnar_tables)
+        self.default_values = deep_freeze(tdf._default_values)
+        self.data_types = tdf._compile_data_types()
+        # table -> ((field, data validating function, data type),...) for the tables with data types
+        self.validators = FrozenDict({t : tuple((f, dt.validator(), dt) for f, dt in vd.items())
+                                      for t, vd in self.data_types.items() if vd})
+        # table -> primary key fields followed by data fields, and the positions thereof
+        self.all_fields = FrozenDict({t : pks.get(t, ()) + dfs.get(t, ()) for t in tdf.all_tables})
+        self.field_positions = FrozenDict({t : FrozenDict({f:i for i,f in enumerate(fields)})
+                                           for t, fields in self.all_fields.items()})
+        self.foreign_keys = tdf._compile_foreign_keys()
+        fks_by_native = clt.defaultdict(list)
+        for fk in self.foreign_keys:
+            fks_by_native[fk.native_table].append(fk)
+        self.foreign_keys_by_native = FrozenDict({k:frozenset(v) for k,v in fks_by_native.items()})
+        self.foreign_to_native = FrozenDict({fk : FrozenDict(fk.foreigntonativemapping())
+                                             for fk in self.foreign_keys})
+        self.native_to_foreign = FrozenDict({fk : FrozenDict(fk.nativetoforeignmapping())
+                                             for fk in self.foreign_keys})
+        # fk -> (where to find the foreign key values, in foreign primary key order,
+        #        where to find the native field values, in mapping order) within a native row.
+        # Each is a tuple of ("pk", primary key position) or ("data", data field position) pairs
+        sources = {}
+        for fk in self.foreign_keys:
+            source = lambda f : ("pk", pks[fk.native_table].index(f)) if f in pks.get(fk.native_table, ()) \
+                                else ("data", dfs[fk.native_table].index(f))
+            sources[fk] = (tuple(source(self.foreign_to_native[fk][f]) for f in pks[fk.foreign_table]),
+                           tuple(source(f) for f in fk.nativefields()))
+        self.foreign_key_sources = FrozenDict(sources)
+        # the components of the foreign key graph (which runs from foreign table to native table) in
+        # topological order, each paired with the foreign keys running within the component
+        children = {t:set() for t in tdf.all_tables}
+        for fk in self.foreign_keys:
+            children[fk.foreign_table].add(fk.native_table)
+        self.foreign_key_components = tuple((tables, frozenset(fk for fk in self.foreign_keys if
+                                                               {fk.native_table, fk.foreign_table} <= tables))
+                                            for tables in _topological_components(children))
+        self.link_names = self._link_names(tdf._foreign_keys)
+        self.foreign_key_links = tuple(self._foreign_key_links(pks))
+        # table -> the foreign key links for which the table is the native (or foreign) table
+        self.foreign_key_links_by_native = self._group_links(lambda fkl : fkl.foreign_key.native_table)
+        self.foreign_key_links_by_foreign = self._group_links(lambda fkl : fkl.foreign_key.foreign_table)
 
+    def _group_links(self, table_of):
+        rtn = clt.defaultdict(list)
+        for fkl in self.foreign_key_links:
+            rtn[table_of(fkl)].append(fkl)
+        return FrozenDict({k:tuple(v) for k,v in rtn.items()})
+
+    @staticmethod
+    def _link_names(foreign_keys):
+        rtn = {}
+        for (nativetable, foreigntable), nativeFieldsTuples in foreign_keys.items():
+            nativeFieldsSet = frozenset(frozenset(_) for _ in nativeFieldsTuples)
+            if len(nativeFieldsSet)==1:
+                rtn[nativetable, foreigntable, next(_ for _ in nativeFieldsSet)] = nativetable
+            else :
+                for nativeFields in nativeFieldsSet :
+                    trialLinkName = nativeFields
+                    for _ in nativeFieldsSet.difference({nativeFields}) :
+                        trialLinkName = trialLinkName.difference(_)
+                    rtn[nativetable, foreigntable, nativeFields] = \
+                        "_".join([nativetable] + [x for x in trialLinkName or nativeFields])
+        return FrozenDict(rtn)
+
+    def _foreign_key_links(self, pks):
+        can_link_w_me = lambda t : t not in self.generator_tables and pks.get(t)
+        for fk in self.foreign_keys :
+            if can_link_w_me(fk.native_table) and can_link_w_me(fk.foreign_table) :
+                link_key = (fk.native_table, fk.foreign_table, frozenset(fk.nativefields()))
+                if self.link_names[link_key] not in ("keys", "items", "values") :
+                    # positions within the primary key + data values of a native row
+                    lookup_posns = tuple(self.field_positions[fk.native_table]
+                                         [self.foreign_to_native[fk][x]] for x in pks[fk.foreign_table])
+                    link_key_posns = tuple(i for i in range(len(pks[fk.native_table]))
+                                           if i not in lookup_posns)
+                    yield _ForeignKeyLink(fk, link_key, self.link_names[link_key], lookup_posns,
+                                          link_key_posns)
 
 class TicDatFactory(freezable_factory(object, "_isFrozen")) :
     """
@@ -87,14 +634,33 @@ class TicDatFactory(freezable_factory(object, "_isFrozen")) :
                 for t in set(self.primary_key_fields).union(self.data_fields)}
     @property
     def generator_tables(self):
+        if self._schema_plan :
+            return self._schema_plan[0].generator_tables
         return deep_freeze(self._generator_tables)
     @property
+    def columnar_tables(self):
+        if self._schema_plan :
+            return self._schema_plan[0].columnar_tables
+        return deep_freeze(self._columnar_tables)
+    @property
     def default_values(self):
+        if self._schema_plan :
+            return self._schema_plan[0].default_values
         return deep_freeze(self._default_values)
     @property
     def data_types(self):
+        if self._schema_plan :
+            return self._schema_plan[0].data_types
+        return self._compile_data_types()
+    def _compile_data_types(self):
         return utils.FrozenDict({t : utils.FrozenDict({k :v for k,v in vd.items()})
                                 for t,vd in self._data_types.items()})
+    def _plan(self):
+        """
+        :return: the compiled schema plan. Only cached once the factory has been used, since
+                 until then the schema can still change.
+        """
+        return self._schema_plan[0] if self._schema_plan else _SchemaPlan(self)
     def set_data_type(self, table, field, number_allowed = True,
                       inclusive_min = True, inclusive_max = False, min = 0, max = float("inf"),
                       must_be_int = False, strings_allowed= (), nullable = False):
@@ -192,6 +758,8 @@ class TicDatFactory(freezable_factory(object, "_isFrozen")) :
         sets which tables are to be generator tables. Generator tables are represented as generators
         pulled from the actual data store. This prevents them from being fulled loaded into memory.
         Generator tables are only appropriate for truly massive data tables with no primary key.
+        The rows of a generator table are checked as they are generated, so that validating
+        a TicDat object doesn't read its generator tables.
         :param g:
         :return:
         """
@@ -202,6 +770,26 @@ class TicDatFactory(freezable_factory(object, "_isFrozen")) :
         verify(not any(self.primary_key_fields.get(t) for t in g),
                "Can not make generators from tables with primary keys")
         self._generator_tables[:] = [_ for _ in g]
+    def set_columnar_tables(self, c):
+        """
+        sets which tables are to be columnar tables. Columnar tables store each data field in its own
+        column (an array of doubles while the column is purely numeric, a list otherwise) indexed by
+        primary key, which is far more compact than a dict of rows for big, numeric tables.
+        Columnar tables hand out dict-like row views, so dat.table[pk][field] reads and writes as usual,
+        but a row view is created on each access (i.e. dat.table[pk] is not dat.table[pk]).
+        The table.column(field) and table.numpy_column(field) functions expose whole columns,
+        ordered consistently with table.keys(), for vectorized use.
+        Columnar tables must have both primary key fields and data fields.
+        :param c: a container of table names
+        :return:
+        """
+        verify(not self._has_been_used,
+               "The columnar tables can't be changed after a TicDatFactory has been used.")
+        verify(containerish(c) and set(c).issubset(self.all_tables),
+               "Columnar tables should be a container of table names")
+        verify(all(self.primary_key_fields.get(t) and self.data_fields.get(t) for t in c),
+               "Columnar tables need both primary key fields and data fields")
+        self._columnar_tables[:] = [_ for _ in c]
     def clear_foreign_keys(self, native_table = None):
         """
         create a TicDatFactory
@@ -220,6 +808,10 @@ class TicDatFactory(freezable_factory(object, "_isFrozen")) :
             del(self._foreign_keys[nt,ft])
     @property
     def foreign_keys(self):
+        if self._schema_plan :
+            return self._schema_plan[0].foreign_keys
+        return self._compile_foreign_keys()
+    def _compile_foreign_keys(self):
         rtn = []
         for (native,foreign), nativefieldtuples in self._foreign_keys.items():
             for nativefields in nativefieldtuples :
@@ -234,11 +826,13 @@ class TicDatFactory(freezable_factory(object, "_isFrozen")) :
         assert len(rtn) == len(set(rtn))
         return tuple(rtn)
     def _foreign_keys_by_native(self):
+        if self._schema_plan :
+            return self._schema_plan[0].foreign_keys_by_native
         rtn = clt.defaultdict(list)
         for fk in self.foreign_keys:
             rtn[fk.native_table].append(fk)
         return utils.FrozenDict({k:frozenset(v) for k,v in rtn.items()})
-    def enable_foreign_key_links(self):
+    def enable_foreign_key_links(self, lazy = False):
         """
         call to enable foreign key links. For ex. a TicDat object made from
         a factory with foreign key enabled will pass the following assert
@@ -247,9 +841,14 @@ class TicDatFactory(freezable_factory(object, "_isFrozen")) :
                 dat.nutritionQuantities["chicken", "protein"])
         Note that by default, TicDatFactories don't create foreign key links since doing so
         can slow down TicDat creation.
+        The links are kept current as rows are added to, replaced in, or deleted from the tables
+        of the TicDat object (but not when the fields of an existing row are edited in place).
+        :param lazy: boolean. If truthy, the links of a foreign key aren't created along with the TicDat
+                     object. Instead, they are computed the first time any of them is accessed.
         :return:
         """
         self._foreign_key_links_enabled[:] = [True]
+        self._lazy_foreign_key_links[:] = [True] if lazy else []
 
     def add_foreign_key(self, native_table, foreign_table, mappings):
         """
@@ -314,26 +913,74 @@ foreign keys, the code throwing this exception will be removed.
                                 return fkSet.add(newnativeft) or True
         while findderivedforeignkey():
             pass
-        for (nativetable, foreigntable), nativeFieldsTuples in self._foreign_keys.items():
-            nativeFieldsSet = frozenset(frozenset(_) for _ in nativeFieldsTuples)
-            if len(nativeFieldsSet)==1:
-                self._linkName[nativetable, foreigntable, next(_ for _ in nativeFieldsSet)] = \
-                    nativetable
+        # the schema can't change from here on, so the plan, row and table classes are built only once
+        plan = _SchemaPlan(self)
+        for t in self.all_tables:
+            self._row_factories[t] = utils.td_row_factory(t, self.primary_key_fields.get(t, ()),
+                                        self.data_fields.get(t, ()), plan.default_values.get(t, {}))
+            if t in plan.columnar_tables :
+                self._table_classes[t] = columnar.columnar_table_class(t,
+                    len(self.primary_key_fields[t]), self.data_fields[t], plan.default_values.get(t, {}))
             else :
-                for nativeFields in nativeFieldsSet :
-                    trialLinkName = nativeFields
-                    for _ in nativeFieldsSet.difference({nativeFields}) :
-                        trialLinkName = trialLinkName.difference(_)
-                    self._linkName[nativetable, foreigntable, nativeFields] = \
-                        "_".join([nativetable] + [x for x in trialLinkName or nativeFields])
+                self._table_classes[t] = _ticdat_table_class(t, len(self.primary_key_fields.get(t, ())),
+                                                             self._row_factories[t])
+                if self.primary_key_fields.get(t) :
+                    self._copy_on_write_table_classes[t] = _copy_on_write_table_class(t,
+                        len(self.primary_key_fields[t]), self._row_factories[t])
+        for fk in plan.foreign_keys:
+            if fk.cardinality == "many-to-one" and self.primary_key_fields.get(fk.native_table):
+                linkkey = (fk.native_table, fk.foreign_table, frozenset(fk.nativefields()))
+                linkname = plan.link_names[linkkey]
+                link_pk = tuple(x for x in self.primary_key_fields[fk.native_table]
+                                if x not in fk.nativefields())
+                self._link_table_classes[linkkey] = _ticdat_table_class(linkname,
+                    len(link_pk or self.primary_key_fields.get(linkname, ())), lambda x : x)
+        self._schema_plan[:] = [plan]
         self._has_been_used[:] = [True]
+    def __reduce__(self):
+        # a TicDatFactory is pickled as its schema. Unpickling a factory that has been used, in a process
+        # where it (or an unpickling of it) is still alive, returns that very factory. Thus TicDat objects
+        # sent back and forth between processes keep belonging to a single factory.
+        state = {"schema" : self.schema(), "used" : bool(self._has_been_used),
+                 "default_values" : {t : dict(v) for t,v in self._default_values.items()},
+                 "data_types" : {t : dict(v) for t,v in self._data_types.items()},
+                 "generator_tables" : list(self._generator_tables),
+                 "columnar_tables" : list(self._columnar_tables),
+                 "foreign_keys" : {k : set(v) for k,v in self._foreign_keys.items()},
+                 "foreign_key_links" : (bool(self._foreign_key_links_enabled),
+                                        bool(self._lazy_foreign_key_links))}
+        if self._has_been_used :
+            _used_factories[self._pickle_token[0]] = self
+        return _unpickle_tic_dat_factory, (self._pickle_token[0], state)
+    def _table_columns(self, tic_dat, table):
+        """
+        :return: (the primary keys of the table (None for tables without primary keys),
+                  the list of the data field columns of the table, ordered consistently with the keys)
+                 Generator tables are read in full.
+        """
+        t = getattr(tic_dat, table)
+        if getattr(t, "_columnar", False) :
+            return list(t._keys), list(t._columns)
+        rowclass = self._row_factories.get(table)
+        frozen_keyless = type(t) is tuple and not self.primary_key_fields.get(table)
+        if (type(t) is self._table_classes.get(table) or frozen_keyless) and self.data_fields.get(table) and \
+           set(map(type, t.values() if dictish(t) else t)).issubset({rowclass}) :
+            # the data rows are made by the row factory, so their fields can be read from their slots
+            data_rows = dict.values(t) if dictish(t) else list(t)
+            return (dict.keys(t) if dictish(t) else None), [map(operator.attrgetter(slot), data_rows)
+                                                            for slot in rowclass._data_slots]
+        rows, data_getter = self._native_rows(tic_dat, table)
+        pairs = list(rows())
+        data_rows = map(operator.itemgetter(1), pairs)
+        columns = [map(data_getter(i), data_rows) for i in range(len(self.data_fields.get(table, ())))]
+        return (map(operator.itemgetter(0), pairs) if self.primary_key_fields.get(table) else None), columns
     def as_dict(self, ticdat):
         '''
         Returns the ticdat object as a dictionary.
-        Note that, as a nested class, TicDat  objects cannot be pickled
-        directly. Instead, the dictionary returned by this function can be pickled.
-        For unpickling, first unpickle the pickled dictionary, and then pass it,
-        unpacked, to the TicDat constructor.
+        Note that TicDat objects can be pickled directly (which is much faster than pickling
+        the dictionary returned by this function).
+        This dictionary can also be pickled. For unpickling, first unpickle the pickled dictionary,
+        and then pass it, unpacked, to the TicDat constructor.
         :param ticdat: a TicDat object whose data is to be returned as a dict
         :return: A dictionary that can either be pickled, or unpacked to a
                 TicDat constructor
@@ -359,7 +1006,16 @@ foreign keys, the code throwing this exception will be removed.
         :return: a TicDatFactory
         """
         self._has_been_used = [] # append to this to make it truthy
-        self._linkName = {}
+        self._pickle_token = [uuid.uuid4().hex] # identifies the factory (and its unpicklings). see __reduce__
+        self._schema_plan = [] # these five are populated by _trigger_has_been_used
+        self._row_factories = {}
+        self._table_classes = {}
+        self._link_table_classes = {}
+        self._copy_on_write_table_classes = {}
+        self._attached_table_classes = {} # see attach_tic_dat
+        # the frozen objects that have passed good_tic_dat_object, and thus need not be checked again
+        self._known_good_tic_dats = weakref.WeakSet()
+        self._fingerprints = weakref.WeakKeyDictionary() # frozen object -> its fingerprint
         verify(not any(x.startswith("_") for x in init_fields),
                "table names shouldn't start with underscore")
         for k,v in init_fields.items():
@@ -376,57 +1032,24 @@ foreign keys, the code throwing this exception will be removed.
         self._default_values = clt.defaultdict(dict)
         self._data_types = clt.defaultdict(dict)
         self._generator_tables = []
+        self._columnar_tables = []
         self._foreign_keys = clt.defaultdict(set)
         self.all_tables = frozenset(init_fields)
         self._foreign_key_links_enabled = [] # using list for truthiness to work around freezing headaches
-
-        datarowfactory = lambda t :  utils.td_row_factory(t, self.primary_key_fields.get(t, ()),
-                        self.data_fields.get(t, ()), self.default_values.get(t, {}))
+        self._lazy_foreign_key_links = []
 
         goodticdattable = self.good_tic_dat_table
         superself = self
-        def ticdattablefactory(alldatadicts, tablename, primarykey = (), rowfactory_ = None) :
-            assert containerish(primarykey)
-            primarykey = primarykey or  self.primary_key_fields.get(tablename, ())
-            keylen = len(primarykey)
-            rowfactory = rowfactory_ or datarowfactory(tablename)
-            if keylen > 0 :
-                class TicDatDict (FreezeableDict) :
-                    def __init__(self, *_args, **_kwargs):
-                        super(TicDatDict, self).__init__(*_args, **_kwargs)
-                        alldatadicts.append(self)
-                    def __setitem__(self, key, value):
-                        verify(containerish(key) ==  (keylen > 1) and
-                               (keylen == 1 or keylen == len(key)),
-                               "inconsistent key length for %s"%tablename)
-                        return super(TicDatDict, self).__setitem__(key, rowfactory(value))
-                    def __getitem__(self, item):
-                        if (item not in self) and (not getattr(self, "_dataFrozen", False)):
-                            self[item] = rowfactory({})
-                        return super(TicDatDict, self).__getitem__(item)
-                assert dictish(TicDatDict)
-                return TicDatDict
-            class TicDatDataList(clt.MutableSequence):
-                def __init__(self, *_args):
-                    self._list = list()
-                    self.extend(list(_args))
-                def __len__(self): return len(self._list)
-                def __getitem__(self, i): return self._list[i]
-                def __delitem__(self, i): del self._list[i]
-                def __setitem__(self, i, v):
-                    self._list[i] = rowfactory(v)
-                def insert(self, i, v):
-                    self._list.insert(i, rowfactory(v))
-                def __repr__(self):
-                    return "td:" + self._list.__repr__()
-            assert containerish(TicDatDataList) and not dictish(TicDatDataList)
-            return TicDatDataList
-        def generatorfactory(data, tablename) :
+        def generatorfactory(data, tablename, trusted = False) :
             assert tablename in self.generator_tables
-            drf = datarowfactory(tablename)
+            drf = self._row_factories[tablename]
+            drf = drf._from_values if trusted else drf
             def generatorFunction() :
                 for row in (data if containerish(data) else data()):
                     yield drf(row)
+            # identifies generator functions that yield rows made by the row factory (i.e. rows that
+            # are checked as they are generated, or that come from a trusted reader)
+            generatorFunction._row_factory = self._row_factories[tablename]
             return generatorFunction
         class _TicDat(utils.freezable_factory(object, "_isFrozen")) :
             def _freeze(self):
@@ -435,20 +1058,24 @@ foreign keys, the code throwing this exception will be removed.
                 for t in superself.all_tables :
                     _t = getattr(self, t)
                     if utils.dictish(_t) or utils.containerish(_t) :
-                        for v in getattr(_t, "values", lambda : _t)() :
-                            if not getattr(v, "_dataFrozen", False) :
-                                v._dataFrozen =True
-                                v._attributesFrozen = True
-                            else : # we freeze the data-less ones off the bat as empties
-                                assert (len(v) == 0) and v._attributesFrozen
+                        if hasattr(_t, "_freeze") :
+                            # the rows share the FreezeState of their table, so this is O(1)
+                            _t._freeze()
+                        elif not getattr(_t, "_columnar", False) :
+                            # the row views of columnar tables consult the table when editing
+                            for v in getattr(_t, "values", lambda : _t)() :
+                                if not getattr(v, "_dataFrozen", False) :
+                                    v._dataFrozen =True
+                                    v._attributesFrozen = True
                         if utils.dictish(_t) :
-                            _t._dataFrozen  = True
-                            _t._attributesFrozen = True
+                            if not getattr(_t, "_attributesFrozen", False) :
+                                _t._dataFrozen  = True
+                                _t._attributesFrozen = True
                         elif utils.containerish(_t) :
                             setattr(self, t, tuple(_t))
                     else :
                         assert callable(_t) and t in superself.generator_tables
-                for _t in getattr(self, "_allDataDicts", ()) :
+                for _t in getattr(self, "_all_data_dicts", ()) :
                     if utils.dictish(_t) and not getattr(_t, "_attributesFrozen", False) :
                         _t._dataFrozen  = True
                         _t._attributesFrozen = True
@@ -465,6 +1092,11 @@ foreign keys, the code throwing this exception will be removed.
                 for t in init_tables :
                     verify(t in superself.all_tables, "Unexpected table name %s"%t)
                 for t,v in init_tables.items():
+                    if t in superself.generator_tables and callable(v) and not containerish(v) :
+                        # the row factory checks each row as it is generated, so there is no need
+                        # to read the whole generator up front
+                        setattr(self, t, generatorfactory(v, t))
+                        continue
                     badticdattable = []
                     if not (goodticdattable(v, t, lambda x : badticdattable.append(x))) :
                         raise utils.TicDatError(t + " cannot be treated as a ticDat table : " +
@@ -475,73 +1107,196 @@ foreign keys, the code throwing this exception will be removed.
                                 (len(_k) == len(superself.primary_key_fields.get(t, ())) > 1)
                                 or len(superself.primary_key_fields.get(t, ())) == 1),
                            "Unexpected number of primary key fields for %s"%t)
-                     drf = datarowfactory(t) # lots of verification inside the datarowfactory
-                     setattr(self, t, ticdattablefactory(self._all_data_dicts, t)(
-                                    {_k : drf(v[_k] if utils.dictish(v) else ()) for _k in v}))
+                     # lots of verification inside the row factory (or the columnar table)
+                     drf = superself._row_factories[t] if t not in superself._columnar_tables \
+                           else lambda x : x
+                     setattr(self, t, superself._table_classes[t](
+                                    (_k, drf(v[_k] if utils.dictish(v) else ())) for _k in v))
                     elif t in superself.generator_tables :
                         setattr(self, t, generatorfactory(v, t))
                     else :
-                        setattr(self, t, ticdattablefactory(self._all_data_dicts, t)(*v))
+                        setattr(self, t, superself._table_classes[t](*v))
+                self._add_empty_tables(init_tables)
+                if init_tables :
+                    self._try_make_foreign_links()
+            @classmethod
+            def from_rows(cls, **init_tables):
+                """
+                create a TicDat object from data that is already well formed, skipping the validation
+                performed by the TicDat constructor. This is the fast path used by the file readers.
+                :param init_tables: a mapping of table names to rows.
+                                    For primary key tables, the rows are either a dict or an iterable of
+                                    (primary key, data row) pairs, with distinct primary keys.
+                                    For generator tables, a container or generator function of data rows.
+                                    For other tables, an iterable of data rows.
+                                    Each primary key is a tuple (or a single value for single field
+                                    primary keys) and each data row is a sequence of all the data field
+                                    values, in data field order.
+                :return: a TicDat object. Data rows with the wrong number of values, and primary keys
+                         of the wrong length, raise a TicDatError.
+                """
+                superself._trigger_has_been_used()
+                tables = {}
+                for t,v in init_tables.items():
+                    verify(t in superself.all_tables, "Unexpected table name %s"%t)
+                    if t in superself.generator_tables :
+                        tables[t] = generatorfactory(v, t, trusted=True)
+                    else :
+                        tables[t] = superself._table_classes[t]._from_trusted_rows(
+                            v.items() if superself.primary_key_fields.get(t) and dictish(v) else v)
+                return cls._from_tables(tables)
+            @classmethod
+            def _from_columns(cls, tables, table_classes = {}):
+                # tables maps table names to (primary keys, data field columns) pairs. see __reduce__
+                # table_classes optionally overrides the table classes used for some of the tables
+                superself._trigger_has_been_used()
+                return cls._from_tables({t : generatorfactory(list(izip(*columns)), t, trusted=True)
+                                         if t in superself.generator_tables else
+                                         table_classes.get(t, superself._table_classes[t])
+                                            ._from_trusted_columns(keys, columns)
+                                         for t, (keys, columns) in tables.items()})
+            @classmethod
+            def _from_tables(cls, tables):
+                # tables maps table names to the (well formed) tables of the new object
+                rtn = cls.__new__(cls)
+                rtn._all_data_dicts = []
+                rtn._made_foreign_links = False
+                for t,v in tables.items():
+                    setattr(rtn, t, v)
+                rtn._add_empty_tables(tables)
+                if tables :
+                    rtn._try_make_foreign_links()
+                return rtn
+            def __reduce__(self):
+                # pickled as the factory and the data of each table, one column per data field.
+                # The foreign key links are remade when unpickling.
+                return _unpickle_tic_dat, (superself, {t : superself._table_columns(self, t)
+                                                       for t in superself.all_tables},
+                                           getattr(self, "_isFrozen", False),
+                                           self in superself._known_good_tic_dats)
+            def _add_empty_tables(self, init_tables):
                 for t in set(superself.all_tables).difference(init_tables) :
                     if t in superself.generator_tables :
                         # a calleable that returns an empty generator
                         setattr(self, t, generatorfactory((), t))
                     else :
-                        setattr(self, t, ticdattablefactory(self._all_data_dicts, t)())
-                if init_tables :
-                    self._try_make_foreign_links()
+                        setattr(self, t, superself._table_classes[t]())
             def _try_make_foreign_links(self):
                 if not superself._foreign_key_links_enabled:
                     return
                 assert not self._made_foreign_links, "call once"
                 self._made_foreign_links = True
-                can_link_w_me = lambda t : t not in superself.generator_tables and \
-                                           superself.primary_key_fields.get(t)
-                for fk in superself.foreign_keys :
-                    t = fk.native_table
-                    if can_link_w_me(t):
-                      if can_link_w_me(fk.foreign_table)  :
-                        nativefields = fk.nativefields()
-                        linkname = superself._linkName[t, fk.foreign_table, frozenset(nativefields)]
-                        if linkname not in ("keys", "items", "values") :
-                            ft = getattr(self, fk.foreign_table)
-                            foreign_pk = superself.primary_key_fields[fk.foreign_table]
-                            local_pk = superself.primary_key_fields[t]
-                            assert all(pk for pk in (foreign_pk, local_pk))
-                            reversemapping  = fk.foreigntonativemapping()
-                            if len(nativefields) == 1:
-                                assert set(foreign_pk) =={fk.mapping.foreign_field}
-                            else:
-                                assert set(foreign_pk) == {_.foreign_field for _ in fk.mapping}
-                            appendage_fk = fk.cardinality == "one-to-one"
-                            tablefields = superself.primary_key_fields.get(t, ()) + \
-                                          superself.data_fields.get(t, ())
-                            local_posn = {x:tablefields.index(reversemapping[x])
-                                             for x in foreign_pk}
-                            unused_local_posn = {i for i,_ in enumerate(tablefields) if i not in
-                                                    local_posn.values()}
-                            if not appendage_fk :
-                                new_pk = tuple(x for x in local_pk if x not in nativefields)
-                                new_data_dct = ticdattablefactory(self._all_data_dicts, linkname,
-                                                new_pk, lambda x : x)
-                                for row in ft.values() :
-                                    setattr(row, linkname, new_data_dct())
-                            for key,row in getattr(self, t).items() :
-                                keyrow = ((key,) if not containerish(key) else key) + \
-                                         tuple(row[x] for x in superself.data_fields[t])
-                                lookup = tuple(keyrow[local_posn[x]] for x in foreign_pk)
-                                linkrow = ft.get(lookup[0] if len(lookup) ==1 else lookup, None)
-                                if linkrow is not None :
-                                    if appendage_fk :
-                                        # the attribute is simply a reference to the mapping table
-                                        assert not hasattr(linkrow, linkname)
-                                        setattr(linkrow, linkname,row)
-                                    else :
-                                        _key = keyrow[:-len(row)] if row else keyrow
-                                        _key = tuple(x for i,x in enumerate(_key)
-                                                     if i in unused_local_posn)
-                                        getattr(linkrow, linkname)\
-                                            [_key[0] if len(_key) == 1 else _key] = row
+                # foreign key -> the grouping index of the native rows by foreign table primary key
+                self._link_indicies = {}
+                plan = superself._plan()
+                # the linked tables report their row additions and deletions to _link_row and _unlink_row
+                for t in set(plan.foreign_key_links_by_native).union(plan.foreign_key_links_by_foreign):
+                    getattr(self, t)._links_owner = self
+                if superself._lazy_foreign_key_links :
+                    return self._prepare_lazy_links()
+                for fkl in plan.foreign_key_links :
+                    index = self._link_index(fkl)
+                    for key, row in getattr(self, fkl.foreign_key.foreign_table).items() :
+                        self._set_eager_link(fkl, index, key, row)
+            def _link_entry(self, fkl, key, row):
+                # :return: (foreign table primary key, link primary key) for the native table row
+                t = fkl.foreign_key.native_table
+                keyrow = ((key,) if len(superself.primary_key_fields[t]) == 1 else key) + \
+                         tuple(row[x] for x in superself.data_fields.get(t, ()))
+                lookup = tuple(keyrow[i] for i in fkl.lookup_posns)
+                _key = tuple(keyrow[i] for i in fkl.link_key_posns)
+                return lookup[0] if len(lookup) ==1 else lookup, _key[0] if len(_key) == 1 else _key
+            def _link_index(self, fkl):
+                # the native rows, grouped by foreign table primary key, are computed once per foreign key
+                if fkl.link_key in self._link_indicies :
+                    return self._link_indicies[fkl.link_key]
+                rtn = self._link_indicies[fkl.link_key] = {}
+                for key, row in getattr(self, fkl.foreign_key.native_table).items() :
+                    self._add_to_index(fkl, rtn, key, row, adopt=False)
+                if fkl.foreign_key.cardinality != "one-to-one" :
+                    for link_dict in rtn.values():
+                        self._adopt_link_dict(link_dict)
+                return rtn
+            def _add_to_index(self, fkl, index, key, row, adopt=True):
+                lookup, link_key = self._link_entry(fkl, key, row)
+                if fkl.foreign_key.cardinality == "one-to-one" :
+                    index[lookup] = row
+                else :
+                    # link_key is well formed, so skip the verification of the link dict's __setitem__
+                    dict.__setitem__(self._link_dict(fkl, index, lookup, adopt), link_key, row)
+                return lookup
+            def _link_dict(self, fkl, index, lookup, adopt=True):
+                if lookup not in index :
+                    index[lookup] = superself._link_table_classes[fkl.link_key]()
+                    if adopt :
+                        self._adopt_link_dict(index[lookup])
+                return index[lookup]
+            def _adopt_link_dict(self, link_dict):
+                # link dicts made after the TicDat is frozen are frozen right away
+                if getattr(self, "_isFrozen", False) :
+                    link_dict._dataFrozen = True
+                    link_dict._attributesFrozen = True
+                else :
+                    self._all_data_dicts.append(link_dict)
+                return link_dict
+            def _set_eager_link(self, fkl, index, key, row):
+                if fkl.foreign_key.cardinality != "one-to-one" :
+                    setattr(row, fkl.link_name, self._link_dict(fkl, index, key))
+                elif key in index :
+                    # the attribute is simply a reference to the mapping table
+                    setattr(row, fkl.link_name, index[key])
+            def _prepare_lazy_links(self):
+                # each foreign table row gets a _LazyLinks, which asks _lazy_link for its links
+                self._lazy_links = clt.defaultdict(dict) # foreign table -> link name -> fkl
+                for fkl in superself._plan().foreign_key_links :
+                    self._lazy_links[fkl.foreign_key.foreign_table][fkl.link_name] = fkl
+                for ft, links in self._lazy_links.items():
+                    for key, row in getattr(self, ft).items() :
+                        self._set_lazy_links(ft, key, row)
+            def _set_lazy_links(self, ft, key, row):
+                table = getattr(self, ft)
+                if getattr(table, "_columnar", False) :
+                    if not isinstance(table._attributes.get(key), _LazyLinks) :
+                        table._attributes[key] = _LazyLinks(self, self._lazy_links[ft], key)
+                else :
+                    row._links = _LazyLinks(self, self._lazy_links[ft], key)
+            def _lazy_link(self, fkl, key):
+                index = self._link_index(fkl)
+                if fkl.foreign_key.cardinality == "one-to-one" :
+                    return index[key]
+                return self._link_dict(fkl, index, key)
+            def _link_row(self, table, key, row):
+                # called by a linked table after row has been added to it (as a new or replacement row)
+                plan = superself._plan()
+                for fkl in plan.foreign_key_links_by_native.get(table, ()):
+                    if fkl.link_key in self._link_indicies :
+                        lookup = self._add_to_index(fkl, self._link_indicies[fkl.link_key], key, row)
+                        if fkl.foreign_key.cardinality == "one-to-one" and \
+                           not superself._lazy_foreign_key_links :
+                            linkrow = getattr(self, fkl.foreign_key.foreign_table).get(lookup, None)
+                            if linkrow is not None :
+                                setattr(linkrow, fkl.link_name, row)
+                if superself._lazy_foreign_key_links :
+                    if table in self._lazy_links :
+                        self._set_lazy_links(table, key, row)
+                else :
+                    for fkl in plan.foreign_key_links_by_foreign.get(table, ()):
+                        self._set_eager_link(fkl, self._link_indicies[fkl.link_key], key, row)
+            def _unlink_row(self, table, key, row):
+                # called by a linked table when row is deleted (or replaced). Deleting a foreign table
+                # row needs no work, since the links of its native rows are kept by the grouping index
+                for fkl in superself._plan().foreign_key_links_by_native.get(table, ()):
+                    if fkl.link_key in self._link_indicies :
+                        index = self._link_indicies[fkl.link_key]
+                        lookup, link_key = self._link_entry(fkl, key, row)
+                        if fkl.foreign_key.cardinality != "one-to-one" :
+                            if lookup in index :
+                                index[lookup].pop(link_key, None)
+                        elif lookup in index :
+                            del index[lookup]
+                            linkrow = getattr(self, fkl.foreign_key.foreign_table).get(lookup, None)
+                            if not superself._lazy_foreign_key_links and linkrow is not None :
+                                delattr(linkrow, fkl.link_name)
 
         self.TicDat = TicDat
         if xls.import_worked :
@@ -565,14 +1320,29 @@ foreign keys, the code throwing this exception will be removed.
         :param bad_message_handler: a call back function to receive description of any failure message
         :return: True if the dataObj can be converted to a TicDat data object. False otherwise.
         """
+        # a frozen object can't change, save for the rows returned by its generator tables
+        known_good = data_obj in self._known_good_tic_dats
         rtn = True
         for t in self.all_tables:
             if not hasattr(data_obj, t) :
                 bad_message_handler(t + " not an attribute.")
                 return False
+            if known_good and t not in self.generator_tables :
+                continue
             rtn = rtn and  self.good_tic_dat_table(getattr(data_obj, t), t,
                     lambda x : bad_message_handler(t + " : " + x))
+        if rtn and not known_good :
+            self._stamp_known_good(data_obj)
         return rtn
+    def _stamp_known_good(self, data_obj):
+        # data_obj has passed good_tic_dat_object. Only frozen TicDat objects are stamped, since their
+        # tables can't be edited (or replaced)
+        if not (isinstance(data_obj, self.TicDat) and getattr(data_obj, "_isFrozen", False)) :
+            return
+        try :
+            self._known_good_tic_dats.add(data_obj)
+        except TypeError : # not weak referenceable
+            pass
 
     def good_tic_dat_table(self, data_table, table_name, bad_message_handler = lambda x : None) :
         """
@@ -587,10 +1357,15 @@ foreign keys, the code throwing this exception will be removed.
         if table_name not in self.all_tables:
             bad_message_handler("%s is not a valid table name for this schema"%table_name)
             return False
+        if self._own_table(data_table, table_name) :
+            return True # the tables made by this factory check each row as it is added
         if table_name in self.generator_tables :
             assert not self.primary_key_fields.get(table_name), "this should be verified in __init__"
             verify((containerish(data_table) or callable(data_table)) and not dictish(data_table),
                    "Expecting a container of rows or a generator function of rows for %s"%table_name)
+            if table_name in self._row_factories and \
+               getattr(data_table, "_row_factory", None) is self._row_factories[table_name] :
+                return True # made by a TicDat, and thus checks its rows as they are generated
             return self._good_data_rows(data_table if containerish(data_table) else data_table(),
                                       table_name, bad_message_handler)
         if self.primary_key_fields.get(table_name) :
@@ -613,7 +1388,7 @@ foreign keys, the code throwing this exception will be removed.
             return False
         if not len(ticdat_table) :
             return True
-        if not all(_keylen(k) == len(self.primary_key_fields[tablename])  for k in ticdat_table):
+        if not _good_key_lengths(ticdat_table, len(self.primary_key_fields[tablename])):
             bad_msg_handler("Inconsistent key lengths")
             return False
         return True
@@ -621,27 +1396,33 @@ foreign keys, the code throwing this exception will be removed.
         assert dictish(ticdat_table)
         if not len(ticdat_table) :
             return True
-        if not all(_keylen(k) == len(self.primary_key_fields[table_name])
-                   for k in ticdat_table.keys()) :
+        if not _good_key_lengths(ticdat_table if isinstance(ticdat_table, dict) else ticdat_table.keys(),
+                                 len(self.primary_key_fields[table_name])) :
             bad_msg_handler("Inconsistent key lengths")
             return False
-        return self._good_data_rows(ticdat_table.values(), table_name, bad_msg_handler)
+        return self._good_data_rows(getattr(ticdat_table, "itervalues", ticdat_table.values)(), table_name,
+                                    bad_msg_handler)
     def _good_data_rows(self, data_rows, table_name, bad_message_handler = lambda x : None):
-        dictishrows = tuple(x for x in data_rows if utils.dictish(x))
-        if not all(set(x.keys()).issubset(self.data_fields.get(table_name,())) for x in dictishrows):
-            bad_message_handler("Inconsistent data field name keys.")
-            return False
-        containerishrows = tuple(x for x in data_rows
-                                 if utils.containerish(x) and not  utils.dictish(x))
-        if not all(len(x) == len(self.data_fields.get(table_name,())) for x in containerishrows) :
-            bad_message_handler("Inconsistent data row lengths.")
-            return False
-        singletonishrows = tuple(x for x in data_rows if not
-                                 (utils.containerish(x) or utils.dictish(x)))
-        if singletonishrows and (len(self.data_fields.get(table_name,())) != 1)  :
-            bad_message_handler(
-                "Non-container data rows supported only for single-data-field tables")
-            return False
+        # a single pass over data_rows (which can be an iterator), stopping at the first bad row
+        data_fields = self.data_fields.get(table_name,())
+        field_set, num_fields = set(data_fields), len(data_fields)
+        kinds = {} # row type -> "container", "dict" or "other", since the duck typing checks are slow
+        for x in data_rows:
+            t = type(x)
+            kind = kinds[t] if t in kinds else kinds.setdefault(t, "dict" if utils.dictish(x) else
+                                                               "container" if utils.containerish(x) else "other")
+            if kind == "container" :
+                if len(x) != num_fields :
+                    bad_message_handler("Inconsistent data row lengths.")
+                    return False
+            elif kind == "dict" :
+                if not field_set.issuperset(x.keys()) :
+                    bad_message_handler("Inconsistent data field name keys.")
+                    return False
+            elif num_fields != 1 :
+                bad_message_handler(
+                    "Non-container data rows supported only for single-data-field tables")
+                return False
         return True
     def _keyless(self, obj):
         assert self.good_tic_dat_object(obj)
@@ -660,8 +1441,162 @@ foreign keys, the code throwing this exception will be removed.
                     _rtn.append(dict(dr))
             setattr(rtn, t, _rtn)
         return rtn
+    def fingerprint(self, tic_dat):
+        """
+        computes a hash of the data in a ticdat object, suitable for recognizing data that has been seen
+        before (for example, as a cache key for solve results). The fingerprint doesn't depend on the
+        order of the rows, and is the same from one process (or machine) to the next. Ticdat objects
+        holding the same data, as per same_data, have the same fingerprint.
+        The fingerprint of a frozen TicDat object is computed only once, unless the factory has generator
+        tables (whose rows can change).
+        :param tic_dat: a ticdat object
+        :return: the fingerprint, as a hex string
+        """
+        if tic_dat in self._fingerprints :
+            return self._fingerprints[tic_dat]
+        msg  = []
+        verify(self._trusted_tic_dat(tic_dat) or self.good_tic_dat_object(tic_dat, msg.append),
+               "not a good object for this factory : %s"%"\n".join(msg))
+        rtn = hashlib.sha1()
+        for t in sorted(self.all_tables) :
+            fields = (t, self.primary_key_fields.get(t, ()), self.data_fields.get(t, ()))
+            rtn.update("%r\n%s\n"%(fields, self._table_fingerprint(tic_dat, t)))
+        rtn = rtn.hexdigest()
+        if isinstance(tic_dat, self.TicDat) and getattr(tic_dat, "_isFrozen", False) and \
+           not self.generator_tables :
+            try :
+                self._fingerprints[tic_dat] = rtn
+            except TypeError : # not weak referenceable
+                pass
+        return rtn
+    def _table_fingerprint(self, tic_dat, table):
+        # each row is represented by the repr of its (canonical) field values. The sorted reprs are hashed.
+        keys, columns = self._table_columns(tic_dat, table)
+        keylen = len(self.primary_key_fields.get(table, ()))
+        key_columns = [] if keys is None else [keys] if keylen == 1 else \
+                      [map(operator.itemgetter(i), keys) for i in range(keylen)]
+        rows = izip(*map(_fingerprint_column, key_columns + map(list, columns)))
+        return hashlib.sha1("\n".join(sorted(map(repr, rows)))).hexdigest()
+    def same_data(self, obj1, obj2):
+        """
+        determines if two ticdat objects hold the same data. The rows of tables without primary keys
+        are compared as multisets, so that row order doesn't matter but duplicate rows do.
+        :param obj1: a ticdat object
+        :param obj2: a ticdat object
+        :return: True if obj1 and obj2 hold the same data, False otherwise.
+        """
+        for obj in (obj1, obj2) :
+            msg  = []
+            verify(self._trusted_tic_dat(obj) or self.good_tic_dat_object(obj, msg.append),
+                   "not a good object for this factory : %s"%"\n".join(msg))
+        for t in self.all_tables :
+            t1 = getattr(obj1, t)
+            t2 = getattr(obj2, t)
+            if dictish(t1) != dictish(t2) :
+                return False
+            canonical = self._canonical_row_function(t)
+            if dictish(t1) :
+                if len(t1) != len(t2) or any(k not in t2 for k in t1) :
+                    return False
+                if any(canonical(t1[k]) != canonical(t2[k]) for k in t1) :
+                    return False
+            else :
+                _iter = lambda x : x if containerish(x) else x()
+                try :
+                    if clt.Counter(map(canonical, _iter(t1))) != clt.Counter(map(canonical, _iter(t2))) :
+                        return False
+                except TypeError : # unhashable data values
+                    if not self._same_data_rows(_iter(t1), _iter(t2)) :
+                        return False
+        return True
     def _same_data(self, obj1, obj2):
-        assert self.good_tic_dat_object(obj1) and self.good_tic_dat_object(obj2)
+        return self.same_data(obj1, obj2)
+    def diff(self, old, new):
+        """
+        finds the differences between two ticdat objects, table by table.
+        For a table with primary keys, added and removed are the sets of primary keys found only in new and
+        only in old, respectively, and changed maps the primary keys found in both whose data rows differ to
+        the tuple of the data fields that differ.
+        For a table without primary keys, the rows are compared as multisets. added and removed are the lists
+        of rows (as tuples of data field values) found only in new and only in old, and changed is empty.
+        :param old: a ticdat object
+        :param new: a ticdat object
+        :return: a dictionary mapping each table name to a TableDiff namedtuple of (added, removed, changed).
+                 old and new hold the same data if every TableDiff is empty.
+        """
+        for obj in (old, new) :
+            msg  = []
+            verify(self._trusted_tic_dat(obj) or self.good_tic_dat_object(obj, msg.append),
+                   "not a good object for this factory : %s"%"\n".join(msg))
+        return {t : (self._keyed_table_diff if self.primary_key_fields.get(t) else self._keyless_table_diff)
+                    (old, new, t) for t in self.all_tables}
+    def _keyed_table_diff(self, old, new, table):
+        if not self.data_fields.get(table) :
+            old_keys, new_keys = set(getattr(old, table)), set(getattr(new, table))
+            return _TableDiff(new_keys.difference(old_keys), old_keys.difference(new_keys), {})
+        with utils.gc_paused() :
+            (old_keys, old_rows), (new_keys, new_rows) = self._keyed_rows(old, table), \
+                                                         self._keyed_rows(new, table)
+            # a hash join of the new rows onto the old keys, so that the old rows that are missing from
+            # new or different in new are found without looping in Python over all the rows
+            new_rows = dict(izip(new_keys, new_rows))
+            joined = list(imap(new_rows.get, old_keys, repeat(_missing_field)))
+        removed, changed = set(), {}
+        for k, old_values, new_values in compress(izip(old_keys, old_rows, joined),
+                                                  imap(operator.ne, old_rows, joined)) :
+            if new_values is _missing_field :
+                removed.add(k)
+            else :
+                changed[k] = tuple(f for f, o, n in izip(self.data_fields[table], old_values, new_values)
+                                   if o != n)
+        added = set(new_rows).difference(old_keys) if len(new_rows) > len(old_keys) - len(removed) else set()
+        return _TableDiff(added, removed, changed)
+    def _keyed_rows(self, tic_dat, table):
+        """
+        :return: (the list of the primary keys of a table with primary keys,
+                  the list of its canonical data rows, ordered consistently with the keys)
+        """
+        t = getattr(tic_dat, table)
+        if getattr(t, "_columnar", False) or type(t) is self._table_classes.get(table) :
+            keys, columns = self._table_columns(tic_dat, table)
+            return keys, zip(*columns)
+        canonical = self._canonical_row_function(table)
+        items = t.items()
+        return map(operator.itemgetter(0), items), [canonical(r) for _,r in items]
+    def _keyless_table_diff(self, old, new, table):
+        _iter = lambda x : x if containerish(x) else x()
+        canonical = self._canonical_row_function(table)
+        old_rows, new_rows = [map(canonical, _iter(getattr(x, table))) for x in (old, new)]
+        try :
+            old_counts, new_counts = clt.Counter(old_rows), clt.Counter(new_rows)
+            return _TableDiff(list((new_counts - old_counts).elements()),
+                              list((old_counts - new_counts).elements()), {})
+        except TypeError : # unhashable data values, so match up the rows by scanning
+            added = []
+            for row in new_rows :
+                if row in old_rows :
+                    old_rows.remove(row)
+                else :
+                    added.append(row)
+            return _TableDiff(added, old_rows, {})
+    def _canonical_row_function(self, table):
+        """
+        :return: a function that maps the data rows of table to hashable tuples, such that equal rows map to
+                 equal tuples. Fields missing from dict-like rows are represented by a placeholder, and
+                 so don't match the fields of other rows.
+        """
+        dfs, rowclass = self.data_fields.get(table, ()), self._row_factories.get(table)
+        def rtn(row) :
+            if type(row) is rowclass :
+                return row.values()
+            if dictish(row) :
+                return tuple(row[f] if f in row else _missing_field for f in dfs)
+            return tuple(row) if containerish(row) else (row,)
+        return rtn
+    @staticmethod
+    def _same_data_rows(rows1, rows2):
+        # the quadratic comparison of the rows of two tables without primary keys, for unhashable data
+        rows1, rows2 = list(rows1), list(rows2)
         def samerow(r1, r2) :
             if dictish(r1) and dictish(r2):
                 if bool(r1) != bool(r2) or set(r1) != set(r2) :
@@ -679,52 +1614,162 @@ foreign keys, the code throwing this exception will be removed.
             if dictish(r1) :
                 return list(r1.values()) == containerize(r2)
             return containerize(r1) == containerize(r2)
-        for t in self.all_tables :
-            t1 = getattr(obj1, t)
-            t2 = getattr(obj2, t)
-            if dictish(t1) != dictish(t2) :
-                return False
-            if dictish(t1) :
-                if set(t1) != set(t2) :
-                    return False
-                for k in t1 :
-                    if not samerow(t1[k], t2[k]) :
-                        return False
-            else :
-                _iter = lambda x : x if containerish(x) else x()
-                if not len(list(_iter(t1))) == len(list(_iter(t2))) :
-                    return False
-                for r1 in _iter(t1):
-                    if not any (samerow(r1, r2) for r2 in _iter(t2)) :
-                        return False
-        return True
-    def copy_tic_dat(self, tic_dat, freeze_it = False):
+        if len(rows1) != len(rows2) :
+            return False
+        return all(any(samerow(r1, r2) for r2 in rows2) for r1 in rows1)
+    def copy_tic_dat(self, tic_dat, freeze_it = False, copy_on_write = False):
         """
         copies the tic_dat object into a new tic_dat object
         performs a deep copy
         :param tic_dat: a ticdat object
         :param freeze_it: boolean. should the returned object be frozen?
+        :param copy_on_write: boolean. If truthy, the copy shares the rows of the primary key tables of
+                              tic_dat, and copies a row only when it is edited. tic_dat must be a frozen
+                              TicDat object (so that the shared rows can't change) and the foreign key
+                              links must not be enabled. Rows that are still shared are handed out as
+                              views, so that dat.table[pk] is not dat.table[pk] for these rows.
         :return: a deep copy of the tic_dat argument
         """
         msg  = []
         verify(self.good_tic_dat_object(tic_dat, msg.append),
                "tic_dat not a good object for this factory : %s"%"\n".join(msg))
-        rtn = self.TicDat(**{t:getattr(tic_dat, t) for t in self.all_tables})
+        if not copy_on_write :
+            rtn = self.TicDat(**{t:getattr(tic_dat, t) for t in self.all_tables})
+            return self.freeze_me(rtn) if freeze_it else rtn
+        verify(isinstance(tic_dat, self.TicDat) and getattr(tic_dat, "_isFrozen", False),
+               "copy_on_write requires a frozen TicDat object made by this factory")
+        verify(not self._foreign_key_links_enabled, "copy_on_write can't be used with foreign key links")
+        shared, copied = {}, {}
+        for t in self.all_tables :
+            table = getattr(tic_dat, t)
+            if t in self._copy_on_write_table_classes and \
+                    type(table) in (self._table_classes[t], self._copy_on_write_table_classes[t]) :
+                shared[t] = self._copy_on_write_table_classes[t](table)
+            elif getattr(table, "_columnar", False) :
+                copied[t] = izip(table._keys, izip(*table._columns))
+            elif t in self.generator_tables :
+                shared[t] = table
+            else :
+                copied[t] = ((k, r.values()) for k,r in table.items()) if dictish(table) else \
+                            [r.values() for r in table]
+        rtn = self.TicDat.from_rows(**copied)
+        for t, table in shared.items() :
+            setattr(rtn, t, table)
         return self.freeze_me(rtn) if freeze_it else rtn
-    def freeze_me(self, tic_dat):
+    def freeze_me(self, tic_dat, compact = False):
         """
         Freezes a ticdat object
         :param tic_dat: ticdat object
+        :param compact: boolean. If truthy, the frozen tables are also repacked to use less memory.
+                        Equal keys and data values come to be stored once (with strings interned),
+                        and the list columns of columnar tables become tuples. This is a pass over
+                        all the data, worth making for objects that stay resident for a long time.
         :return: tic_dat, after it has been frozen
         """
         msg  = []
         verify(self.good_tic_dat_object(tic_dat, msg.append),
                "tic_dat not a good object for this factory : %s"%"\n".join(msg))
-        return freeze_me(tic_dat)
-    def find_foreign_key_failures(self, tic_dat):
+        freeze_me(tic_dat)
+        self._stamp_known_good(tic_dat)
+        if compact :
+            self._compact(tic_dat)
+        return tic_dat
+    def _compact(self, tic_dat):
+        # for frozen ticdat objects. see freeze_me
+        share_values = _value_sharer()
+        for t in self.all_tables :
+            table = getattr(tic_dat, t)
+            if hasattr(table, "_compact") :
+                table._compact(share_values)
+            elif type(table) is tuple : # frozen keyless tables
+                self._row_factories[t]._share_data(table, share_values)
+        for link_dict in getattr(tic_dat, "_all_data_dicts", ()) :
+            if hasattr(link_dict, "_compact") :
+                link_dict._compact(share_values)
+    def publish_tic_dat(self, tic_dat, file_path):
+        """
+        Writes a frozen ticdat object to a file that any number of processes can then attach to with
+        attach_tic_dat. The numeric data columns are written as packed doubles, which the attached
+        objects read in place (i.e. the processes share a single copy of them). A column holding an
+        integer too large to be stored exactly as a double is written as is.
+        Only frozen objects can be published, so that the file can't fall out of step with tic_dat.
+        An unfrozen object raises a TicDatError (before file_path is written). Note that
+        freeze_me freezes its argument in place.
+        :param tic_dat: a frozen ticdat object
+        :param file_path: the file to write
+        :return:
+        """
+        msg  = []
+        verify(self.good_tic_dat_object(tic_dat, msg.append),
+               "tic_dat not a good object for this factory : %s"%"\n".join(msg))
+        verify(getattr(tic_dat, "_isFrozen", False), "only frozen ticdat objects can be published")
+        tables, doubles, offset = {}, [], 0
+        for t in self.all_tables :
+            keys, columns = self._table_columns(tic_dat, t)
+            if self.primary_key_fields.get(t) and self.data_fields.get(t) :
+                for i, c in enumerate(columns) :
+                    if type(c) in (array, columnar.MappedDoubles) or all(map(columnar._packable, c)) :
+                        packed = c.tostring() if type(c) is not list else array("d", c).tostring()
+                        doubles.append(packed)
+                        columns[i] = (offset, len(c))
+                        offset += len(packed)
+            tables[t] = keys, columns
+        header = pickle.dumps({"schema" : self.schema(), "tables" : tables}, pickle.HIGHEST_PROTOCOL)
+        with open(file_path, "wb") as f :
+            f.write(_published_magic + struct.pack("<Q", len(header)) + header)
+            f.write("\0" * (_published_data_start(len(header)) - f.tell()))
+            for packed in doubles :
+                f.write(packed)
+    def attach_tic_dat(self, file_path):
+        """
+        Attaches to a file written by publish_tic_dat.
+        The numeric data columns of the returned object are read-only views into the file, which is
+        mapped into memory (and shared with the other processes that attach to it). Everything else is
+        read into memory. Note that the numbers in these columns come back out as floats.
+        The rest of the file is unpickled, so only attach to files from a trusted source (as with any
+        pickle).
+        :param file_path: a file written by publish_tic_dat, with a factory having the same schema
+        :return: a frozen TicDat object. The primary key tables with data fields are columnar tables.
+        """
+        verify(os.path.isfile(file_path), "%s is not a file"%file_path)
+        file_size, header_start = os.path.getsize(file_path), len(_published_magic) + 8
+        with open(file_path, "rb") as f :
+            verify(file_size >= header_start and f.read(len(_published_magic)) == _published_magic,
+                   "%s was not written by publish_tic_dat"%file_path)
+            header_length = struct.unpack("<Q", f.read(8))[0]
+            verify(header_start + header_length <= file_size, "%s is truncated"%file_path)
+            buffer_ = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header = pickle.loads(buffer_[header_start : header_start + header_length])
+        verify(header["schema"] == self.schema(), "%s was published with a different schema"%file_path)
+        data_start = _published_data_start(header_length)
+        tables, table_classes = {}, {}
+        for t, (keys, columns) in header["tables"].items() :
+            if self.primary_key_fields.get(t) and self.data_fields.get(t) :
+                verify(all(data_start + c[0] + 8 * c[1] <= len(buffer_) for c in columns if type(c) is tuple),
+                       "%s is truncated"%file_path)
+                columns = [columnar.MappedDoubles(buffer_, data_start + c[0], c[1]) if type(c) is tuple
+                           else c for c in columns]
+                table_classes[t] = self._attached_table_class(t)
+            tables[t] = keys, columns
+        rtn = freeze_me(self.TicDat._from_columns(tables, table_classes))
+        self._stamp_known_good(rtn)
+        return rtn
+    def _attached_table_class(self, table):
+        self._trigger_has_been_used()
+        if table in self.columnar_tables :
+            return self._table_classes[table]
+        if table not in self._attached_table_classes :
+            self._attached_table_classes[table] = columnar.columnar_table_class(table,
+                len(self.primary_key_fields[table]), self.data_fields[table], self.default_values.get(table, {}))
+        return self._attached_table_classes[table]
+    def find_foreign_key_failures(self, tic_dat, single_scan = False):
         """
         Finds the foreign key failures for a ticdat object
         :param tic_dat: ticdat object
+        :param single_scan: boolean. If truthy, all the foreign keys of a native table are checked in a
+                            single pass over its rows. Otherwise, each foreign key gets its own (faster)
+                            pass. A single scan is worthwhile for native generator tables, whose rows are
+                            read from the data source on each pass.
         :return: A dictionary constructed as follow:
                  The keys are namedTuples with members "native_table", "foreign_table", "mapping"
                  The key data matches the arguments to add_foreign_key that constructed the foreign key.
@@ -738,55 +1783,196 @@ foreign keys, the code throwing this exception will be removed.
                  remove_foreign_keys_failures().
         """
         msg  = []
-        verify(self.good_tic_dat_object(tic_dat, msg.append),
+        verify(self._trusted_tic_dat(tic_dat) or self.good_tic_dat_object(tic_dat, msg.append),
                "tic_dat not a good object for this factory : %s"%"\n".join(msg))
+        plan = self._plan()
         rtn_values, rtn_pks = clt.defaultdict(set), clt.defaultdict(set)
-        for native, fks in self._foreign_keys_by_native().items():
-            def getcell(native_pk, native_data_row, field_name):
-                 assert field_name in self.primary_key_fields.get(native, ()) + \
-                                      self.data_fields.get(native, ())
-                 if [field_name] == list(self.primary_key_fields.get(native, ())):
-                     return native_pk
-                 if field_name in native_data_row:
-                     return native_data_row[field_name]
-                 return native_pk[self.primary_key_fields[native].index(field_name)]
-            for fk in fks:
-                foreign_to_native = fk.foreigntonativemapping()
-                for native_pk, native_data_row in (getattr(tic_dat, native).items()
-                            if dictish(getattr(tic_dat, native))
-                            else enumerate(getattr(tic_dat, native))):
-                    foreign_pk = tuple(getcell(native_pk, native_data_row, foreign_to_native[_fpk])
-                                       for _fpk in self.primary_key_fields[fk.foreign_table])
-                    foreign_pk = foreign_pk[0] if len(foreign_pk) == 1 else foreign_pk
-                    if foreign_pk not in getattr(tic_dat, fk.foreign_table):
-                        rtn_pks[fk].add(native_pk)
-                        if type(fk.mapping) is _ForeignKeyMapping :
-                            rtn_values[fk].add(getcell(native_pk, native_data_row,
-                                                       fk.mapping.native_field))
-                        else:
-                            rtn_values[fk].add(tuple(getcell(native_pk,
-                                    native_data_row, _.native_field) for _ in fk.mapping))
+        for native, fks in plan.foreign_keys_by_native.items():
+            _, data_getter = self._native_rows(tic_dat, native)
+            single_pk = len(self.primary_key_fields.get(native, ())) == 1
+            for fk, failed_rows in self._fk_failed_rows(tic_dat, native, fks, single_scan):
+                on, native_values = _projection(plan.foreign_key_sources[fk][1], single_pk, data_getter)
+                for native_pk, native_data_row in failed_rows :
+                    rtn_pks[fk].add(native_pk)
+                    rtn_values[fk].add(native_values(native_pk) if on == "pk" else
+                                       native_values(native_data_row) if on == "row" else
+                                       native_values(native_pk, native_data_row))
         assert set(rtn_pks) == set(rtn_values)
         RtnType = namedtuple("ForeignKeyFailures", ("native_values", "native_pks"))
 
         return {k:RtnType(tuple(rtn_values[k]), tuple(rtn_pks[k])) for k in rtn_pks}
 
-    def remove_foreign_keys_failures(self, tic_dat, propagate=True):
+    def _fk_failed_rows(self, tic_dat, native, fks, single_scan = False):
+        """
+        :return: a list of (fk, the (primary key, data row) pairs of the native rows failing fk) pairs,
+                 for fks, some foreign keys of the native table
+        """
+        plan = self._plan()
+        rows, data_getter = self._native_rows(tic_dat, native)
+        single_pk = len(self.primary_key_fields.get(native, ())) == 1
+        checks = []
+        for fk in fks:
+            foreign_table = getattr(tic_dat, fk.foreign_table)
+            checks.append((fk, _projection(plan.foreign_key_sources[fk][0], single_pk, data_getter),
+                           foreign_table if dictish(foreign_table) else set(foreign_table)))
+        if single_scan :
+            return self._fk_single_scan(rows(), checks)
+        return [(fk, self._fk_scan(rows(), projection, foreign_table))
+                for fk, projection, foreign_table in checks]
+    @staticmethod
+    def _fk_scan(rows, projection, foreign_table):
+        # :return: the (primary key, data row) pairs of rows that fail to find their foreign table row
+        on, key_of = projection
+        if on == "pk" :
+            return [(pk, row) for pk, row in rows if key_of(pk) not in foreign_table]
+        if on == "row" :
+            return [(pk, row) for pk, row in rows if key_of(row) not in foreign_table]
+        return [(pk, row) for pk, row in rows if key_of(pk, row) not in foreign_table]
+    @staticmethod
+    def _fk_single_scan(rows, checks):
+        # _fk_scan for several foreign keys at once. :return: a list of (fk, failed pairs) pairs
+        rtn = [(fk, []) for fk, _, _ in checks]
+        two_argged = [(failed.append, foreign_table,
+                       key_of if on == "both" else
+                       (lambda pk, row, f=key_of : f(pk)) if on == "pk" else
+                       (lambda pk, row, f=key_of : f(row)))
+                      for (fk, (on, key_of), foreign_table), (_, failed) in zip(checks, rtn)]
+        for pk, row in rows :
+            for fail, foreign_table, key_of in two_argged :
+                if key_of(pk, row) not in foreign_table :
+                    fail((pk, row))
+        return rtn
+    def _native_rows(self, tic_dat, table):
+        """
+        :return: (a function returning an iterable of the (primary key, data row) pairs of the table,
+                  the data_getter argument to _projection appropriate for these data rows)
+                 Rows without primary keys are paired with their position in the table.
+        """
+        t = getattr(tic_dat, table)
+        dfs = self.data_fields.get(table, ())
+        if getattr(t, "_columnar", False) :
+            return (lambda : izip(t._keys, izip(*t._columns))), operator.itemgetter
+        if dictish(t) and dfs and self._own_table(t, table) :
+            # the data rows are made by the row factory, so their fields can be read from their slots
+            slots = self._row_factories[table]._data_slots
+            return getattr(t, "_rows", t.iteritems), lambda *posns : operator.attrgetter(*(slots[i] for i in posns))
+        if not dfs and self.primary_key_fields.get(table) :
+            return (lambda : ((k, ()) for k in t)), operator.itemgetter
+        rowclass, defaults = self._row_factories.get(table), self.default_values.get(table, {})
+        def values(row) :
+            if type(row) is rowclass :
+                return row.values()
+            if dictish(row) :
+                return tuple(row[f] if f in row else defaults.get(f, 0) for f in dfs)
+            return tuple(row) if containerish(row) else (row,)
+        if dictish(t) :
+            return (lambda : ((k, values(r)) for k,r in t.items())), operator.itemgetter
+        return (lambda : ((i, values(r)) for i,r in enumerate(t if containerish(t) else t()))), \
+               operator.itemgetter
+    def _own_table(self, table, table_name):
+        """
+        :return: True if table is an instance of one of the table classes this factory made for table_name
+        """
+        return bool(self._table_classes) and (type(table) is self._table_classes[table_name] or
+                                              type(table) is self._copy_on_write_table_classes.get(table_name))
+    def _trusted_tic_dat(self, tic_dat):
+        """
+        :return: True if tic_dat is known to be a good ticdat object, without examining its rows.
+                 This is the case for TicDat objects made by this factory whose tables are still the
+                 tables it made, since these tables verify each row as it is added, and for frozen
+                 objects that have already passed good_tic_dat_object.
+        """
+        if tic_dat in self._known_good_tic_dats and not self.generator_tables :
+            return True
+        if not (isinstance(tic_dat, self.TicDat) and self._table_classes) :
+            return False
+        for t in self.all_tables :
+            table = getattr(tic_dat, t, None)
+            if not (self._own_table(table, t) or callable(table) and t in self.generator_tables or
+                    # the _freeze of a TicDat turns its row list tables into tuples
+                    type(table) is tuple and getattr(tic_dat, "_isFrozen", False)) :
+                return False
+        return True
+    def remove_foreign_keys_failures(self, tic_dat, propagate=True,
+                                     removal_counts_handler = lambda x : None):
         """
         Removes foreign key failures (i.e. child records with no parent table record)
         :param tic_dat: ticdat object
         :param propagate boolean: remove cascading failures? (if removing the child record
                                   results in new failures, should those be removed as well?)
+        :param removal_counts_handler: called with a dictionary mapping each table to the number of
+                                       rows removed from it
         :return: tic_dat, with the foreign key failures removed
         """
-        fk_failures = self.find_foreign_key_failures(tic_dat)
-        for fk, (_, failed_pks) in fk_failures.items():
-            for failed_pk in failed_pks:
-                if failed_pk in getattr(tic_dat, fk.native_table) :
-                    del(getattr(tic_dat, fk.native_table)[failed_pk])
-        if fk_failures and propagate:
-            return self.remove_foreign_keys_failures(tic_dat)
+        msg  = []
+        verify(self._trusted_tic_dat(tic_dat) or self.good_tic_dat_object(tic_dat, msg.append),
+               "tic_dat not a good object for this factory : %s"%"\n".join(msg))
+        plan = self._plan()
+        removed = clt.defaultdict(int)
+        if propagate :
+            # cleaning the tables parents first means that each table need only be checked once,
+            # save for the rows orphaned by removals within a foreign key cycle
+            for tables, cycle_fks in plan.foreign_key_components:
+                self._remove_component_failures(tic_dat, tables, cycle_fks, removed)
+        else :
+            failed_pks = clt.defaultdict(set)
+            for native, fks in plan.foreign_keys_by_native.items():
+                for _, failed_rows in self._fk_failed_rows(tic_dat, native, fks):
+                    failed_pks[native].update(pk for pk,_ in failed_rows)
+            for native, pks in failed_pks.items():
+                self._remove_rows(tic_dat, native, pks, removed)
+        removal_counts_handler({t:removed[t] for t in self.all_tables})
         return tic_dat
+    def _remove_component_failures(self, tic_dat, tables, cycle_fks, removed):
+        """
+        removes the foreign key failures of a strongly connected component of the foreign key graph,
+        whose parent components have already been cleaned. Removing a row can only orphan the rows that
+        reference it through cycle_fks, so these are found from worklists rather than rescans.
+        :param tables: the tables of the component
+        :param cycle_fks: the foreign keys between tables of the component
+        :param removed: a table -> number of rows removed dictionary, that is updated here
+        """
+        plan = self._plan()
+        worklist = clt.deque()
+        for native in tables :
+            if native in plan.generator_tables or native not in plan.foreign_keys_by_native:
+                continue
+            failed_pks = set(pk for _, failed_rows in
+                             self._fk_failed_rows(tic_dat, native, plan.foreign_keys_by_native[native])
+                             for pk,_ in failed_rows)
+            if dictish(getattr(tic_dat, native)) :
+                worklist.extend((native, pk) for pk in failed_pks)
+            else : # a table without a primary key can't be a foreign table, and so can't cascade
+                self._remove_rows(tic_dat, native, failed_pks, removed)
+        if not worklist :
+            return
+        # foreign table -> ((fk, {foreign primary key : the native primary keys referencing it}),...)
+        referencing = clt.defaultdict(list)
+        for fk in cycle_fks :
+            rows, data_getter = self._native_rows(tic_dat, fk.native_table)
+            single_pk = len(self.primary_key_fields[fk.native_table]) == 1
+            on, key_of = _projection(plan.foreign_key_sources[fk][0], single_pk, data_getter)
+            index = clt.defaultdict(list)
+            for pk, row in rows() :
+                index[key_of(pk) if on == "pk" else key_of(row) if on == "row" else key_of(pk, row)].append(pk)
+            referencing[fk.foreign_table].append((fk, index))
+        while worklist :
+            table_name, pk = worklist.popleft()
+            table = getattr(tic_dat, table_name)
+            if pk in table :
+                del table[pk]
+                removed[table_name] += 1
+                for fk, index in referencing.get(table_name, ()):
+                    worklist.extend((fk.native_table, _) for _ in index.get(pk, ()))
+    def _remove_rows(self, tic_dat, table_name, pks, removed):
+        # pks are positions for tables without primary keys, so these are removed back to front
+        table = getattr(tic_dat, table_name)
+        if table_name in self.generator_tables : # rows can't be removed from a generator
+            return
+        for pk in (pks if dictish(table) else sorted(pks, reverse=True)) :
+            if not dictish(table) or pk in table :
+                del table[pk]
+                removed[table_name] += 1
 
     def find_data_type_failures(self, tic_dat):
         """
@@ -808,17 +1994,24 @@ foreign keys, the code throwing this exception will be removed.
                  replace_data_type_failures().
         """
         msg  = []
-        verify(self.good_tic_dat_object(tic_dat, msg.append),
+        verify(self._trusted_tic_dat(tic_dat) or self.good_tic_dat_object(tic_dat, msg.append),
                "tic_dat not a good object for this factory : %s"%"\n".join(msg))
 
-
         rtn_values, rtn_pks = clt.defaultdict(set), clt.defaultdict(set)
-        for table, type_row in self._data_types.items():
-            for pk, data_row in getattr(tic_dat, table).items():
-                for field, data_type in type_row.items():
-                    if not data_type.valid_data(data_row[field]) :
-                        rtn_values[(table, field)].add(data_row[field])
-                        rtn_pks[(table, field)].add(pk)
+        for table, validators in self._plan().validators.items():
+            t = getattr(tic_dat, table)
+            rows, data_getter = self._native_rows(tic_dat, table)
+            for field, valid_data, data_type in validators:
+                if getattr(t, "_columnar", False) : # whole columns can be checked at once
+                    column, keys = t.column(field), t._keys
+                    failures = [(keys[i], column[i]) for i in
+                                columnar.failed_positions(column, data_type, valid_data)]
+                else :
+                    value_of = data_getter(self.data_fields[table].index(field))
+                    failures = [(pk, value_of(row)) for pk, row in rows() if not valid_data(value_of(row))]
+                for pk, value in failures :
+                    rtn_values[(table, field)].add(value)
+                    rtn_pks[(table, field)].add(pk)
         assert set(rtn_values) == set(rtn_pks)
         TableField = clt.namedtuple("TableField", ["table", "field"])
         ValuesPks = clt.namedtuple("ValuesPks", ["bad_values", "pks"])
@@ -892,8 +2085,9 @@ foreign keys, the code throwing this exception will be removed.
         verify(self._has_been_used,
                "The cascading foreign keys won't necessarily be present until the factory is used")
 
+        plan = self._plan()
         entity_tables = {t for t,v in self.primary_key_fields.items() if len(v) == 1}
-        foreign_keys_by_native = self._foreign_keys_by_native()
+        foreign_keys_by_native = plan.foreign_keys_by_native
         # if a native table is one-to-one with a foreign table, it isn't an entity table
         for nt in entity_tables.intersection(foreign_keys_by_native):
             if any(ft.cardinality == "one-to-one" for ft in foreign_keys_by_native[nt]):
@@ -935,11 +2129,11 @@ foreign keys, the code throwing this exception will be removed.
             for i,k in enumerate(sorted(getattr(tic_dat, t))) :
                 reverse_renamings[t, k] = "%s%s"%(table_prepends[t],i+1)
         foreign_keys = {}
-        for fk in self.foreign_keys:
+        for fk in plan.foreign_keys:
             nt = fk.native_table
             if fk.foreign_table in table_prepends:
                 foreign_keys = dict(foreign_keys, **{(nt,nf) : fk.foreign_table
-                                    for nf, ff in fk.nativetoforeignmapping().items()})
+                                    for nf, ff in plan.native_to_foreign[fk].items()})
         # remember -- we've used this factory so any cascading foreign keys are present
         rtn_dict  = clt.defaultdict(dict)
         for t in self.all_tables:
@@ -975,6 +2169,44 @@ foreign keys, the code throwing this exception will be removed.
         assert len(rtn.renamings) == len(reverse_renamings)
         return rtn
 
+# the files written by publish_tic_dat start with this, followed by the length of the pickled header,
+# the header, and then the packed doubles (aligned to 8 bytes)
+_published_magic = "TICDAT\0\1"
+def _published_data_start(header_length) :
+    return -(-(len(_published_magic) + 8 + header_length) // 8) * 8
+
+# pickle token -> the used TicDatFactory that it identifies. see TicDatFactory.__reduce__
+_used_factories = weakref.WeakValueDictionary()
+
+def _unpickle_tic_dat_factory(token, state) :
+    rtn = _used_factories.get(token) if state["used"] else None
+    if rtn is not None :
+        return rtn
+    rtn = TicDatFactory(**state["schema"])
+    rtn._pickle_token[:] = [token]
+    for t, v in state["default_values"].items() :
+        rtn._default_values[t].update(v)
+    for t, v in state["data_types"].items() :
+        rtn._data_types[t].update(v)
+    rtn._generator_tables[:] = state["generator_tables"]
+    rtn._columnar_tables[:] = state["columnar_tables"]
+    rtn._foreign_keys.update(state["foreign_keys"])
+    links, lazy = state["foreign_key_links"]
+    if links :
+        rtn.enable_foreign_key_links(lazy)
+    if state["used"] :
+        rtn._trigger_has_been_used()
+        _used_factories[token] = rtn
+    return rtn
+
+def _unpickle_tic_dat(tdf, tables, frozen, known_good) :
+    rtn = tdf.TicDat._from_columns(tables)
+    if frozen :
+        freeze_me(rtn)
+        if known_good :
+            tdf._stamp_known_good(rtn)
+    return rtn
+
 def freeze_me(x) :
     """
     Freezes a ticdat object
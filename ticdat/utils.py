@@ -3,6 +3,10 @@ general utility module
 PEP8
 """
 from numbers import Number
+import operator
+import gc
+from contextlib import contextmanager
+from itertools import izip, repeat
 
 def do_it(g): # just walks through everything in a gen - I like the syntax this enables
     for x in g :
@@ -29,6 +33,20 @@ def generatorish(x): return all(hasattr(x, _) for _ in ("__iter__", "next")) \
 def numericish(x) : return isinstance(x, Number) and not isinstance(x, bool)
 def lupish(x) : return containerish(x) and hasattr(x, "__getitem__") and not dictish(x)
 
+@contextmanager
+def gc_paused():
+    """
+    pauses the cyclic garbage collector, which otherwise runs over and over (to no avail) while
+    millions of acyclic objects are being made
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try :
+        yield
+    finally :
+        if enabled :
+            gc.enable()
+
 def baseConverter(number, base):
     if number < base:
         return [number]
@@ -45,6 +63,7 @@ def baseConverter(number, base):
 
 def freezable_factory(baseClass, freezeAttr) :
     class _Freezeable(baseClass) :
+        __slots__ = () # so that derived classes can choose to be slot based
         def __setattr__(self, key, value):
             if not getattr(self, freezeAttr, False):
                 return super(_Freezeable, self).__setattr__(key, value)
@@ -79,6 +98,47 @@ class FreezeableDict(_FreezableDictBase) :
             return super(FreezeableDict, self).pop(*args, **kwargs)
         raise TicDatError("Can't edit a frozen " + self.__class__.__name__)
 
+class FreezeState(object) :
+    """
+    the frozen-ness of the rows of a table. The rows made for a table share its FreezeState, so that
+    freezing the table freezes all its rows at once.
+    """
+    __slots__ = ("data", "attributes")
+    def __init__(self):
+        self.data = self.attributes = False
+
+def _freeze_state_property(flag, get_state, set_state) :
+    # a _dataFrozen or _attributesFrozen property for rows, that consults the row's FreezeState. A row
+    # without a FreezeState is given a private one when first frozen.
+    def getter(row) :
+        state = get_state(row)
+        return state is not None and getattr(state, flag)
+    def setter(row, value) :
+        state = get_state(row)
+        if state is None :
+            state = FreezeState()
+            set_state(row, state)
+        setattr(state, flag, value)
+    return property(getter, setter)
+
+class TicDatDataLessRow(FreezeableDict) :
+    """
+    the row of a table with no data fields. Foreign key links are ordinary attributes, or are
+    found in the (lazily computing) _links mapping.
+    """
+    _get_state = staticmethod(lambda row : row.__dict__.get("_freeze_state"))
+    _set_state = staticmethod(lambda row, state : row.__dict__.__setitem__("_freeze_state", state))
+    _dataFrozen = _freeze_state_property("data", _get_state.__func__, _set_state.__func__)
+    _attributesFrozen = _freeze_state_property("attributes", _get_state.__func__, _set_state.__func__)
+    def __getattr__(self, item):
+        links = self.__dict__.get("_links")
+        if links is not None and item in links :
+            try :
+                return links[item]
+            except KeyError :
+                pass
+        raise AttributeError("'%s' object has no attribute '%s'"%(self.__class__.__name__, item))
+
 class FrozenDict(FreezeableDict) :
     def __init__(self, *args, **kwargs):
         super(FrozenDict, self).__init__(*args, **kwargs)
@@ -104,48 +164,101 @@ def td_row_factory(table, key_field_names, data_field_names, default_values={}):
     assert not set(key_field_names).intersection(data_field_names)
     if not data_field_names:
          # need a freezeable dict not a frozen dict here so can still link foreign keys
-        def makefreezeabledict(x=()) :
+        def makefreezeabledict(x=(), freeze_state=None) :
             verify(containerish(x) and len(x) == 0, "Attempting to add non-empty data to %s"%table)
-            return FreezeableDict()
+            return makefreezeabledict._from_values((), freeze_state)
+        def from_values(values, freeze_state=None) :
+            verify(len(values) == 0, "Attempting to add non-empty data to %s"%table)
+            rtn = TicDatDataLessRow()
+            if freeze_state is not None :
+                TicDatDataLessRow._set_state(rtn, freeze_state)
+            return rtn
+        makefreezeabledict._from_values = from_values
+        makefreezeabledict._from_columns = lambda columns, count, freeze_state=None : \
+            [from_values((), freeze_state) for _ in xrange(count)]
+        makefreezeabledict._set_freeze_state = TicDatDataLessRow._set_state
+        makefreezeabledict._share_data = lambda rows, share_values : None
         return makefreezeabledict
     fieldtoindex = {x:data_field_names.index(x) for x in data_field_names}
-    indextofield = {v:k for k,v in fieldtoindex.items()}
+    keys = tuple(data_field_names)
+    # one slot per data field, so that each row is a single fixed size object with
+    # no per-instance __dict__ and no separate list holding the data values
+    dataslots = tuple("_td%s"%i for i in range(len(keys)))
+    # the FreezeState is shared with the other rows of the table (see FreezeState)
+    freezeslots = ("_freeze_state", "_links")
+    defaults = tuple(default_values.get(f, 0) for f in keys)
     class TicDatDataRow(freezable_factory(object, "_attributesFrozen")) :
-        def __init__(self, x):
-            # since ticDat targeting numerical analysis, 0 is good default default
-            self._data = [0] * len(fieldtoindex)
+        __slots__ = dataslots + freezeslots
+        _data_slots = dataslots # the slot holding each data field, in data field order
+        def __init__(self, x, freeze_state=None):
+            _set_freeze_state(self, freeze_state)
+            _set_links(self, None)
             if dictish(x) :
                 verify(set(x.keys()).issubset(fieldtoindex),
                        "Applying inappropriate data field names to %s"%table)
-                for f,i in fieldtoindex.items():
-                    if f in default_values :
-                        self._data[i] = default_values[f]
+                # since ticDat targeting numerical analysis, 0 is good default default
+                _set_data(self, defaults)
                 for f,_d in x.items():
-                    self[f] = _d
+                    fieldtoset[f](self, _d)
             elif containerish(x) :
-                verify(len(x) == len(self), "%s requires each row to have %s data values"%
-                       (table, len(self)))
-                for i in range(len(self)):
-                    self._data[i] = x[i]
+                verify(len(x) == len(keys), "%s requires each row to have %s data values"%
+                       (table, len(keys)))
+                _set_data(self, x)
             else:
-                verify(len(self) ==1, "%s requires each row to have %s data values"%
-                       (table, len(self)))
-                self._data[0] = x
+                verify(len(keys) ==1, "%s requires each row to have %s data values"%
+                       (table, len(keys)))
+                _set_data(self, (x,))
+        @classmethod
+        def _from_values(cls, values, freeze_state=None):
+            # skips the verification done by __init__, save for checking that values is a sequence of
+            # all the data values (a dict would have its field names taken as the data)
+            if not (type(values) in (tuple, list) or lupish(values)) or len(values) != len(keys) :
+                raise TicDatError("%s requires each row to be a sequence of %s data values"%(table, len(keys)))
+            rtn = _new(cls)
+            _set_freeze_state(rtn, freeze_state)
+            _set_links(rtn, None)
+            for s,v in izip(_setters, values):
+                s(rtn, v)
+            return rtn
         def __getitem__(self, item):
             try :
-                return self._data[fieldtoindex[item]]
+                getter = fieldtoget[item]
             except :
                 raise TicDatError("Key error : %s not data field name for table %s"% (item, table))
+            return getter(self)
         def __setitem__(self, key, value):
             verify(key in fieldtoindex, "Key error : %s not data field name for table %s"%
                    (key, table))
-            if getattr(self, "_dataFrozen", False) :
+            if self._dataFrozen :
                 raise TicDatError("Can't edit a frozen TicDatDataRow")
-            self._data[fieldtoindex[key]] = value
+            fieldtoset[key](self, value)
+        def __setattr__(self, key, value):
+            if key in freezeslots or key in dataslots or key in ("_dataFrozen", "_attributesFrozen"):
+                return super(TicDatDataRow, self).__setattr__(key, value)
+            # non-slot attributes (i.e. foreign key links) are kept in a lazily created dict
+            if self._attributesFrozen :
+                raise TicDatError("can't set attributes to a frozen " + self.__class__.__name__)
+            if self._links is None :
+                _links_slot.__set__(self, {})
+            self._links[key] = value
+        def __getattr__(self, item):
+            links = _links_slot.__get__(self)
+            if links is not None and item in links :
+                try : # lazily computed links can fail to find a linked row
+                    return links[item]
+                except KeyError :
+                    pass
+            raise AttributeError("'%s' object has no attribute '%s'"%(self.__class__.__name__, item))
+        def __delattr__(self, item):
+            if self._attributesFrozen :
+                raise TicDatError("can't del attributes to a frozen " + self.__class__.__name__)
+            if not (self._links is not None and item in self._links) :
+                raise AttributeError(item)
+            del self._links[item]
         def keys(self):
-            return tuple(indextofield[i] for i in range(len(self)))
+            return keys
         def values(self):
-            return tuple(self._data)
+            return _get_data(self)
         def items(self):
             return zip(self.keys(), self.values())
         def __contains__(self, item):
@@ -153,8 +266,45 @@ def td_row_factory(table, key_field_names, data_field_names, default_values={}):
         def __iter__(self):
             return iter(fieldtoindex)
         def __len__(self):
-            return len(self._data)
+            return len(keys)
         def __repr__(self):
             return "_td:" + {k:v for k,v in self.items()}.__repr__()
+    # the slot descriptors read and write the data directly, bypassing __setattr__
+    _descriptors = tuple(TicDatDataRow.__dict__[_] for _ in dataslots)
+    fieldtoget = {f:_descriptors[i].__get__ for f,i in fieldtoindex.items()}
+    fieldtoset = {f:_descriptors[i].__set__ for f,i in fieldtoindex.items()}
+    _links_slot = TicDatDataRow.__dict__["_links"]
+    _freeze_descriptors = tuple(TicDatDataRow.__dict__[_] for _ in freezeslots)
+    _set_freeze_state, _set_links = (d.__set__ for d in _freeze_descriptors)
+    _get_freeze_state = _freeze_descriptors[0].__get__
+    TicDatDataRow._dataFrozen = _freeze_state_property("data", _get_freeze_state, _set_freeze_state)
+    TicDatDataRow._attributesFrozen = _freeze_state_property("attributes", _get_freeze_state,
+                                                             _set_freeze_state)
+    TicDatDataRow._set_freeze_state = staticmethod(_set_freeze_state)
+    _setters = tuple(d.__set__ for d in _descriptors)
+    _new = TicDatDataRow.__new__
+    def _set_data(row, values):
+        for s,v in izip(_setters, values):
+            s(row, v)
+    _attrgetter = operator.attrgetter(*dataslots)
+    _get_data = _attrgetter if len(dataslots) > 1 else lambda row : (_attrgetter(row),)
+    _getters = tuple(d.__get__ for d in _descriptors)
+    def share_data(rows, share_values):
+        # replaces the data values of the rows with the equal values returned by share_values
+        # (one data field at a time), even for frozen rows
+        for getter, setter in izip(_getters, _setters):
+            map(setter, rows, share_values(map(getter, rows)))
+    TicDatDataRow._share_data = staticmethod(share_data)
+    def from_columns(columns, count, freeze_state=None):
+        # makes count rows from the columns of data field values, one field at a time (i.e. with C level
+        # loops). skips the verification done by __init__, as does _from_values
+        with gc_paused() :
+            rows = map(_new, repeat(TicDatDataRow, count))
+        map(_set_freeze_state, rows, repeat(freeze_state, count))
+        map(_set_links, rows, repeat(None, count))
+        for setter, column in izip(_setters, columns):
+            map(setter, rows, column)
+        return rows
+    TicDatDataRow._from_columns = staticmethod(from_columns)
     assert dictish(TicDatDataRow)
     return TicDatDataRow
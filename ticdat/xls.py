@@ -48,7 +48,7 @@ class XlsTicFactory(freezable_factory(object, "_isFrozen")) :
                  on matching sheets throw an Exception.
                  Sheet names are considered case insensitive
         """
-        rtn =  self.tic_dat_factory.TicDat(**self._create_tic_dat
+        rtn =  self.tic_dat_factory.TicDat.from_rows(**self._create_tic_dat
                                           (xls_file_path, row_offsets, headers_present))
         if freeze_it:
             return self.tic_dat_factory.freeze_me(rtn)
@@ -85,7 +85,7 @@ class XlsTicFactory(freezable_factory(object, "_isFrozen")) :
                 table_len = min(len(sheet.col_values(field_indicies[table][field]))
                                for field in tdf.data_fields[table])
                 for x in (sheet.row_values(i) for i in range(table_len)[row_offset+ho:]) :
-                    yield self._sub_tuple(tdf.data_fields[table], field_indicies[table])(x)
+                    yield self._sub_tuple(tdf.data_fields[table], field_indicies[table], True)(x)
         return tableObj
 
     def _create_tic_dat(self, xls_file_path, row_offsets, headers_present):
@@ -106,11 +106,11 @@ class XlsTicFactory(freezable_factory(object, "_isFrozen")) :
             table_len = min(len(sheet.col_values(indicies[field])) for field in fields)
             if tdf.primary_key_fields.get(table, ()) :
                 tableObj = {self._sub_tuple(tdf.primary_key_fields[table], indicies)(x) :
-                            self._sub_tuple(tdf.data_fields.get(table, ()), indicies)(x)
+                            self._sub_tuple(tdf.data_fields.get(table, ()), indicies, True)(x)
                             for x in (sheet.row_values(i) for i in
                                         range(table_len)[row_offsets[table]+ho:])}
             else :
-                tableObj = [self._sub_tuple(tdf.data_fields.get(table, ()), indicies)(x)
+                tableObj = [self._sub_tuple(tdf.data_fields.get(table, ()), indicies, True)(x)
                             for x in (sheet.row_values(i) for i in
                                         range(table_len)[row_offsets[table]+ho:])]
             rtn[table] = tableObj
@@ -159,10 +159,14 @@ class XlsTicFactory(freezable_factory(object, "_isFrozen")) :
             if not rtn[t]:
                 del(rtn[t])
         return rtn
-    def _sub_tuple(self, fields, field_indicies) :
+    def _sub_tuple(self, fields, field_indicies, always_tuple = False) :
+        """
+        :param always_tuple: boolean. If falsey, a single field is returned as a value rather than as
+                             a one tuple (as is appropriate for single field primary keys)
+        """
         assert set(fields).issubset(field_indicies)
         def rtn(x) :
-            if len(fields) == 1 :
+            if len(fields) == 1 and not always_tuple :
                 return x[field_indicies[fields[0]]]
             return tuple(x[field_indicies[field]] for field in fields)
         return rtn